@@ -0,0 +1,145 @@
+"""Precomputed export artifacts of the states and transitions tables of each
+isotopologue, in all the API output formats.
+
+The artifacts are stored in the settings.EXPORTS_ROOT directory, under
+{iso_slug}/{dataset_name}/{version}/, with file names carrying a fingerprint of
+the isotopologue data (see Isotopologue.get_data_fingerprint), e.g.
+"states-1f3a9c02b1.csv.gz".
+Whenever the data change, the fingerprint changes, and the stale artifact gets
+rebuilt (lazily on the next request, or eagerly by build_artifacts).
+The text formats are stored gzip-compressed.
+"""
+import gzip
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from .export import (
+    BINARY_FORMATS,
+    TEXT_FORMATS,
+    ExportError,
+    export_binary,
+    stream_text,
+)
+
+CATEGORIES = ("states", "transitions")
+FORMATS = (*TEXT_FORMATS, *BINARY_FORMATS)
+
+
+def get_artifacts_dir(isotopologue):
+    return (
+        Path(settings.EXPORTS_ROOT)
+        / isotopologue.iso_slug
+        / isotopologue.dataset_name
+        / str(isotopologue.version)
+    )
+
+
+def get_file_name(category, fmt, fingerprint):
+    if fmt in TEXT_FORMATS:
+        extension, _ = TEXT_FORMATS[fmt]
+        extension = f"{extension}.gz"
+    else:
+        extension, _ = BINARY_FORMATS[fmt]
+    return f"{category}-{fingerprint}.{extension}"
+
+
+def build_artifact(isotopologue, category, fmt, fingerprint=None):
+    """Build the artifact of the states or transitions (category) table of the
+    isotopologue in the fmt format, removing any stale artifacts of the same table
+    and format.
+    The artifact is written into a temporary file first and moved in place, so
+    a partially written artifact is never served.
+    The stale artifacts are those not matching the fingerprint of the data
+    currently in the database, so a concurrent build for an older fingerprint
+    finishing last never removes the up-to-date artifact.
+
+    Returns
+    -------
+    Path
+        The path of the artifact built.
+    """
+    if fingerprint is None:
+        fingerprint = isotopologue.get_data_fingerprint()
+    artifacts_dir = get_artifacts_dir(isotopologue)
+    artifacts_dir.mkdir(parents=True, exist_ok=True)
+    path = artifacts_dir / get_file_name(category, fmt, fingerprint)
+
+    fd, tmp_path = tempfile.mkstemp(dir=artifacts_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            if fmt in TEXT_FORMATS:
+                with gzip.open(fp, "wt", encoding="utf-8") as gzip_fp:
+                    for chunk in stream_text(isotopologue, category, fmt):
+                        gzip_fp.write(chunk)
+            else:
+                fp.write(export_binary(isotopologue, category, fmt))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    _remove_stale_artifacts(isotopologue, category, fmt, keep=path)
+    return path
+
+
+def _remove_stale_artifacts(isotopologue, category, fmt, keep):
+    artifacts_dir = get_artifacts_dir(isotopologue)
+    paths = [
+        path
+        for path in artifacts_dir.glob(get_file_name(category, fmt, "*"))
+        if path != keep
+    ]
+    if not paths:
+        return
+    # (the fingerprint of the data in the database by now, possibly newer than
+    # the one built)
+    current = type(isotopologue).objects.filter(pk=isotopologue.pk).first()
+    if current is None:
+        return
+    current_path = artifacts_dir / get_file_name(
+        category, fmt, current.get_data_fingerprint()
+    )
+    for stale_path in paths:
+        if stale_path != current_path:
+            stale_path.unlink(missing_ok=True)
+
+
+def get_artifact(isotopologue, category, fmt, fingerprint=None):
+    """The path of the up-to-date artifact, built lazily if missing or stale.
+
+    Returns
+    -------
+    Path
+    """
+    if fingerprint is None:
+        fingerprint = isotopologue.get_data_fingerprint()
+    path = get_artifacts_dir(isotopologue) / get_file_name(category, fmt, fingerprint)
+    if path.is_file():
+        return path
+    return build_artifact(isotopologue, category, fmt, fingerprint=fingerprint)
+
+
+def build_artifacts(isotopologue, formats=FORMATS):
+    """Build the artifacts of both the states and transitions tables of the
+    isotopologue in all the passed formats. The formats unavailable on this
+    server (e.g. if pyarrow is not installed) are skipped.
+
+    Returns
+    -------
+    list[Path]
+        The paths of the artifacts built.
+    """
+    fingerprint = isotopologue.get_data_fingerprint()
+    paths = []
+    for category in CATEGORIES:
+        for fmt in formats:
+            try:
+                paths.append(
+                    build_artifact(isotopologue, category, fmt, fingerprint=fingerprint)
+                )
+            except ExportError:
+                pass
+    return paths
@@ -0,0 +1,738 @@
+"""Serialisation of the states and transitions tables of an isotopologue into all
+the API output formats:
+The text formats (JSON, CSV and NDJSON) are streamed, with the rows fetched from the
+database in chunks, so the memory footprint does not depend on the dataset size.
+The binary columnar formats (NumPy .npz, and Parquet or Arrow IPC if the optional
+pyarrow package is installed) are built from typed numpy arrays, fetched by a single
+projected query per table, without instantiating any model instances.
+All the rows are read from the in-memory snapshot of the isotopologue instead, if
+the snapshots are enabled (see app_site.snapshot) and support the query.
+"""
+
+import csv
+import io
+import itertools
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from app_site.cascade import get_decay_columns
+from app_site.keyset import keyset_filter
+from app_site.models.transition import Transition
+from app_site.models.utils import format_state_str
+from app_site.snapshot import SnapshotError, SnapshotRows, get_snapshot
+
+# number of the database rows fetched at once (and written into a single chunk of
+# the streamed text):
+STREAM_CHUNK_SIZE = 2000
+
+# column name, queryset field and numpy dtype of each exported column:
+STATE_COLUMNS = [
+    ("id", "pk", np.int64),
+    ("el_state_str", "el_state_str", np.str_),
+    ("vib_state_str", "vib_state_str", np.str_),
+    ("energy", "energy", np.float64),
+    ("lifetime", "lifetime", np.float64),
+]
+TRANSITION_COLUMNS = [
+    ("initial_state_id", "initial_state_id", np.int64),
+    ("final_state_id", "final_state_id", np.int64),
+    ("partial_lifetime", "partial_lifetime", np.float64),
+    ("delta_energy", "delta_energy", np.float64),
+]
+
+# the columns served by the text formats (on top of the state or transition labels)
+# unless a projection is requested:
+STATE_TEXT_FIELDS = ("lifetime", "energy")
+TRANSITION_TEXT_FIELDS = ("partial_lifetime", "delta_energy")
+CSV_HEADERS = {
+    "id": "State ID",
+    "el_state_str": "Electronic State",
+    "vib_state_str": "Vibrational State",
+    "energy": "Energy /eV",
+    "lifetime": "Lifetime /s",
+    "initial_state_id": "Initial State ID",
+    "final_state_id": "Final State ID",
+    "partial_lifetime": "Partial Lifetime /s",
+    "delta_energy": "Delta Energy /eV",
+    "cascade_lifetime": "Cascade Lifetime /s",
+    "branching_ratio": "Branching Ratio",
+}
+
+# the (float) columns derived from the whole isotopologue data, rather than stored
+# (see app_site.cascade.DecayColumns), only served if requested by the fields:
+DERIVED_FIELDS = {
+    "states": ("cascade_lifetime",),
+    "transitions": ("branching_ratio",),
+}
+
+# the CSV headers of the cascade populations (see app_site.cascade), which are only
+# served in the text formats:
+CASCADE_CSV_HEADERS = {
+    "id": "State ID",
+    "integrated_population": "Integrated Population /s",
+    "final_population": "Final Population",
+}
+# ... and of the decay paths:
+DECAY_PATHS_CSV_HEADERS = {
+    "probability": "Probability",
+    "states": "States",
+    "state_ids": "State IDs",
+}
+
+# number of the decay paths labelled (with the labels of their states fetched by a
+# single query) at once:
+DECAY_PATHS_CHUNK_SIZE = 100
+
+# the (total) ordering of the paginated rows, with each page served by an index range
+# scan following the key (the values of these fields) of the last row of the
+# previous page:
+KEYSET_ORDERING = {
+    "states": ("state_sort_key", "pk"),
+    "transitions": (
+        "initial_state__state_sort_key",
+        "final_state__state_sort_key",
+        "pk",
+    ),
+}
+
+# page of (at most) size rows following the row with the after key in the
+# KEYSET_ORDERING (the first page if after is None):
+Page = namedtuple("Page", "size after")
+
+# format: (file extension, content type)
+TEXT_FORMATS = {
+    "json": ("json", "application/json"),
+    "csv": ("csv", "text/csv"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+}
+BINARY_FORMATS = {
+    "npz": ("npz", "application/octet-stream"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+class Echo:
+    """A pseudo-buffer for the csv.writer, returning each written row instead of
+    storing it, so the rows can be streamed.
+    """
+
+    def write(self, value):
+        return value
+
+
+def join_chunks(parts, chunk_size=STREAM_CHUNK_SIZE):
+    """Join the strings yielded by the parts generator into chunks of chunk_size,
+    so the text is not streamed in tiny row-by-row pieces.
+    """
+    chunk = []
+    for part in parts:
+        chunk.append(part)
+        if len(chunk) == chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def iter_values(rows, *fields):
+    """Yield the tuples of the values of the fields of the rows (a QuerySet or the
+    SnapshotRows), fetched in chunks.
+    """
+    if isinstance(rows, SnapshotRows):
+        return rows.iter_values(*fields, chunk_size=STREAM_CHUNK_SIZE)
+    return rows.values_list(*fields).iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+# The state and transition labels are formatted from the el_state_str and
+# vib_state_str columns projected by a single query (the molecule_str being shared
+# by all of them), rather than by str(state), which would load the related
+# isotopologue and molecule for every single row:
+
+
+def get_column_fields(columns, fields):
+    """The queryset fields of the passed column names."""
+    column_fields = {name: field for name, field, _ in columns}
+    return [column_fields[name] for name in fields]
+
+
+def get_derived_values(isotopologue, category, fields):
+    """The function of the row ids (an int or an array of ints), returning the dict
+    of the values of the DERIVED_FIELDS among the fields (nan if undefined).
+    """
+    derived = [field for field in fields if field in DERIVED_FIELDS[category]]
+    if not derived:
+        return lambda row_ids: {}
+    decay_columns = get_decay_columns(isotopologue)
+    if category == "states":
+        ids = decay_columns.state_ids
+    else:
+        ids = decay_columns.transition_ids
+
+    def get_values(row_ids):
+        i = np.searchsorted(ids, row_ids)
+        return {field: getattr(decay_columns, field)[i] for field in derived}
+
+    return get_values
+
+
+def _split_fields(isotopologue, category, fields):
+    """The stored fields (columns) and the function of the row id returning the
+    values of the derived fields (with nan as None), or None if none requested.
+    """
+    stored = [field for field in fields if field not in DERIVED_FIELDS[category]]
+    if len(stored) == len(fields):
+        return stored, None
+    get_values = get_derived_values(isotopologue, category, fields)
+
+    def get_derived(row_id):
+        return {
+            field: None if np.isnan(value) else float(value)
+            for field, value in get_values(row_id).items()
+        }
+
+    return stored, get_derived
+
+
+def _row_values(fields, stored, values, get_derived):
+    if get_derived is None:
+        return dict(zip(fields, values))
+    *values, row_id = values
+    row_values = {**dict(zip(stored, values)), **get_derived(row_id)}
+    return {field: row_values[field] for field in fields}
+
+
+def iter_state_lifetimes(isotopologue, states, fields=STATE_TEXT_FIELDS):
+    molecule_str = str(isotopologue.molecule)
+    stored, get_derived = _split_fields(isotopologue, "states", fields)
+    rows = iter_values(
+        states,
+        "el_state_str",
+        "vib_state_str",
+        *get_column_fields(STATE_COLUMNS, stored),
+        *(["pk"] if get_derived else []),
+    )
+    for el_state_str, vib_state_str, *values in rows:
+        yield (
+            format_state_str(molecule_str, el_state_str, vib_state_str),
+            _row_values(fields, stored, values, get_derived),
+        )
+
+
+def iter_transition_lifetimes(isotopologue, transitions, fields=TRANSITION_TEXT_FIELDS):
+    molecule_str = str(isotopologue.molecule)
+    stored, get_derived = _split_fields(isotopologue, "transitions", fields)
+    rows = iter_values(
+        transitions,
+        "initial_state__el_state_str",
+        "initial_state__vib_state_str",
+        "final_state__el_state_str",
+        "final_state__vib_state_str",
+        *get_column_fields(TRANSITION_COLUMNS, stored),
+        *(["pk"] if get_derived else []),
+    )
+    for (
+        initial_el_state_str,
+        initial_vib_state_str,
+        final_el_state_str,
+        final_vib_state_str,
+        *values,
+    ) in rows:
+        yield (
+            format_state_str(molecule_str, initial_el_state_str, initial_vib_state_str),
+            format_state_str(molecule_str, final_el_state_str, final_vib_state_str),
+            _row_values(fields, stored, values, get_derived),
+        )
+
+
+def stream_state_lifetimes_csv(isotopologue, states, fields=STATE_TEXT_FIELDS):
+    writer = csv.writer(Echo())
+    yield writer.writerow(["State", *(CSV_HEADERS[field] for field in fields)])
+    for state_str, values in iter_state_lifetimes(isotopologue, states, fields):
+        yield writer.writerow([state_str, *values.values()])
+
+
+def stream_transition_lifetimes_csv(
+    isotopologue, transitions, fields=TRANSITION_TEXT_FIELDS
+):
+    writer = csv.writer(Echo())
+    yield writer.writerow(
+        ["Initial State", "Final State", *(CSV_HEADERS[field] for field in fields)]
+    )
+    for initial_state_str, final_state_str, values in iter_transition_lifetimes(
+        isotopologue, transitions, fields
+    ):
+        yield writer.writerow([initial_state_str, final_state_str, *values.values()])
+
+
+def stream_json(meta_dict, key, items):
+    """Write the meta_dict extended by the key: {label: values} object, with the
+    (label, values) pairs streamed from the items iterable.
+    """
+    yield json.dumps(meta_dict)[:-1] + f", {json.dumps(key)}: {{"
+    separator = ""
+    for label, values in items:
+        yield f"{separator}{json.dumps(label)}: {json.dumps(values)}"
+        separator = ", "
+    yield "}}"
+
+
+def stream_state_lifetimes_json(
+    isotopologue, states, meta_dict, fields=STATE_TEXT_FIELDS
+):
+    items = iter_state_lifetimes(isotopologue, states, fields)
+    return stream_json(meta_dict, "states", items)
+
+
+def stream_transition_lifetimes_json(
+    isotopologue, transitions, meta_dict, fields=TRANSITION_TEXT_FIELDS
+):
+    items = (
+        (f"{initial_state_str} → {final_state_str}", values)
+        for initial_state_str, final_state_str, values in iter_transition_lifetimes(
+            isotopologue, transitions, fields
+        )
+    )
+    return stream_json(meta_dict, "transitions", items)
+
+
+def stream_state_lifetimes_ndjson(
+    isotopologue, states, meta_dict, fields=STATE_TEXT_FIELDS
+):
+    """The first line holds the meta-data, each following line a single state."""
+    yield json.dumps(meta_dict) + "\n"
+    for state_str, values in iter_state_lifetimes(isotopologue, states, fields):
+        yield json.dumps({"state": state_str, **values}) + "\n"
+
+
+def stream_transition_lifetimes_ndjson(
+    isotopologue, transitions, meta_dict, fields=TRANSITION_TEXT_FIELDS
+):
+    """The first line holds the meta-data, each following line a single
+    transition.
+    """
+    yield json.dumps(meta_dict) + "\n"
+    for initial_state_str, final_state_str, values in iter_transition_lifetimes(
+        isotopologue, transitions, fields
+    ):
+        yield json.dumps(
+            {
+                "initial_state": initial_state_str,
+                "final_state": final_state_str,
+                **values,
+            }
+        ) + "\n"
+
+
+def get_meta_dict(isotopologue):
+    molecule_dict = {
+        "molecule_formula": isotopologue.molecule.formula_str,
+        "isotopologue_formula": isotopologue.iso_formula_str,
+    }
+    dataset_dict = {
+        "name": isotopologue.dataset_name,
+        "version": isotopologue.version,
+        "number_states": isotopologue.number_states,
+        "number_transitions": isotopologue.number_transitions,
+    }
+    return {"molecule": molecule_dict, "dataset": dataset_dict}
+
+
+def _get_rows(isotopologue, category, filters, after=None):
+    if category == "states":
+        rows = isotopologue.state_set.all()
+    else:
+        rows = Transition.objects.filter(initial_state__isotopologue=isotopologue)
+    if filters is not None:
+        rows = rows.filter(filters)
+    if after is not None:
+        rows = rows.filter(keyset_filter(KEYSET_ORDERING[category], after))
+    return rows
+
+
+def _select_snapshot_rows(isotopologue, category, filters, order_by, after=None):
+    """The SnapshotRows selected as by the _get_rows, or None if not served by the
+    snapshots.
+    """
+    snapshot = get_snapshot(isotopologue)
+    if snapshot is None:
+        return None
+    if after is not None:
+        keyset = keyset_filter(KEYSET_ORDERING[category], after)
+        filters = keyset if filters is None else filters & keyset
+    try:
+        return snapshot.select(category, filters, order_by)
+    except SnapshotError:
+        # (served from the database instead)
+        return None
+
+
+def get_rows(isotopologue, category, filters=None, page=None):
+    """The queryset of the states or transitions (category) of the isotopologue,
+    optionally filtered (see app_api.query.get_filters), ordered by the primary key
+    (so the order does not depend on the index used by the database), or only the
+    rows of the page passed, in the KEYSET_ORDERING.
+    The SnapshotRows are returned instead if served by the snapshots.
+    """
+    after = page.after if page is not None else None
+    order_by = KEYSET_ORDERING[category] if page is not None else ("pk",)
+    rows = _select_snapshot_rows(isotopologue, category, filters, order_by, after)
+    if rows is None:
+        rows = _get_rows(isotopologue, category, filters, after=after)
+        rows = rows.order_by(*order_by)
+    return rows if page is None else rows[: page.size]
+
+
+def get_next_page(isotopologue, category, page, filters=None):
+    """The page following the passed page, found by a single query of the keys of
+    its last row and of the row following it.
+
+    Returns
+    -------
+    Page or None
+        None if the passed page is the last one.
+    """
+    ordering = KEYSET_ORDERING[category]
+    rows = _select_snapshot_rows(isotopologue, category, filters, ordering, page.after)
+    if rows is not None:
+        keys = list(rows[page.size - 1 : page.size + 1].iter_values(*ordering))
+    else:
+        rows = _get_rows(isotopologue, category, filters, after=page.after)
+        keys = list(
+            rows.order_by(*ordering).values_list(*ordering)[
+                page.size - 1 : page.size + 1
+            ]
+        )
+    if len(keys) < 2:
+        return None
+    return page._replace(after=list(keys[0]))
+
+
+def stream_text(
+    isotopologue, category, fmt, filters=None, fields=None, page=None, meta=None
+):
+    """Stream the states or transitions (category) table in one of the TEXT_FORMATS.
+
+    Parameters
+    ----------
+    isotopologue : Isotopologue
+    category : str
+    fmt : str
+    filters : Q, optional
+        Filter of the rows streamed (all the rows by default).
+    fields : list[str], optional
+        Names of the columns streamed alongside the state or transition labels
+        (STATE_TEXT_FIELDS or TRANSITION_TEXT_FIELDS by default).
+    page : Page, optional
+        Only stream the rows of the page (all the rows by default).
+    meta : dict, optional
+        Extra entries of the meta-data of the JSON and NDJSON formats.
+
+    Returns
+    -------
+    generator[str]
+    """
+    rows = get_rows(isotopologue, category, filters, page)
+    if fields is None:
+        fields = STATE_TEXT_FIELDS if category == "states" else TRANSITION_TEXT_FIELDS
+    if fmt == "csv":
+        streams = {
+            "states": stream_state_lifetimes_csv,
+            "transitions": stream_transition_lifetimes_csv,
+        }
+        content = streams[category](isotopologue, rows, fields)
+    else:
+        streams = {
+            ("json", "states"): stream_state_lifetimes_json,
+            ("json", "transitions"): stream_transition_lifetimes_json,
+            ("ndjson", "states"): stream_state_lifetimes_ndjson,
+            ("ndjson", "transitions"): stream_transition_lifetimes_ndjson,
+        }
+        meta_dict = {**get_meta_dict(isotopologue), **(meta or {})}
+        content = streams[fmt, category](isotopologue, rows, meta_dict, fields)
+    return join_chunks(content)
+
+
+def get_columns(queryset, columns, fields=None):
+    """Fetch the columns of the queryset as a dict of numpy arrays, in the order of
+    the queryset.
+    The null lifetime (denoting stable states) gets exported as inf.
+
+    Parameters
+    ----------
+    queryset : QuerySet or SnapshotRows
+    columns : list[tuple]
+        List of (column name, queryset field, numpy dtype) tuples.
+    fields : list[str], optional
+        Names of the columns to fetch, in this order (all the columns by default).
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+    """
+    if fields is not None:
+        columns_by_name = {column[0]: column for column in columns}
+        columns = [columns_by_name[name] for name in fields]
+    if isinstance(queryset, SnapshotRows):
+        values = [queryset.values(field) for _, field, _ in columns]
+        # (the labels as a list, so their dtype width is the same as if queried)
+        values = [v.tolist() if v.dtype.kind == "U" else v for v in values]
+    else:
+        rows = queryset.values_list(*(field for _, field, _ in columns))
+        values = list(zip(*rows)) or [()] * len(columns)
+    arrays = {
+        name: np.array(column_values, dtype=dtype)
+        for (name, _, dtype), column_values in zip(columns, values)
+    }
+    if "lifetime" in arrays:
+        # None gets converted to nan by numpy:
+        arrays["lifetime"][np.isnan(arrays["lifetime"])] = np.inf
+    return arrays
+
+
+def _get_columns(isotopologue, category, rows, columns, fields):
+    derived = [field for field in fields or () if field in DERIVED_FIELDS[category]]
+    if not derived:
+        return get_columns(rows, columns, fields)
+    stored = [field for field in fields if field not in derived]
+    arrays = get_columns(rows, [*columns, ("pk", "pk", np.int64)], [*stored, "pk"])
+    arrays.update(get_derived_values(isotopologue, category, derived)(arrays["pk"]))
+    return {field: arrays[field] for field in fields}
+
+
+def get_state_columns(isotopologue, filters=None, fields=None, page=None):
+    states = get_rows(isotopologue, "states", filters, page)
+    return _get_columns(isotopologue, "states", states, STATE_COLUMNS, fields)
+
+
+def get_transition_columns(isotopologue, filters=None, fields=None, page=None):
+    transitions = get_rows(isotopologue, "transitions", filters, page)
+    return _get_columns(
+        isotopologue, "transitions", transitions, TRANSITION_COLUMNS, fields
+    )
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError(
+            "The parquet and arrow formats require the pyarrow package, which is not "
+            "installed on this server!"
+        )
+    return pyarrow
+
+
+def to_npz(arrays):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def to_arrow(arrays):
+    pa = _import_pyarrow()
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_parquet(arrays):
+    pa = _import_pyarrow()
+    sink = pa.BufferOutputStream()
+    pa.parquet.write_table(pa.table(arrays), sink)
+    return sink.getvalue().to_pybytes()
+
+
+def export(arrays, fmt):
+    """Serialise the columns into one of the BINARY_FORMATS.
+
+    Returns
+    -------
+    bytes
+    """
+    serialisers = {"npz": to_npz, "arrow": to_arrow, "parquet": to_parquet}
+    return serialisers[fmt](arrays)
+
+
+def export_binary(isotopologue, category, fmt, filters=None, fields=None, page=None):
+    """Serialise the states or transitions (category) table into one of the
+    BINARY_FORMATS, optionally only the rows matching the filters (or of the page)
+    and only the columns named by the fields (all of them by default).
+
+    Returns
+    -------
+    bytes
+    """
+    if category == "states":
+        arrays = get_state_columns(isotopologue, filters, fields, page)
+    else:
+        arrays = get_transition_columns(isotopologue, filters, fields, page)
+    return export(arrays, fmt)
+
+
+def iter_cascade(isotopologue, cascade):
+    """Yield the (state label, values) of the states reached by the cascade, in the
+    order of their ids. The labels are fetched by a single query over the range of
+    the ids.
+    """
+    molecule_str = str(isotopologue.molecule)
+    state_ids = cascade.state_ids
+    rows = (
+        isotopologue.state_set.filter(pk__gte=state_ids[0], pk__lte=state_ids[-1])
+        .order_by("pk")
+        .values_list("pk", "el_state_str", "vib_state_str")
+    )
+    i = 0
+    for pk, el_state_str, vib_state_str in rows.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        if pk != state_ids[i]:
+            continue
+        integrated = cascade.integrated[i]
+        values = {
+            "id": pk,
+            # (the stable states are never depleted)
+            "integrated_population": (
+                None if np.isnan(integrated) else float(integrated)
+            ),
+            "final_population": float(cascade.final[i]),
+        }
+        if cascade.populations is not None:
+            values["populations"] = cascade.populations[:, i].tolist()
+        yield format_state_str(molecule_str, el_state_str, vib_state_str), values
+        i += 1
+        if i == len(state_ids):
+            return
+
+
+def stream_cascade(isotopologue, cascade, fmt):
+    """Stream the cascade (see app_site.cascade.solve_cascade) populations of the
+    isotopologue states in one of the TEXT_FORMATS.
+
+    Returns
+    -------
+    generator[str]
+    """
+    meta_dict = {
+        **get_meta_dict(isotopologue),
+        "times": list(cascade.times),
+    }
+    items = iter_cascade(isotopologue, cascade)
+    if fmt == "json":
+        content = stream_json(meta_dict, "states", items)
+    elif fmt == "ndjson":
+        content = _stream_cascade_ndjson(meta_dict, items)
+    else:
+        content = _stream_cascade_csv(cascade, items)
+    return join_chunks(content)
+
+
+def _stream_cascade_ndjson(meta_dict, items):
+    yield json.dumps(meta_dict) + "\n"
+    for label, values in items:
+        yield json.dumps({"state": label, **values}) + "\n"
+
+
+def _stream_cascade_csv(cascade, items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(
+        [
+            "State",
+            *CASCADE_CSV_HEADERS.values(),
+            *(f"Population at {time:g} s" for time in cascade.times),
+        ]
+    )
+    for label, values in items:
+        populations = values.pop("populations", [])
+        yield writer.writerow([label, *values.values(), *populations])
+
+
+def iter_decay_paths(isotopologue, paths):
+    """Yield the values of the decay paths (see app_site.cascade.find_decay_paths),
+    in the order found, labelled by the labels of their states. The labels are
+    fetched by a single query per chunk of the paths, only for the states not
+    labelled yet.
+    """
+    molecule_str = str(isotopologue.molecule)
+    labels = {}
+    paths = iter(paths)
+    while True:
+        chunk = list(itertools.islice(paths, DECAY_PATHS_CHUNK_SIZE))
+        if not chunk:
+            return
+        unlabelled = {pk for path in chunk for pk in path.state_ids} - labels.keys()
+        if unlabelled:
+            rows = isotopologue.state_set.filter(pk__in=unlabelled).values_list(
+                "pk", "el_state_str", "vib_state_str"
+            )
+            for pk, el_state_str, vib_state_str in rows:
+                labels[pk] = format_state_str(molecule_str, el_state_str, vib_state_str)
+        for path in chunk:
+            yield {
+                "probability": path.probability,
+                "states": [labels[pk] for pk in path.state_ids],
+                "state_ids": path.state_ids,
+            }
+
+
+def stream_decay_paths(isotopologue, paths, fmt, meta=None):
+    """Stream the decay paths (see app_site.cascade.find_decay_paths) of an
+    isotopologue state in one of the TEXT_FORMATS, as they are found.
+
+    Parameters
+    ----------
+    isotopologue : Isotopologue
+    paths : iterable[DecayPath]
+    fmt : str
+    meta : dict, optional
+        Extra meta-data (e.g. the search parameters) of the JSON and NDJSON formats.
+
+    Returns
+    -------
+    generator[str]
+    """
+    meta_dict = {**get_meta_dict(isotopologue), **(meta or {})}
+    items = iter_decay_paths(isotopologue, paths)
+    if fmt == "json":
+        content = _stream_decay_paths_json(meta_dict, items)
+    elif fmt == "ndjson":
+        content = _stream_decay_paths_ndjson(meta_dict, items)
+    else:
+        content = _stream_decay_paths_csv(items)
+    return join_chunks(content)
+
+
+def _stream_decay_paths_json(meta_dict, items):
+    yield json.dumps(meta_dict)[:-1] + ', "paths": ['
+    separator = ""
+    for values in items:
+        yield f"{separator}{json.dumps(values)}"
+        separator = ", "
+    yield "]}"
+
+
+def _stream_decay_paths_ndjson(meta_dict, items):
+    yield json.dumps(meta_dict) + "\n"
+    for values in items:
+        yield json.dumps(values) + "\n"
+
+
+def _stream_decay_paths_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(DECAY_PATHS_CSV_HEADERS.values())
+    for values in items:
+        yield writer.writerow(
+            [
+                values["probability"],
+                " → ".join(values["states"]),
+                " ".join(map(str, values["state_ids"])),
+            ]
+        )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from app_api.artifacts import FORMATS, build_artifacts
+from app_site.models import Isotopologue
+from app_site.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "(Re)build the precomputed API export artifacts (and the snapshot files) of "
+        "the states and transitions of isotopologues, served by the API endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "molecules",
+            nargs="*",
+            metavar="formula_str",
+            help="Formulas of the molecules to build the exports for (all by default).",
+        )
+        parser.add_argument(
+            "--format",
+            dest="formats",
+            action="append",
+            choices=FORMATS,
+            help="Format to build (all the available formats by default), repeatable.",
+        )
+
+    def handle(self, *args, **options):
+        isotopologues = Isotopologue.objects.select_related("molecule")
+        if options["molecules"]:
+            isotopologues = isotopologues.filter(
+                molecule__formula_str__in=options["molecules"]
+            )
+        for isotopologue in isotopologues:
+            paths = build_artifacts(isotopologue, formats=options["formats"] or FORMATS)
+            paths.append(write_snapshot(isotopologue))
+            self.stdout.write(
+                f"{isotopologue}: built {len(paths) - 1} export artifacts and the "
+                f"snapshot files"
+            )
+            if options["verbosity"] > 1:
+                for path in paths:
+                    self.stdout.write(f"    {path}")
@@ -0,0 +1,315 @@
+"""Parsing of the API query parameters filtering the rows (filters) and selecting
+the columns (fields) of the states and transitions tables, and of the parameters of
+the cascade populations and of the decay paths.
+
+All the filters are translated into lookups of the indexed columns, so the database
+only reads the rows requested.
+For the transitions, the state filters (energy, lifetime, el_state and vib_state)
+select the initial (upper) states of the transitions.
+"""
+import math
+
+from django.db.models import Q
+from pyvalem.states import StateParseError
+
+from app_site.keyset import decode_cursor
+from app_site.models.utils import canonicalise_and_parse_el_state_str
+from .export import (
+    DERIVED_FIELDS,
+    KEYSET_ORDERING,
+    STATE_COLUMNS,
+    TRANSITION_COLUMNS,
+    Page,
+)
+
+# parameter: (column, lookup), all of the float-valued range filters:
+RANGE_FILTERS = {
+    "energy_min": ("energy", "gte"),
+    "energy_max": ("energy", "lte"),
+    "lifetime_min": ("lifetime", "gte"),
+    "lifetime_max": ("lifetime", "lte"),
+}
+TRANSITION_RANGE_FILTERS = {
+    "partial_lifetime_min": ("partial_lifetime", "gte"),
+    "partial_lifetime_max": ("partial_lifetime", "lte"),
+}
+STATE_FILTERS = (*RANGE_FILTERS, "el_state", "vib_state")
+TRANSITION_FILTERS = (
+    *STATE_FILTERS,
+    *TRANSITION_RANGE_FILTERS,
+    "initial_state",
+    "final_state",
+)
+
+COLUMNS = {"states": STATE_COLUMNS, "transitions": TRANSITION_COLUMNS}
+
+# the greatest id of any row (the ids are AutoField, 32-bit e.g. in MySQL):
+MAX_ID = 2**31 - 1
+
+# the maximum number of rows of a single page:
+MAX_PAGE_SIZE = 10000
+
+# the maximum numbers of the initial states and of the times of a single cascade:
+MAX_CASCADE_STATES = 100
+MAX_CASCADE_TIMES = 100
+
+# the default minimum probability of the decay paths, and the default and the
+# maximum numbers of the decay paths of a single request:
+DEFAULT_MIN_PROBABILITY = 0.01
+DEFAULT_DECAY_PATHS = 100
+MAX_DECAY_PATHS = 1000
+
+
+class QueryError(Exception):
+    pass
+
+
+def _parse_float(param, value):
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number):
+        raise QueryError(f"{param} must be a finite number, not {value!r}")
+    return number
+
+
+def _parse_int(param, value):
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    # (the greater numbers are out of the range of the ids of all the backends)
+    if number is None or not 0 < number <= MAX_ID:
+        raise QueryError(
+            f"{param} must be a state id (positive integer), not {value!r}"
+        )
+    return number
+
+
+def _range_filter(column, lookup, value):
+    if column.endswith("lifetime") and lookup == "gte":
+        # the stable states have the infinite (null) lifetimes:
+        return Q(**{f"{column}__gte": value}) | Q(**{f"{column}__isnull": True})
+    return Q(**{f"{column}__{lookup}": value})
+
+
+def _state_filters(params, prefix=""):
+    q = Q()
+    for param, (column, lookup) in RANGE_FILTERS.items():
+        if param in params:
+            value = _parse_float(param, params[param])
+            q &= _range_filter(f"{prefix}{column}", lookup, value)
+    if "el_state" in params:
+        try:
+            el_state_str, _ = canonicalise_and_parse_el_state_str(params["el_state"])
+        except StateParseError:
+            raise QueryError(f"Invalid el_state: {params['el_state']!r}")
+        q &= Q(**{f"{prefix}el_state_str": el_state_str})
+    if "vib_state" in params:
+        q &= Q(**{f"{prefix}vib_state_str": params["vib_state"]})
+    return q
+
+
+def get_filters(category, params):
+    """The filter of the states or transitions (category) queryset, parsed from the
+    query parameters.
+
+    Parameters
+    ----------
+    category : str
+    params : QueryDict or dict
+
+    Returns
+    -------
+    Q or None
+        None if no filters are requested.
+
+    Raises
+    ------
+    QueryError
+        If any of the parameters are invalid.
+    """
+    filters = STATE_FILTERS if category == "states" else TRANSITION_FILTERS
+    for param in TRANSITION_FILTERS:
+        if param in params and param not in filters:
+            raise QueryError(f"{param} only applies to the transitions")
+    params = {param: params[param] for param in filters if param in params}
+    if not params:
+        return None
+    if category == "states":
+        return _state_filters(params)
+
+    q = _state_filters(params, prefix="initial_state__")
+    for param, (column, lookup) in TRANSITION_RANGE_FILTERS.items():
+        if param in params:
+            q &= _range_filter(column, lookup, _parse_float(param, params[param]))
+    for param in "initial_state", "final_state":
+        if param in params:
+            q &= Q(**{f"{param}_id": _parse_int(param, params[param])})
+    return q
+
+
+def get_fields(category, params):
+    """The fields (columns) requested by the comma-separated fields parameter.
+
+    Returns
+    -------
+    list[str] or None
+        None if no projection is requested.
+
+    Raises
+    ------
+    QueryError
+        If any of the fields requested do not exist.
+    """
+    if not params.get("fields"):
+        return None
+    fields = [field.strip() for field in params["fields"].split(",")]
+    available = [
+        *(name for name, _, _ in COLUMNS[category]),
+        *DERIVED_FIELDS[category],
+    ]
+    invalid = [field for field in fields if field not in available]
+    if invalid:
+        raise QueryError(
+            f"Invalid {category} fields: {', '.join(invalid)}; fields must be any of "
+            f"{', '.join(available)}"
+        )
+    # no duplicates, in the order requested:
+    return list(dict.fromkeys(fields))
+
+
+def _is_key_value(field, value):
+    # the keys hold the (string) sort keys and the (integer) primary keys:
+    if field == "pk":
+        return type(value) is int and 0 < value <= MAX_ID
+    return isinstance(value, str)
+
+
+def get_page(category, params):
+    """The page requested by the page_size and cursor (of the next page, as served
+    with the previous page) parameters.
+
+    Returns
+    -------
+    Page or None
+        None if no pagination is requested.
+
+    Raises
+    ------
+    QueryError
+        If the page_size or the cursor is invalid.
+    """
+    if "page_size" not in params:
+        if "cursor" in params:
+            raise QueryError("cursor requires the page_size")
+        return None
+    try:
+        size = int(params["page_size"])
+    except ValueError:
+        size = None
+    if size is None or not 0 < size <= MAX_PAGE_SIZE:
+        raise QueryError(f"page_size must be an integer from 1 to {MAX_PAGE_SIZE}")
+    after = None
+    if params.get("cursor"):
+        try:
+            after = decode_cursor(params["cursor"])
+        except ValueError as e:
+            raise QueryError(str(e))
+        if len(after) != len(KEYSET_ORDERING[category]) or not all(
+            _is_key_value(field, value)
+            for field, value in zip(KEYSET_ORDERING[category], after)
+        ):
+            raise QueryError(f"Invalid cursor of the {category}")
+    return Page(size, after)
+
+
+def _parse_list(param, params, parse, max_length):
+    values = [value.strip() for value in params[param].split(",") if value.strip()]
+    if len(values) > max_length:
+        raise QueryError(f"{param} must not list more than {max_length} values")
+    return [parse(param, value) for value in values]
+
+
+def get_cascade_params(params):
+    """The ids of the initially excited states (the comma-separated initial_state
+    parameter, required) and the times (the comma-separated times parameter, in s)
+    of the cascade populations requested.
+
+    Returns
+    -------
+    tuple[list[int], list[float]]
+
+    Raises
+    ------
+    QueryError
+        If any of the parameters are missing or invalid.
+    """
+    if not params.get("initial_state"):
+        raise QueryError("The cascade requires the initial_state (state ids)")
+    initial_state_ids = _parse_list(
+        "initial_state", params, _parse_int, MAX_CASCADE_STATES
+    )
+    times = []
+    if params.get("times"):
+        times = _parse_list("times", params, _parse_float, MAX_CASCADE_TIMES)
+        if any(time < 0 for time in times):
+            raise QueryError("times must not be negative")
+    return initial_state_ids, times
+
+
+def _state_label_filter(molecule_str, label):
+    # the label as formatted by the State.__str__, e.g. "CO X(1Σ+);v=1", with the
+    # molecule optional:
+    state_str = label.strip()
+    if state_str.startswith(f"{molecule_str} "):
+        state_str = state_str[len(molecule_str) :].strip()
+    parts = [part.strip() for part in state_str.split(";")]
+    vib_state_str = ""
+    if parts[-1].startswith("v="):
+        vib_state_str = parts.pop()[2:]
+    try:
+        el_state_str, _ = canonicalise_and_parse_el_state_str(";".join(parts))
+    except StateParseError:
+        raise QueryError(f"Invalid initial_state: {label!r}")
+    # (the labels list the vibrational quanta without the spaces)
+    vib_state_strs = {vib_state_str, vib_state_str.replace(",", ", ")}
+    return Q(el_state_str=el_state_str, vib_state_str__in=vib_state_strs)
+
+
+def get_decay_paths_params(params, molecule_str):
+    """The filter selecting the initial state (the initial_state parameter, required,
+    either a state id or a state label, e.g. "CO2 v=(0,0,1)"), the minimum
+    probability (the min_probability parameter) and the maximum number (the
+    max_paths parameter) of the decay paths requested.
+
+    Returns
+    -------
+    tuple[Q, float, int]
+
+    Raises
+    ------
+    QueryError
+        If any of the parameters are missing or invalid.
+    """
+    initial_state = params.get("initial_state", "").strip()
+    if not initial_state:
+        raise QueryError("The decay paths require the initial_state (id or label)")
+    if initial_state.isdigit():
+        state_filter = Q(pk=_parse_int("initial_state", initial_state))
+    else:
+        state_filter = _state_label_filter(molecule_str, initial_state)
+
+    min_probability = DEFAULT_MIN_PROBABILITY
+    if "min_probability" in params:
+        min_probability = _parse_float("min_probability", params["min_probability"])
+        if not 0 < min_probability <= 1:
+            raise QueryError("min_probability must be greater than 0 and at most 1")
+    try:
+        max_paths = int(params.get("max_paths", DEFAULT_DECAY_PATHS))
+    except ValueError:
+        max_paths = None
+    if max_paths is None or not 0 < max_paths <= MAX_DECAY_PATHS:
+        raise QueryError(f"max_paths must be an integer from 1 to {MAX_DECAY_PATHS}")
+    return state_filter, min_probability, max_paths
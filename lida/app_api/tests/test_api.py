@@ -0,0 +1,676 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import skipIf, skipUnless
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from app_site.cache import get_cache as get_data_cache
+from app_site.models import Molecule, Isotopologue, State, Transition
+from app_site.snapshot import clear_snapshots, get_snapshot_dir
+from app_site.views.cache import get_cache, get_stats
+from ..artifacts import build_artifact, get_artifacts_dir
+from ..export import stream_text
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# noinspection PyTypeChecker
+class TestApiEndpoint(TestCase):
+    def setUp(self):
+        exports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(exports_root.cleanup)
+        snapshots_root = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshots_root.cleanup)
+        settings_override = self.settings(
+            EXPORTS_ROOT=exports_root.name, SNAPSHOTS_ROOT=snapshots_root.name
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        get_data_cache().clear()
+        self.addCleanup(get_data_cache().clear)
+
+        self.molecule = Molecule.create_from_data(
+            formula_str="CO2", name="carbon dioxide"
+        )
+        self.isotopologue = Isotopologue.create_from_data(
+            self.molecule, iso_formula_str="(12C)(16O)2", dataset_name="name", version=1
+        )
+        self.states = [
+            State.create_from_data(
+                self.isotopologue,
+                lifetime=lifetime,
+                energy=energy,
+                vib_state_str=vib_state_str,
+                vib_state_labels="(v1, v2, v3)",
+            )
+            for lifetime, energy, vib_state_str in [
+                (float("inf"), 0.0, "(0, 0, 0)"),
+                (0.1, 0.1, "(0, 0, 1)"),
+                (0.01, 0.2, "(0, 0, 2)"),
+            ]
+        ]
+        Transition.create_from_data(self.states[1], self.states[0], 0.1)
+        Transition.create_from_data(self.states[2], self.states[1], 0.02)
+        Transition.create_from_data(self.states[2], self.states[0], 0.02)
+
+    def get(self, headers=None, **params):
+        return self.client.get(reverse("api_endpoint"), params, **(headers or {}))
+
+    @staticmethod
+    def raw_content(response):
+        # (streamed, unless served from the response cache)
+        content = response.getvalue()
+        response.close()
+        return content
+
+    def content(self, response):
+        return self.raw_content(response).decode()
+
+    def test_invalid(self):
+        self.assertIn("msg", self.get(molecule="CO2").json())
+        self.assertIn("msg", self.get(molecule="CO2", category="foo").json())
+        self.assertIn(
+            "msg", self.get(molecule="CO2", category="states", format="foo").json()
+        )
+        self.assertEqual(404, self.get(molecule="CO", category="states").status_code)
+
+    def test_states_json(self):
+        response = self.get(molecule="CO2", category="states")
+        self.assertTrue(response.streaming)
+        data = json.loads(self.content(response))
+        self.assertEqual("(12C)(16O)2", data["molecule"]["isotopologue_formula"])
+        self.assertEqual(3, data["dataset"]["number_states"])
+        self.assertEqual(
+            {"lifetime": 0.1, "energy": 0.1}, data["states"][str(self.states[1])]
+        )
+        self.assertEqual(3, len(data["states"]))
+
+    def test_transitions_json(self):
+        response = self.get(molecule="CO2", category="transitions", format="json")
+        data = json.loads(self.content(response))
+        self.assertEqual(3, data["dataset"]["number_transitions"])
+        self.assertEqual(3, len(data["transitions"]))
+        values = data["transitions"][f"{self.states[2]} → {self.states[1]}"]
+        self.assertEqual(0.02, values["partial_lifetime"])
+        self.assertAlmostEqual(-0.1, values["delta_energy"])
+
+    def test_csv(self):
+        response = self.get(molecule="CO2", category="states", format="csv")
+        self.assertEqual("text/csv", response["Content-Type"])
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(["State", "Lifetime /s", "Energy /eV"], rows[0])
+        self.assertEqual([str(self.states[1]), "0.1", "0.1"], rows[2])
+        self.assertEqual(4, len(rows))
+
+        response = self.get(molecule="CO2", category="transitions", format="csv")
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(4, len(rows))
+        self.assertEqual([str(self.states[1]), str(self.states[0])], rows[1][:2])
+
+    def test_ndjson(self):
+        response = self.get(molecule="CO2", category="transitions", format="ndjson")
+        self.assertEqual("application/x-ndjson", response["Content-Type"])
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual("CO2", lines[0]["molecule"]["molecule_formula"])
+        self.assertEqual(4, len(lines))
+        self.assertEqual(
+            {
+                "initial_state": str(self.states[1]),
+                "final_state": str(self.states[0]),
+                "partial_lifetime": 0.1,
+                "delta_energy": -0.1,
+            },
+            lines[1],
+        )
+
+    def test_num_queries(self):
+        # the number of queries does not depend on the number of states/transitions:
+        for vib in range(3, 13):
+            state = State.create_from_data(
+                self.isotopologue,
+                lifetime=0.1,
+                energy=vib / 10,
+                vib_state_str=f"(0, 0, {vib})",
+                vib_state_labels="(v1, v2, v3)",
+            )
+            Transition.create_from_data(state, self.states[0], 0.1)
+        isotopologue = Isotopologue.objects.select_related("molecule").get(
+            pk=self.isotopologue.pk
+        )
+        for category in "states", "transitions":
+            for fmt in "json", "csv", "ndjson":
+                # all the rows projected by a single query:
+                with self.assertNumQueries(1):
+                    "".join(stream_text(isotopologue, category, fmt))
+                # the molecule (with its isotopologue) and all the rows for building
+                # the artifact:
+                with self.assertNumQueries(2):
+                    self.content(
+                        self.get(molecule="CO2", category=category, format=fmt)
+                    )
+                # served from the response cache:
+                with self.assertNumQueries(1):
+                    self.content(
+                        self.get(molecule="CO2", category=category, format=fmt)
+                    )
+
+    def test_snapshots(self):
+        queries = [
+            {"category": "states", "energy_min": 0.05, "fields": "id,vib_state_str"},
+            {"category": "states", "format": "csv", "lifetime_min": 0.05},
+            {"category": "states", "format": "npz", "page_size": 2},
+            {"category": "transitions", "format": "ndjson", "page_size": 2},
+            {"category": "transitions", "format": "csv", "final_state": 0},
+            {
+                "category": "transitions",
+                "format": "npz",
+                "energy_max": 0.15,
+                "fields": "branching_ratio,initial_state_id",
+            },
+        ]
+        responses = []
+        for params in queries:
+            response = self.get(molecule="CO2", **params)
+            responses.append((self.raw_content(response), response.get("Link")))
+        self.addCleanup(clear_snapshots)
+        with self.settings(SNAPSHOTS_ENABLED=True):
+            for params, expected in zip(queries, responses):
+                with self.subTest(**params):
+                    get_cache().clear()
+                    response = self.get(molecule="CO2", **params)
+                    self.assertEqual(
+                        expected, (self.raw_content(response), response.get("Link"))
+                    )
+            # only the molecule (with its isotopologue) queried, the rows served from
+            # the snapshot loaded already:
+            get_cache().clear()
+            with self.assertNumQueries(1):
+                self.content(self.get(molecule="CO2", **queries[1]))
+
+    def test_artifacts(self):
+        artifacts_dir = get_artifacts_dir(self.isotopologue)
+        self.assertEqual(
+            "12C-16O2/name/1", str(artifacts_dir.relative_to(artifacts_dir.parents[2]))
+        )
+        content = self.content(self.get(molecule="CO2", category="states"))
+        (path,) = artifacts_dir.glob("states-*.json.gz")
+        self.assertEqual(content, gzip.open(path, "rt", encoding="utf-8").read())
+
+        # served compressed to the clients accepting it:
+        response = self.get(
+            molecule="CO2",
+            category="states",
+            headers={"HTTP_ACCEPT_ENCODING": "gzip, deflate"},
+        )
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(content, gzip.decompress(self.raw_content(response)).decode())
+
+        # the stale artifact gets rebuilt:
+        state = State.objects.get(pk=self.states[1].pk)
+        state.energy = 0.15
+        state.save()
+        data = json.loads(self.content(self.get(molecule="CO2", category="states")))
+        self.assertEqual(0.15, data["states"][str(state)]["energy"])
+        (new_path,) = artifacts_dir.glob("states-*.json.gz")
+        self.assertNotEqual(path, new_path)
+
+        # deleted transitions are reflected as well:
+        for transition in Transition.objects.filter(initial_state=self.states[2]):
+            transition.delete()
+        lines = self.content(
+            self.get(molecule="CO2", category="transitions", format="ndjson")
+        ).splitlines()
+        self.assertEqual(2, len(lines))
+
+    def test_build_exports_command(self):
+        out = io.StringIO()
+        call_command("build_exports", "CO2", format=["csv", "npz"], stdout=out)
+        self.assertIn("CO2: built 4 export artifacts", out.getvalue())
+        self.assertTrue(get_snapshot_dir(self.isotopologue).is_dir())
+        self.assertEqual(
+            ["states", "states", "transitions", "transitions"],
+            sorted(
+                path.name.split("-")[0]
+                for path in Path(get_artifacts_dir(self.isotopologue)).iterdir()
+            ),
+        )
+
+    def test_build_artifact_concurrent(self):
+        path = build_artifact(self.isotopologue, "states", "csv")
+        # the build for an older fingerprint finishing last keeps the up-to-date
+        # artifact:
+        old_path = build_artifact(
+            self.isotopologue, "states", "csv", fingerprint="0000000000"
+        )
+        self.assertTrue(path.is_file())
+        self.assertTrue(old_path.is_file())
+        # while the build for the current one removes the stale artifact:
+        self.assertEqual(path, build_artifact(self.isotopologue, "states", "csv"))
+        self.assertEqual(
+            [path], list(get_artifacts_dir(self.isotopologue).glob("states-*"))
+        )
+
+    def test_npz(self):
+        response = self.get(molecule="CO2", category="states", format="npz")
+        self.assertIn("12C-16O2__name__states.npz", response["Content-Disposition"])
+        arrays = np.load(io.BytesIO(self.raw_content(response)))
+        self.assertEqual([state.pk for state in self.states], arrays["id"].tolist())
+        self.assertEqual(np.int64, arrays["id"].dtype)
+        self.assertEqual([np.inf, 0.1, 0.01], arrays["lifetime"].tolist())
+        self.assertEqual([0.0, 0.1, 0.2], arrays["energy"].tolist())
+        self.assertEqual("(0, 0, 2)", arrays["vib_state_str"][2])
+
+        response = self.get(molecule="CO2", category="transitions", format="npz")
+        arrays = np.load(io.BytesIO(self.raw_content(response)))
+        self.assertEqual(
+            [self.states[1].pk, self.states[2].pk, self.states[2].pk],
+            arrays["initial_state_id"].tolist(),
+        )
+        self.assertEqual([0.1, 0.02, 0.02], arrays["partial_lifetime"].tolist())
+
+    def test_filters(self):
+        def states(**params):
+            response = self.get(molecule="CO2", category="states", **params)
+            return list(json.loads(self.content(response))["states"])
+
+        def transitions(**params):
+            response = self.get(molecule="CO2", category="transitions", **params)
+            return list(json.loads(self.content(response))["transitions"])
+
+        labels = [str(state) for state in self.states]
+        self.assertEqual(labels[:2], states(energy_max=0.15))
+        self.assertEqual(labels[1:], states(energy_min=0.05, energy_max=1))
+        # the stable states have the infinite lifetime:
+        self.assertEqual([labels[0], labels[1]], states(lifetime_min=0.05))
+        self.assertEqual(labels[1:], states(lifetime_max=1))
+        self.assertEqual([labels[2]], states(vib_state="(0, 0, 2)"))
+        self.assertEqual([], states(el_state="X(1SIGMA+)"))
+
+        # the state filters select the initial states of the transitions:
+        self.assertEqual(
+            [f"{labels[2]} → {labels[1]}", f"{labels[2]} → {labels[0]}"],
+            transitions(energy_min=0.15),
+        )
+        self.assertEqual(
+            [f"{labels[1]} → {labels[0]}"], transitions(partial_lifetime_min=0.05)
+        )
+        self.assertEqual(
+            [f"{labels[2]} → {labels[0]}"],
+            transitions(partial_lifetime_max=0.05, final_state=self.states[0].pk),
+        )
+        self.assertEqual(
+            [f"{labels[2]} → {labels[1]}", f"{labels[2]} → {labels[0]}"],
+            transitions(initial_state=self.states[2].pk),
+        )
+
+        # the binary formats are filtered too:
+        response = self.get(
+            molecule="CO2", category="states", format="npz", energy_min=0.05
+        )
+        self.assertIn("12C-16O2__name__states.npz", response["Content-Disposition"])
+        arrays = np.load(io.BytesIO(self.raw_content(response)))
+        self.assertEqual([0.1, 0.2], arrays["energy"].tolist())
+
+    def test_fields(self):
+        response = self.get(
+            molecule="CO2", category="states", format="csv", fields="id,energy"
+        )
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(["State", "State ID", "Energy /eV"], rows[0])
+        self.assertEqual([str(self.states[1]), str(self.states[1].pk), "0.1"], rows[2])
+
+        response = self.get(
+            molecule="CO2",
+            category="transitions",
+            format="ndjson",
+            fields="partial_lifetime",
+            initial_state=self.states[1].pk,
+        )
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(
+            [
+                {
+                    "initial_state": str(self.states[1]),
+                    "final_state": str(self.states[0]),
+                    "partial_lifetime": 0.1,
+                }
+            ],
+            lines[1:],
+        )
+
+        response = self.get(
+            molecule="CO2", category="transitions", format="npz", fields="delta_energy"
+        )
+        arrays = np.load(io.BytesIO(self.raw_content(response)))
+        self.assertEqual(["delta_energy"], list(arrays))
+
+    def test_derived_fields(self):
+        response = self.get(
+            molecule="CO2", category="states", fields="energy,cascade_lifetime"
+        )
+        data = json.loads(self.content(response))
+        # (the dominant decay chain of the state 2 runs through the state 1)
+        self.assertEqual(
+            {"energy": 0.2, "cascade_lifetime": 0.11},
+            data["states"][str(self.states[2])],
+        )
+        self.assertEqual(0, data["states"][str(self.states[0])]["cascade_lifetime"])
+
+        response = self.get(
+            molecule="CO2",
+            category="transitions",
+            format="csv",
+            fields="branching_ratio",
+            initial_state=self.states[2].pk,
+        )
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual("Branching Ratio", rows[0][-1])
+        self.assertEqual(["0.5", "0.5"], [row[-1] for row in rows[1:]])
+
+        response = self.get(
+            molecule="CO2",
+            category="transitions",
+            format="npz",
+            fields="branching_ratio,partial_lifetime",
+        )
+        arrays = np.load(io.BytesIO(self.raw_content(response)))
+        self.assertEqual(["branching_ratio", "partial_lifetime"], list(arrays))
+        self.assertEqual([1.0, 0.5, 0.5], arrays["branching_ratio"].tolist())
+
+    def test_invalid_filters(self):
+        for params in [
+            {"category": "states", "energy_min": "foo"},
+            {"category": "states", "lifetime_max": "nan"},
+            {"category": "states", "el_state": "foo"},
+            {"category": "states", "partial_lifetime_min": "0.1"},
+            {"category": "transitions", "initial_state": "foo"},
+            {"category": "transitions", "initial_state": "-1"},
+            {"category": "transitions", "final_state": "9" * 23},
+            # (out of the range of the 32-bit ids)
+            {"category": "transitions", "final_state": str(2**31)},
+            {"category": "transitions", "fields": "energy"},
+        ]:
+            with self.subTest(**params):
+                self.assertIn("msg", self.get(molecule="CO2", **params).json())
+
+    def test_pagination(self):
+        labels, cursor = [], None
+        while True:
+            params = {"page_size": 2, **({"cursor": cursor} if cursor else {})}
+            response = self.get(molecule="CO2", category="states", **params)
+            data = json.loads(self.content(response))
+            labels.extend(data["states"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                self.assertFalse(response.has_header("Link"))
+                break
+            self.assertIn(f"cursor={cursor}", response["Link"])
+            self.assertTrue(response["Link"].endswith('>; rel="next"'))
+        self.assertEqual(sorted(map(str, self.states)), labels)
+
+        # the pages are filtered too, and the transitions ordered by their states:
+        response = self.get(
+            molecule="CO2",
+            category="transitions",
+            format="ndjson",
+            page_size=1,
+            energy_min=0.15,
+        )
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(2, len(lines))
+        cursor = lines[0]["next_cursor"]
+        response = self.get(
+            molecule="CO2",
+            category="transitions",
+            format="ndjson",
+            page_size=1,
+            energy_min=0.15,
+            cursor=cursor,
+        )
+        lines += [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(None, lines[2]["next_cursor"])
+        self.assertEqual(
+            {str(self.states[0]), str(self.states[1])},
+            {lines[1]["final_state"], lines[3]["final_state"]},
+        )
+
+        response = self.get(
+            molecule="CO2", category="states", format="npz", page_size=2
+        )
+        self.assertIn('rel="next"', response["Link"])
+        arrays = np.load(io.BytesIO(self.raw_content(response)))
+        self.assertEqual(2, len(arrays["energy"]))
+
+    def test_invalid_pagination(self):
+        for params in [
+            {"page_size": "foo"},
+            {"page_size": 0},
+            {"page_size": 10**6},
+            {"cursor": "WzFd"},
+            {"page_size": 1, "cursor": "foo"},
+            {"page_size": 1, "cursor": "WzFd"},
+            # the keys of invalid types, ["a", "b"] and [[], {}]:
+            {"page_size": 1, "cursor": "WyJhIiwgImIiXQ"},
+            {"page_size": 1, "cursor": "W1tdLCB7fV0"},
+            # the id out of range, ["a", 2**31]:
+            {"page_size": 1, "cursor": "WyJhIiwgMjE0NzQ4MzY0OF0"},
+        ]:
+            with self.subTest(**params):
+                response = self.get(molecule="CO2", category="states", **params)
+                self.assertIn("msg", response.json())
+
+    def test_cascade(self):
+        response = self.get(
+            molecule="CO2",
+            category="cascade",
+            initial_state=self.states[2].pk,
+            times="0,0.01",
+        )
+        data = json.loads(self.content(response))
+        self.assertEqual([0.0, 0.01], data["times"])
+        labels = [str(state) for state in self.states]
+        self.assertEqual(set(labels), set(data["states"]))
+        # the stable state gets all the population eventually:
+        ground, excited = data["states"][labels[0]], data["states"][labels[2]]
+        self.assertIsNone(ground["integrated_population"])
+        self.assertAlmostEqual(1, ground["final_population"])
+        self.assertAlmostEqual(0.01, excited["integrated_population"])
+        self.assertEqual(1, excited["populations"][0])
+        self.assertAlmostEqual(np.exp(-1), excited["populations"][1], places=5)
+
+        response = self.get(
+            molecule="CO2",
+            category="cascade",
+            format="csv",
+            initial_state=self.states[1].pk,
+            times="1",
+        )
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual("Population at 1 s", rows[0][-1])
+        self.assertEqual([labels[0], labels[1]], [row[0] for row in rows[1:]])
+
+        # the repeated (and unordered) times:
+        response = self.get(
+            molecule="CO2",
+            category="cascade",
+            initial_state=self.states[2].pk,
+            times="0.01,0,0.01",
+        )
+        data = json.loads(self.content(response))
+        self.assertEqual([0.01, 0.0, 0.01], data["times"])
+        populations = data["states"][labels[2]]["populations"]
+        self.assertEqual(populations[0], populations[2])
+        self.assertEqual(1, populations[1])
+        self.assertAlmostEqual(np.exp(-1), populations[0], places=5)
+
+    def test_invalid_cascade(self):
+        for params in [
+            {},
+            {"initial_state": "foo"},
+            {"initial_state": self.states[0].pk, "times": "-1"},
+            {"initial_state": self.states[0].pk, "format": "npz"},
+            {"initial_state": 0},
+            {"initial_state": "9" * 23},
+        ]:
+            with self.subTest(**params):
+                response = self.get(molecule="CO2", category="cascade", **params)
+                self.assertIn("msg", response.json())
+
+    def test_decay_paths(self):
+        labels = [str(state) for state in self.states]
+        response = self.get(
+            molecule="CO2", category="decay_paths", initial_state=self.states[2].pk
+        )
+        data = json.loads(self.content(response))
+        self.assertEqual(self.states[2].pk, data["initial_state"])
+        self.assertEqual(
+            [[labels[2], labels[0]], [labels[2], labels[1], labels[0]]],
+            sorted((path["states"] for path in data["paths"]), key=len),
+        )
+        self.assertEqual([0.5, 0.5], [path["probability"] for path in data["paths"]])
+
+        # by the label, with the less probable paths pruned:
+        response = self.get(
+            molecule="CO2",
+            category="decay_paths",
+            format="ndjson",
+            initial_state="CO2 v=(0,0,1)",
+            min_probability=0.5,
+        )
+        lines = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(
+            [
+                {
+                    "probability": 1.0,
+                    "states": labels[1::-1],
+                    "state_ids": [self.states[1].pk, self.states[0].pk],
+                }
+            ],
+            lines[1:],
+        )
+        response = self.get(
+            molecule="CO2",
+            category="decay_paths",
+            format="csv",
+            initial_state="v=(0,0,2)",
+            min_probability=0.6,
+        )
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual([["Probability", "States", "State IDs"]], rows)
+
+    def test_invalid_decay_paths(self):
+        for params in [
+            {},
+            {"initial_state": "CO2 v=(0,1,0)"},
+            {"initial_state": "9" * 23},
+            {"initial_state": "foo;v=1"},
+            {"initial_state": self.states[0].pk, "min_probability": "0"},
+            {"initial_state": self.states[0].pk, "max_paths": "10000"},
+            {"initial_state": self.states[0].pk, "format": "npz"},
+        ]:
+            with self.subTest(**params):
+                response = self.get(molecule="CO2", category="decay_paths", **params)
+                self.assertIn("msg", response.json())
+
+    @skipUnless(pyarrow, "pyarrow not installed")
+    def test_arrow_parquet(self):
+        response = self.get(molecule="CO2", category="states", format="arrow")
+        table = pyarrow.ipc.open_file(
+            pyarrow.py_buffer(self.raw_content(response))
+        ).read_all()
+        self.assertEqual([np.inf, 0.1, 0.01], table.column("lifetime").to_pylist())
+        response = self.get(molecule="CO2", category="transitions", format="parquet")
+        table = pyarrow.parquet.read_table(
+            pyarrow.py_buffer(self.raw_content(response))
+        )
+        self.assertEqual(
+            [0.1, 0.02, 0.02], table.column("partial_lifetime").to_pylist()
+        )
+
+    @skipIf(pyarrow, "pyarrow installed")
+    def test_arrow_parquet_unavailable(self):
+        for fmt in "arrow", "parquet":
+            response = self.get(molecule="CO2", category="states", format=fmt)
+            self.assertIn("pyarrow", response.json()["msg"])
+
+    def test_conditional_get(self):
+        response = self.get(molecule="CO2", category="states", format="csv")
+        self.content(response)
+        etag = response["ETag"]
+        # the molecule (with its isotopologue) only:
+        with self.assertNumQueries(1):
+            response = self.get(
+                molecule="CO2",
+                category="states",
+                format="csv",
+                headers={"HTTP_IF_NONE_MATCH": etag},
+            )
+        self.assertEqual(304, response.status_code)
+        response = self.get(
+            molecule="CO2",
+            category="states",
+            format="csv",
+            headers={"HTTP_IF_MODIFIED_SINCE": response["Last-Modified"]},
+        )
+        self.assertEqual(304, response.status_code)
+
+        for transition in Transition.objects.filter(initial_state=self.states[2]):
+            transition.delete()
+        response = self.get(
+            molecule="CO2",
+            category="states",
+            format="csv",
+            headers={"HTTP_IF_NONE_MATCH": etag},
+        )
+        self.assertEqual(200, response.status_code)
+        self.content(response)
+
+    def test_response_cache(self):
+        response = self.get(molecule="CO2", category="states", format="csv")
+        content = self.content(response)
+        self.assertEqual({"hits": 0, "misses": 1, "hit_ratio": 0.0}, get_stats())
+        response = self.get(molecule="CO2", category="states", format="csv")
+        self.assertEqual(content, self.content(response))
+        self.assertEqual("text/csv", response["Content-Type"])
+        self.assertEqual({"hits": 1, "misses": 1, "hit_ratio": 0.5}, get_stats())
+        # the gzip-encoded response is cached separately:
+        response = self.get(
+            molecule="CO2",
+            category="states",
+            format="csv",
+            headers={"HTTP_ACCEPT_ENCODING": "gzip"},
+        )
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertEqual(2, get_stats()["misses"])
+
+        # any change of the data bumps the isotopologue generation, so the stale
+        # response is never served:
+        state = State.objects.get(pk=self.states[1].pk)
+        state.energy = 0.15
+        state.save()
+        response = self.get(molecule="CO2", category="states", format="csv")
+        self.assertIn("0.15", self.content(response))
+        self.assertEqual(3, get_stats()["misses"])
+
+        # the responses too big are not cached:
+        with self.settings(RESPONSE_CACHE_MAX_SIZE=10):
+            for _ in range(2):
+                self.raw_content(
+                    self.get(molecule="CO2", category="states", format="npz")
+                )
+        self.assertEqual(5, get_stats()["misses"])
@@ -1,47 +1,135 @@
-import io
-import csv
+import gzip
 from django.utils.datastructures import MultiValueDictKeyError
 from django.views.generic import TemplateView
-from django.http import JsonResponse, Http404, HttpResponse
+from django.http import (JsonResponse, Http404, FileResponse, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils.cache import patch_vary_headers
 #from django.core import serializers
 
+from app_site.cascade import (CascadeError, find_decay_paths, get_decay_graph,
+                               get_rate_matrix, solve_cascade)
+from app_site.keyset import encode_cursor
 from app_site.models.molecule import Molecule
-from app_site.models.transition import Transition
+from app_site.views.cache import cached_response
+from app_site.views.conditional import conditional_get
+from .artifacts import get_artifact
+from .export import (BINARY_FORMATS, TEXT_FORMATS, ExportError, export_binary,
+                     get_next_page, stream_cascade, stream_decay_paths,
+                     stream_text)
+from .query import (QueryError, get_cascade_params, get_decay_paths_params,
+                    get_fields, get_filters, get_page)
 
 class ApiAboutView(TemplateView):
     template_name = "api/about.html"
     extra_context = {"title": "API", "content_heading": "Requesting LiDB data through the API"}
 
 
-
-def get_state_lifetimes_dict(isotopologue, states):
-    return dict([(str(state), {'lifetime': state.lifetime,
-                               'energy': state.energy}) for state in states])
- 
-def get_transition_lifetimes_dict(isotopologue, transitions):
-    return dict([(str(transition), {'partial_lifetime': transition.partial_lifetime,
-                                    'delta_energy': transition.delta_energy})
-                 for transition in transitions])
- 
-def get_state_lifetimes_csv(isotopologue, states):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["State", "Lifetime /s", "Energy /eV"])
-    for state in states:
-        csv_row_data = [str(state), state.lifetime, state.energy]
-        writer.writerow(csv_row_data)
-    return output.getvalue()
-
-def get_transitions_lifetimes_csv(isotopologue, transitions):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Initial State", "Final State", "Partial Lifetime /s",
-                     "Delta Energy /eV"])
-    for transition in transitions:
-        csv_row_data = [transition.initial_state, transition.final_state,
-                        transition.partial_lifetime, transition.delta_energy]
-        writer.writerow(csv_row_data)
-    return output.getvalue()
+def get_file_name(isotopologue, category, fmt):
+    extension, _ = BINARY_FORMATS[fmt]
+    return (f'{isotopologue.iso_slug}__{isotopologue.dataset_name}__'
+            f'{category}.{extension}')
+
+def iter_decompressed(path):
+    # the file gets closed when the response closes the generator:
+    with gzip.open(path, 'rb') as fp:
+        while True:
+            block = fp.read(FileResponse.block_size)
+            if not block:
+                return
+            yield block
+
+def get_artifact_response(request, isotopologue, category, fmt, fingerprint=None):
+    """Serve the precomputed export artifact (built lazily if missing or stale).
+    The gzip-compressed text artifacts are served as they are to the clients
+    accepting gzip encoding, and decompressed on the fly for the others."""
+    try:
+        path = get_artifact(isotopologue, category, fmt, fingerprint=fingerprint)
+    except ExportError as e:
+        return JsonResponse({'msg': str(e)})
+    if fmt in BINARY_FORMATS:
+        _, content_type = BINARY_FORMATS[fmt]
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=get_file_name(isotopologue, category, fmt),
+                            content_type=content_type)
+
+    _, content_type = TEXT_FORMATS[fmt]
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(iter_decompressed(path),
+                                         content_type=content_type)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+def get_query_response(request, isotopologue, category, fmt, filters, fields,
+                       page):
+    """Serve the filtered, projected and/or paginated table (not precomputed)
+    straight from the database, with only the rows and columns requested queried.
+    The cursor of the next page (if any) is served in the "next_cursor" entry of
+    the JSON and NDJSON meta-data, and in the Link header of all the formats."""
+    next_cursor = None
+    if page is not None:
+        next_page = get_next_page(isotopologue, category, page, filters=filters)
+        if next_page is not None:
+            next_cursor = encode_cursor(next_page.after)
+
+    if fmt in BINARY_FORMATS:
+        try:
+            content = export_binary(isotopologue, category, fmt, filters=filters,
+                                    fields=fields, page=page)
+        except ExportError as e:
+            return JsonResponse({'msg': str(e)})
+        _, content_type = BINARY_FORMATS[fmt]
+        response = HttpResponse(content, content_type=content_type)
+        file_name = get_file_name(isotopologue, category, fmt)
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    else:
+        _, content_type = TEXT_FORMATS[fmt]
+        meta = {'next_cursor': next_cursor} if page is not None else None
+        response = StreamingHttpResponse(
+            stream_text(isotopologue, category, fmt, filters=filters,
+                        fields=fields, page=page, meta=meta),
+            content_type=content_type)
+    if next_cursor is not None:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+        response['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+def get_cascade_response(isotopologue, fmt, initial_state_ids, times):
+    """Serve the cascade populations following the excitation of the initial
+    states, solved from the rate matrix of all the isotopologue transitions."""
+    try:
+        cascade = solve_cascade(get_rate_matrix(isotopologue), initial_state_ids,
+                                times)
+    except CascadeError as e:
+        return JsonResponse({'msg': str(e)})
+    _, content_type = TEXT_FORMATS[fmt]
+    return StreamingHttpResponse(stream_cascade(isotopologue, cascade, fmt),
+                                 content_type=content_type)
+
+def get_decay_paths_response(isotopologue, fmt, state_filter, min_probability,
+                             max_paths):
+    """Serve the decay paths of the initial state, streamed as they are found by
+    the search of the (cached) decay graph of the isotopologue transitions."""
+    initial_state_id = isotopologue.state_set.filter(state_filter).values_list(
+        'pk', flat=True).first()
+    if initial_state_id is None:
+        return JsonResponse({'msg': 'The initial_state is not a state of the '
+                                    'molecule'})
+    try:
+        paths = find_decay_paths(get_decay_graph(isotopologue), initial_state_id,
+                                 min_probability, max_paths)
+    except CascadeError as e:
+        return JsonResponse({'msg': str(e)})
+    meta = {'initial_state': initial_state_id, 'min_probability': min_probability,
+            'max_paths': max_paths}
+    _, content_type = TEXT_FORMATS[fmt]
+    return StreamingHttpResponse(
+        stream_decay_paths(isotopologue, paths, fmt, meta=meta),
+        content_type=content_type)
 
 def api_endpoint(request):
     try:
@@ -50,61 +138,65 @@ def api_endpoint(request):
     except MultiValueDictKeyError:
         json_response = {'msg': 'API query must include molecule and category'}
         return JsonResponse(json_response)
-    if category not in ('states', 'transitions'):
-        json_response = {'msg': 'category must be one of states or transitions'}
+    if category not in ('states', 'transitions', 'cascade', 'decay_paths'):
+        json_response = {'msg': 'category must be one of states, transitions, '
+                                'cascade or decay_paths'}
         return JsonResponse(json_response)
 
     try:
-        molecule = Molecule.objects.get(formula_str=molecule)
+        molecule = Molecule.objects.select_related('isotopologue').get(
+            formula_str=molecule)
     except Molecule.DoesNotExist:
         raise Http404
     isotopologue = molecule.isotopologue
 
     fmt = request.GET.get('format', 'json').lower()
 
-    if fmt not in ('json', 'csv'):
+    if fmt not in ('json', 'csv', 'ndjson', *BINARY_FORMATS):
         json_response = {'msg': f"{fmt} is not a supported output format; format"
-                                f" must be one of 'json' or 'csv'."}
+                                f" must be one of 'json', 'csv', 'ndjson', 'npz', "
+                                f"'parquet' or 'arrow'."}
         return JsonResponse(json_response)
 
-    if category == 'states':
-        states = isotopologue.state_set.all()
-    else:
-        transitions = Transition.objects.filter(initial_state__isotopologue=isotopologue)
-
-    if fmt == 'csv':
-        if category == 'states':
-            return HttpResponse(get_state_lifetimes_csv(isotopologue, states),
-                                content_type='text/csv')
+    try:
+        if category == 'cascade':
+            if fmt not in TEXT_FORMATS:
+                raise QueryError("The cascade format must be one of 'json', 'csv' "
+                                 "or 'ndjson'.")
+            initial_state_ids, times = get_cascade_params(request.GET)
+        elif category == 'decay_paths':
+            if fmt not in TEXT_FORMATS:
+                raise QueryError("The decay paths format must be one of 'json', "
+                                 "'csv' or 'ndjson'.")
+            state_filter, min_probability, max_paths = get_decay_paths_params(
+                request.GET, str(molecule))
         else:
-            return HttpResponse(get_transitions_lifetimes_csv(isotopologue,
-                                transitions),
-                                content_type='text/csv')
-
-    #molecule = serializers.serialize('json', [molecule,])
-    molecule_formula = molecule.formula_str
-    isotopologue_formula = isotopologue.iso_formula_str
-    dataset_name = isotopologue.dataset_name
-    version = isotopologue.version
-    number_states = isotopologue.number_states
-    number_transitions = isotopologue.number_transitions
-    molecule_dict = {'molecule_formula': molecule_formula,
-                     'isotopologue_formula': isotopologue_formula,
-                    }
-    dataset_dict = {'name': dataset_name,
-                    'version': version,
-                    'number_states': number_states,
-                    'number_transitions': number_transitions
-                   }
-
-    json_response = {'molecule': molecule_dict, 'dataset': dataset_dict}
-
-    if category == 'states':
-        json_response['states'] = get_state_lifetimes_dict(isotopologue, states)
+            filters = get_filters(category, request.GET)
+            fields = get_fields(category, request.GET)
+            page = get_page(category, request.GET)
+    except QueryError as e:
+        return JsonResponse({'msg': str(e)})
+
+    # the whole tables in all the formats are served from the export artifacts
+    # (or from the response cache), rather than re-serialising the (rarely
+    # changing) data from the database on each request, and not served at all if
+    # the client has them already:
+    fingerprint = isotopologue.get_data_fingerprint()
+    if category == 'cascade':
+        get_response = lambda: get_cascade_response(
+            isotopologue, fmt, initial_state_ids, times)
+    elif category == 'decay_paths':
+        get_response = lambda: get_decay_paths_response(
+            isotopologue, fmt, state_filter, min_probability, max_paths)
+    elif filters is None and fields is None and page is None:
+        get_response = lambda: get_artifact_response(
+            request, isotopologue, category, fmt, fingerprint=fingerprint)
     else:
-        json_response['transitions'] = get_transition_lifetimes_dict(
-                                                    isotopologue, transitions)
-
-    return JsonResponse(json_response)
-
-
+        get_response = lambda: get_query_response(
+            request, isotopologue, category, fmt, filters, fields, page)
+    return conditional_get(
+        request,
+        lambda: cached_response(request, isotopologue.get_cache_version(),
+                                get_response),
+        etag=isotopologue.get_etag(fingerprint=fingerprint),
+        last_modified=isotopologue.get_data_last_modified())
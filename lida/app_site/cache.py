@@ -0,0 +1,16 @@
+"""Cache of the data derived from the whole datasets of the isotopologues (e.g. the
+decay columns and the decay graph, see app_site.cascade), stored in the
+settings.CACHES[CACHE_ALIAS] cache backend, apart from the responses cache (see
+app_site.views.cache), so the derived data are never evicted by the responses.
+
+The cache keys are versioned by the data they are derived from (see
+Isotopologue.get_cache_version), so the stale entries are never read and never need
+invalidating explicitly.
+"""
+from django.core.cache import caches
+
+CACHE_ALIAS = "data"
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
@@ -0,0 +1,421 @@
+"""Radiative cascade of the state populations of an isotopologue.
+
+The state lifetimes and the transition partial lifetimes define the linear rate
+equations of the state populations n:
+
+    dn/dt = M n,  M[f, i] = 1 / partial_lifetime(i -> f),  M[i, i] = -1 / lifetime(i)
+
+with the stable states (null lifetime) never decaying. M is a sparse matrix with a
+single off-diagonal entry per transition, built from the columns of the states and
+of the transitions fetched by a single query each.
+
+For an initial excitation n(0) of some of the states, the following are solved by
+the sparse linear algebra, only over the states reachable from the excited states:
+
+* the time-integrated populations of the unstable states (the mean times spent in
+  each state), T = -inv(M_uu) n(0), by a single sparse LU solve. These are equal to
+  the steady-state populations under a constant pumping rate n(0) into the states;
+* the final populations of the stable states, n(0) + M_su T;
+* the populations at the requested times, n(t) = expm(M t) n(0), integrated by the
+  implicit (stiff) BDF method with the sparse Jacobian M, as the lifetimes often
+  span many orders of magnitude.
+
+The derived decay columns of all the states and transitions of an isotopologue (the
+branching ratios and the cascade lifetimes, see DecayColumns) are computed by a
+single vectorised pass over the columns, and cached per version of the isotopologue
+data.
+
+The decay paths of a state (the chains of its transitions down to the states with
+no transitions, e.g. the stable ground state) are enumerated by a best-first search
+over the DecayGraph of the isotopologue (the transitions of each state with their
+branching ratios, in the compressed sparse row layout), cached per version of the
+isotopologue data. As the probability of a path only decreases as the path is
+extended, the paths are found in the order of their decreasing probabilities, and
+the partial paths less probable than a threshold are never extended.
+"""
+
+import heapq
+import itertools
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+from scipy.integrate import solve_ivp
+from scipy.sparse.csgraph import breadth_first_order
+from scipy.sparse.linalg import splu
+
+from .cache import get_cache
+from .models.transition import Transition
+
+# the relative and absolute tolerances of the time-dependent populations:
+RTOL, ATOL = 1e-8, 1e-12
+
+# state_ids: the ids of the states (the rows and columns of the matrix), sorted,
+# matrix: the sparse rate matrix M (in 1/s, see the module docstring), in the CSC
+# format,
+# decay_rates: the total decay rates of the states (0 for the stable states),
+# energies: the energies of the states:
+RateMatrix = namedtuple("RateMatrix", "state_ids matrix decay_rates energies")
+
+# state_ids: the ids of the states reached by the cascade (incl. the excited ones),
+# populations: the populations of these states at the times requested (an array of
+# shape (number of the times, number of the states)), or None,
+# integrated: the time-integrated populations (in s), nan for the stable states,
+# final: the final populations, 0 for the unstable states:
+Cascade = namedtuple("Cascade", "state_ids times populations integrated final")
+
+
+# state_ids: the ids of all the states, sorted,
+# cascade_lifetime: the sums of the lifetimes of the states along their dominant
+# decay chains (following the transitions with the greatest branching ratios), from
+# the state down to a stable state (or to a state with no transitions known), nan
+# if there is no such chain,
+# transition_ids: the ids of all the transitions, sorted,
+# branching_ratio: the branching ratios of the transitions, i.e. the lifetimes of
+# their initial states over their partial lifetimes:
+DecayColumns = namedtuple(
+    "DecayColumns", "state_ids cascade_lifetime transition_ids branching_ratio"
+)
+
+# state_ids: the ids of all the states, sorted,
+# indptr, targets: the transitions graph in the CSR layout, i.e. the indices of the
+# final states of the transitions of the state i are targets[indptr[i]:indptr[i + 1]],
+# ordered by their decreasing branching ratios,
+# probabilities: the branching ratios of the transitions (the targets):
+DecayGraph = namedtuple("DecayGraph", "state_ids indptr targets probabilities")
+
+# state_ids: the ids of the states along the path, from the initial state,
+# probability: the product of the branching ratios of the transitions of the path:
+DecayPath = namedtuple("DecayPath", "state_ids probability")
+
+
+class CascadeError(Exception):
+    pass
+
+
+def build_rate_matrix(
+    state_ids, lifetimes, energies, initial_ids, final_ids, partial_lifetimes
+):
+    """Build the RateMatrix from the states and transitions columns.
+
+    Parameters
+    ----------
+    state_ids : array_like of int
+    lifetimes : array_like of float
+        The lifetimes of the states (nan or inf for the stable states).
+    energies : array_like of float
+    initial_ids, final_ids, partial_lifetimes : array_like
+        The columns of the transitions between the states.
+
+    Returns
+    -------
+    RateMatrix
+    """
+    state_ids = np.asarray(state_ids, dtype=np.int64)
+    order = np.argsort(state_ids)
+    state_ids = state_ids[order]
+    lifetimes = np.asarray(lifetimes, dtype=np.float64)[order]
+    energies = np.asarray(energies, dtype=np.float64)[order]
+    partial_lifetimes = np.asarray(partial_lifetimes, dtype=np.float64)
+    # (the transitions with no meaningful partial lifetime do not contribute)
+    valid = partial_lifetimes > 0
+    rows = np.searchsorted(state_ids, np.asarray(final_ids, dtype=np.int64)[valid])
+    columns = np.searchsorted(state_ids, np.asarray(initial_ids, dtype=np.int64)[valid])
+    rates = 1 / partial_lifetimes[valid]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        decay_rates = np.where(lifetimes > 0, 1 / lifetimes, 0)
+    # the states never decay slower than through the transitions listed (which
+    # would create the population out of nothing):
+    size = len(state_ids)
+    decay_rates = np.maximum(
+        decay_rates, np.bincount(columns, weights=rates, minlength=size)
+    )
+    matrix = sparse.coo_matrix(
+        (
+            np.concatenate([rates, -decay_rates]),
+            (
+                np.concatenate([rows, np.arange(size)]),
+                np.concatenate([columns, np.arange(size)]),
+            ),
+        ),
+        shape=(size, size),
+    ).tocsc()
+    return RateMatrix(state_ids, matrix, decay_rates, energies)
+
+
+def get_rate_matrix(isotopologue):
+    """The RateMatrix of all the states and transitions of the isotopologue."""
+    # (the null lifetimes of the stable states are fetched as nan)
+    states = np.array(
+        list(isotopologue.state_set.values_list("pk", "lifetime", "energy")),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    transitions = np.array(
+        list(
+            Transition.objects.filter(
+                initial_state__isotopologue=isotopologue
+            ).values_list("initial_state_id", "final_state_id", "partial_lifetime")
+        ),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    return build_rate_matrix(*states.T, *transitions.T)
+
+
+def compute_decay_columns(
+    state_ids, lifetimes, transition_ids, initial_ids, final_ids, partial_lifetimes
+):
+    """Compute the DecayColumns from the states and transitions columns.
+
+    Parameters
+    ----------
+    state_ids : array_like of int
+    lifetimes : array_like of float
+        The lifetimes of the states (nan or inf for the stable states).
+    transition_ids, initial_ids, final_ids, partial_lifetimes : array_like
+        The columns of the transitions between the states.
+
+    Returns
+    -------
+    DecayColumns
+    """
+    state_ids = np.asarray(state_ids, dtype=np.int64)
+    order = np.argsort(state_ids)
+    state_ids = state_ids[order]
+    lifetimes = np.asarray(lifetimes, dtype=np.float64)[order]
+    lifetimes[np.isinf(lifetimes)] = np.nan
+    transition_ids = np.asarray(transition_ids, dtype=np.int64)
+    order = np.argsort(transition_ids)
+    transition_ids = transition_ids[order]
+    initial = np.searchsorted(state_ids, np.asarray(initial_ids, dtype=np.int64)[order])
+    final = np.searchsorted(state_ids, np.asarray(final_ids, dtype=np.int64)[order])
+    partial_lifetimes = np.asarray(partial_lifetimes, dtype=np.float64)[order]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        branching_ratio = lifetimes[initial] / partial_lifetimes
+
+    # the dominant (the shortest partial lifetime) transition of each state:
+    by_state = np.lexsort((partial_lifetimes, initial))
+    dominant_states, first = np.unique(initial[by_state], return_index=True)
+    following = np.full(len(state_ids), -1)
+    following[dominant_states] = final[by_state[first]]
+    # the lifetimes summed along the dominant decay chains by the pointer jumping,
+    # doubling the lengths of the chains summed by each pass:
+    cascade_lifetime = np.nan_to_num(lifetimes)
+    for _ in range(int(np.log2(max(len(state_ids), 1))) + 1):
+        chained = following >= 0
+        if not chained.any():
+            break
+        cascade_lifetime[chained] += cascade_lifetime[following[chained]]
+        following[chained] = following[following[chained]]
+    # (any chains left are cyclic, with no stable end)
+    cascade_lifetime[following >= 0] = np.nan
+    return DecayColumns(state_ids, cascade_lifetime, transition_ids, branching_ratio)
+
+
+def get_decay_columns(isotopologue):
+    """The DecayColumns of all the states and transitions of the isotopologue,
+    cached per version of the isotopologue data.
+    """
+    cache = get_cache()
+    key = f"decay-columns:{isotopologue.get_cache_version()}"
+    decay_columns = cache.get(key)
+    if decay_columns is None:
+        states = np.array(
+            list(isotopologue.state_set.values_list("pk", "lifetime")),
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        transitions = np.array(
+            list(
+                Transition.objects.filter(
+                    initial_state__isotopologue=isotopologue
+                ).values_list(
+                    "pk", "initial_state_id", "final_state_id", "partial_lifetime"
+                )
+            ),
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        decay_columns = compute_decay_columns(*states.T, *transitions.T)
+        cache.set(key, decay_columns)
+    return decay_columns
+
+
+def build_decay_graph(rate_matrix):
+    """Build the DecayGraph from the RateMatrix.
+
+    Parameters
+    ----------
+    rate_matrix : RateMatrix
+
+    Returns
+    -------
+    DecayGraph
+    """
+    state_ids, matrix, decay_rates, _ = rate_matrix
+    # the transitions graph (initial -> final) is the transposed rate matrix,
+    # without its diagonal:
+    graph = sparse.coo_matrix(matrix.T)
+    transitions = graph.row != graph.col
+    initial, final = graph.row[transitions], graph.col[transitions]
+    probabilities = graph.data[transitions] / decay_rates[initial]
+    order = np.lexsort((-probabilities, initial))
+    indptr = np.zeros(len(state_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(initial, minlength=len(state_ids)), out=indptr[1:])
+    return DecayGraph(
+        state_ids, indptr, final[order].astype(np.int64), probabilities[order]
+    )
+
+
+def get_decay_graph(isotopologue):
+    """The DecayGraph of all the states and transitions of the isotopologue, cached
+    per version of the isotopologue data.
+    """
+    cache = get_cache()
+    key = f"decay-graph:{isotopologue.get_cache_version()}"
+    decay_graph = cache.get(key)
+    if decay_graph is None:
+        decay_graph = build_decay_graph(get_rate_matrix(isotopologue))
+        cache.set(key, decay_graph)
+    return decay_graph
+
+
+def find_decay_paths(decay_graph, initial_state_id, min_probability, max_paths=None):
+    """Find the decay paths of the initial state, from the most probable one.
+
+    The paths end in the states with no transitions (e.g. the stable states), and
+    the partial paths less probable than min_probability are not extended.
+
+    Parameters
+    ----------
+    decay_graph : DecayGraph
+    initial_state_id : int
+    min_probability : float
+        The minimum probability (greater than 0) of the paths found.
+    max_paths : int, optional
+        The maximum number of the (most probable) paths found.
+
+    Returns
+    -------
+    generator[DecayPath]
+        The paths in the order of their decreasing probabilities.
+
+    Raises
+    ------
+    CascadeError
+        If the initial state is not a state of the decay_graph.
+    """
+    state_ids = decay_graph.state_ids
+    initial = np.searchsorted(state_ids, initial_state_id)
+    if initial == len(state_ids) or state_ids[initial] != initial_state_id:
+        raise CascadeError(f"Not a state of the isotopologue: {initial_state_id}")
+    return _iter_decay_paths(decay_graph, int(initial), min_probability, max_paths)
+
+
+def _iter_decay_paths(decay_graph, initial, min_probability, max_paths):
+    state_ids, indptr, targets, probabilities = decay_graph
+    # (the ties broken by the order of the pushes, never comparing the paths)
+    counter = itertools.count()
+    heap = [(-1.0, next(counter), (initial,))]
+    found = 0
+    while heap and found != max_paths:
+        probability, _, path = heapq.heappop(heap)
+        probability = -probability
+        start, end = indptr[path[-1]], indptr[path[-1] + 1]
+        if start == end:
+            yield DecayPath(state_ids[list(path)].tolist(), float(probability))
+            found += 1
+            continue
+        for j in range(start, end):
+            extended = probability * probabilities[j]
+            if extended < min_probability:
+                # (the following transitions are even less probable)
+                break
+            target = int(targets[j])
+            if target not in path:
+                heapq.heappush(heap, (-extended, next(counter), (*path, target)))
+
+
+def solve_cascade(rate_matrix, initial_state_ids, times=None):
+    """Solve the cascade of the populations from the equal excitation of the initial
+    states (normalised to the total population of 1).
+
+    Parameters
+    ----------
+    rate_matrix : RateMatrix
+    initial_state_ids : list[int]
+    times : list[float], optional
+        The times (in s) of the populations requested.
+
+    Returns
+    -------
+    Cascade
+
+    Raises
+    ------
+    CascadeError
+        If any of the initial states are not the states of the rate_matrix, or if
+        the cascade never decays into any stable states (cyclic transitions).
+    """
+    state_ids, matrix, decay_rates, _ = rate_matrix
+    initial_state_ids = np.unique(np.asarray(initial_state_ids, dtype=np.int64))
+    unknown = initial_state_ids[~np.isin(initial_state_ids, state_ids)]
+    if len(unknown):
+        raise CascadeError(
+            f"Not the states of the isotopologue: {', '.join(map(str, unknown))}"
+        )
+    initial = np.searchsorted(state_ids, initial_state_ids)
+
+    # restricted to the states reachable from the initial states (the transitions
+    # graph being the transposed rate matrix, with the edges initial -> final):
+    graph = matrix.T.tocsr()
+    reached = np.unique(
+        np.concatenate(
+            [breadth_first_order(graph, i, return_predecessors=False) for i in initial]
+        )
+    )
+    matrix = matrix[reached][:, reached].tocsc()
+    decay_rates = decay_rates[reached]
+    n0 = np.isin(reached, initial) / len(initial)
+
+    unstable = decay_rates > 0
+    integrated = np.full(len(reached), np.nan)
+    final = np.where(unstable, 0.0, n0)
+    if unstable.any():
+        matrix_uu = matrix[unstable][:, unstable].tocsc()
+        try:
+            integrated[unstable] = splu(-matrix_uu).solve(n0[unstable])
+        except RuntimeError:
+            # (the singular matrix of the cyclic transitions never decaying)
+            raise CascadeError(
+                "The cascade is trapped by the cyclic transitions of no stable end"
+            )
+        final[~unstable] += matrix[~unstable][:, unstable] @ integrated[unstable]
+
+    populations = None
+    if times:
+        populations = _integrate(matrix, n0, times)
+    # (the states ordered by their ids, as are the reached indices)
+    return Cascade(state_ids[reached], times, populations, integrated, final)
+
+
+def _integrate(matrix, n0, times):
+    # (the solver requires strictly increasing times, so the populations at the
+    # distinct times are mapped back to all the times passed, repeated included)
+    times, inverse = np.unique(np.asarray(times, dtype=np.float64), return_inverse=True)
+    t_max = times[-1]
+    if t_max == 0:
+        return np.tile(n0, (len(inverse), 1))
+    solution = solve_ivp(
+        lambda t, n: matrix @ n,
+        (0, t_max),
+        n0,
+        method="BDF",
+        t_eval=times,
+        jac=matrix,
+        rtol=RTOL,
+        atol=ATOL,
+    )
+    if not solution.success:
+        raise CascadeError(f"The cascade integration failed: {solution.message}")
+    # (with the round-off negative populations of the depleted states cut off)
+    return np.maximum(solution.y.T, 0)[inverse]
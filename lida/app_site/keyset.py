@@ -0,0 +1,59 @@
+"""Keyset (cursor) pagination helpers, shared by the data tables (see
+app_site.views.keyset) and the API pages: the rows following a page are selected by
+the values of the ordering fields (the key) of the last row of the page, rather than
+by the OFFSET, and the keys are passed to the clients as opaque cursors.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+
+def keyset_filter(order_by, key):
+    """Filter of the rows following the row with the key in the order_by ordering.
+
+    Parameters
+    ----------
+    order_by : list[str]
+        The ordering fields (prefixed by "-" if descending), needs to be a total
+        ordering (e.g. ending with the "pk") of non-null fields.
+    key : list
+        The values of the order_by fields of the last row preceding the rows
+        selected.
+
+    Returns
+    -------
+    Q
+    """
+    q = Q()
+    equal = {}
+    for field, value in zip(order_by, key):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        q |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return q
+
+
+def encode_cursor(key):
+    """The URL-safe (unpadded base64) cursor of the key."""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """The key encoded by the encode_cursor.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is invalid.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(f"{cursor}{padding}".encode()))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(key, list):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return key
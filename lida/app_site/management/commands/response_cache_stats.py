@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app_site.views.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the hit and miss counts of the response cache (only meaningful for "
+        "the cache backends shared by the processes, such as file-based or Redis)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counts once printed."
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        hit_ratio = stats["hit_ratio"]
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: "
+            + (f"{hit_ratio:.1%}" if hit_ratio is not None else "-")
+        )
+        if options["reset"]:
+            reset_stats()
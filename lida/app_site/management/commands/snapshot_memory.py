@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from app_site.models import Isotopologue
+from app_site.snapshot import open_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the memory used by the snapshot of each molecule (see "
+        "app_site.snapshot), i.e. the size of its memory-mapped files, shared by all "
+        "the serving processes. The missing snapshot files get written."
+    )
+
+    def handle(self, *args, **options):
+        total = 0
+        for isotopologue in Isotopologue.objects.select_related("molecule"):
+            snapshot = open_snapshot(isotopologue)
+            total += snapshot.nbytes
+            self.stdout.write(
+                f"{snapshot.molecule_str}: {snapshot.nbytes / 1e6:.1f} MB "
+                f"({len(snapshot.states)} states, "
+                f"{len(snapshot.transitions)} transitions)"
+            )
+        self.stdout.write(f"total: {total / 1e6:.1f} MB")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from app_site.models import Isotopologue
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-count the number_states and number_transitions counters of isotopologues "
+        "and the number_transitions_from/to counters of their states, fixing any drift "
+        "of the incrementally maintained counters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "molecules",
+            nargs="*",
+            metavar="formula_str",
+            help="Formulas of the molecules to sync (all the molecules by default).",
+        )
+
+    def handle(self, *args, **options):
+        isotopologues = Isotopologue.objects.select_related("molecule")
+        if options["molecules"]:
+            isotopologues = isotopologues.filter(
+                molecule__formula_str__in=options["molecules"]
+            )
+        for isotopologue in isotopologues:
+            counters_orig = (isotopologue.number_states, isotopologue.number_transitions)
+            num_states_synced = isotopologue.sync_counters()
+            counters = (isotopologue.number_states, isotopologue.number_transitions)
+            msg = f"{isotopologue}: synced counters of {num_states_synced} states"
+            if counters != counters_orig:
+                msg += (
+                    f", (number_states, number_transitions): {counters_orig} -> "
+                    f"{counters}"
+                )
+            self.stdout.write(msg)
@@ -0,0 +1,159 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from app_site.models import Molecule, Isotopologue, State, Transition
+from app_site.models.transition import transitions_count
+
+
+def iter_chunks(queryset, chunk_size):
+    """Stream the queryset in lists of at most chunk_size instances, using keyset
+    pagination over the primary keys (so neither the whole table gets cached, nor
+    the chunks get slower with the growing offset).
+    """
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+class Command(BaseCommand):
+    help = (
+        "Sync all the derived fields of the molecules, isotopologues, states and "
+        "transitions with the data they are derived from. The tables are streamed in "
+        "primary key chunks and only the instances out of sync get written (with "
+        "bulk updates, without triggering any of the save side effects)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "molecules",
+            nargs="*",
+            metavar="formula_str",
+            help=(
+                "Formulas of the molecules to sync, together with their "
+                "isotopologues, states and transitions (the whole database by "
+                "default)."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of instances loaded and synced at once.",
+        )
+
+    def handle(self, *args, **options):
+        molecules = Molecule.objects.select_related("isotopologue")
+        isotopologues = Isotopologue.objects.select_related("molecule")
+        # the transitions counters are annotated in bulk for each chunk of states,
+        # rather than counted state by state by the State.sync_functions:
+        states = State.objects.select_related("isotopologue__molecule").annotate(
+            transitions_from_count=transitions_count("initial_state"),
+            transitions_to_count=transitions_count("final_state"),
+        )
+        # only the state energies are needed to sync the transitions:
+        transitions = Transition.objects.select_related(
+            "initial_state", "final_state"
+        ).only(
+            "delta_energy",
+            "initial_state",
+            "final_state",
+            "initial_state__isotopologue",
+            "initial_state__energy",
+            "final_state__energy",
+        )
+        if options["molecules"]:
+            formula_strs = options["molecules"]
+            molecules = molecules.filter(formula_str__in=formula_strs)
+            isotopologues = isotopologues.filter(molecule__formula_str__in=formula_strs)
+            states = states.filter(isotopologue__molecule__formula_str__in=formula_strs)
+            transitions = transitions.filter(
+                initial_state__isotopologue__molecule__formula_str__in=formula_strs
+            )
+
+        self.chunk_size = options["chunk_size"]
+        self.verbose = options["verbosity"] > 1
+        # the bulk updates bypass the save methods, so the generation of all the
+        # isotopologues with any data synced is bumped at the end:
+        isotopologue_pks = set()
+        isotopologue_pks |= self.sync_queryset(
+            molecules,
+            lambda mol: mol.isotopologue.pk if hasattr(mol, "isotopologue") else None,
+        )
+        isotopologue_pks |= self.sync_queryset(isotopologues, lambda iso: iso.pk)
+        isotopologue_pks |= self.sync_queryset(
+            states,
+            lambda state: state.isotopologue_id,
+            annotated_fields={
+                "number_transitions_from": "transitions_from_count",
+                "number_transitions_to": "transitions_to_count",
+            },
+        )
+        isotopologue_pks |= self.sync_queryset(
+            transitions, lambda tr: tr.initial_state.isotopologue_id
+        )
+        if isotopologue_pks:
+            Isotopologue.objects.filter(pk__in=isotopologue_pks).update(
+                generation=F("generation") + 1, time_modified=timezone.now()
+            )
+
+    def sync_queryset(self, queryset, get_isotopologue_pk, annotated_fields=None):
+        """Sync all the instances of the queryset chunk by chunk and bulk-update the
+        changed fields of the instances out of sync.
+
+        Parameters
+        ----------
+        queryset : QuerySet
+        get_isotopologue_pk : callable
+            Returning the primary key of the Isotopologue the passed instance data
+            belong to (or None).
+        annotated_fields : dict[str, str], optional
+            Fields to sync from the queryset annotations (values) instead of by the
+            model sync_functions.
+
+        Returns
+        -------
+        set[int]
+            Primary keys of the isotopologues with any of the instances synced.
+        """
+        model = queryset.model
+        annotated_fields = annotated_fields or {}
+        num_instances, num_synced = 0, 0
+        isotopologue_pks = set()
+        for chunk in iter_chunks(queryset, self.chunk_size):
+            num_instances += len(chunk)
+            instances_synced, fields_synced = [], set()
+            for instance in chunk:
+                instance.sync(verbose=self.verbose, skip=annotated_fields, save=False)
+                for field_name, annotation in annotated_fields.items():
+                    val_orig = getattr(instance, field_name)
+                    val_synced = getattr(instance, annotation)
+                    if val_synced != val_orig:
+                        setattr(instance, field_name, val_synced)
+                        if self.verbose:
+                            self.stdout.write(
+                                f"{instance!r}: updated {field_name}: {val_orig} -> "
+                                f"{val_synced}"
+                            )
+                changed_fields = instance.changed_fields
+                if changed_fields:
+                    instance.time_modified = timezone.now()
+                    instances_synced.append(instance)
+                    fields_synced.update(changed_fields)
+            if instances_synced:
+                fields_synced.add("time_modified")
+                model.objects.bulk_update(instances_synced, sorted(fields_synced))
+                for instance in instances_synced:
+                    instance.mark_saved()
+                    isotopologue_pk = get_isotopologue_pk(instance)
+                    if isotopologue_pk is not None:
+                        isotopologue_pks.add(isotopologue_pk)
+                num_synced += len(instances_synced)
+        self.stdout.write(
+            f"{model.__name__}: synced {num_synced} of {num_instances} instances"
+        )
+        return isotopologue_pks
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0002_remove_transition_branching_ratio'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='isotopologue',
+            name='iso_formula_str',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='molecule',
+            name='formula_str',
+            field=models.CharField(max_length=16, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='molecule',
+            name='slug',
+            field=models.CharField(db_index=True, max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_html',
+            field=models.CharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_html_notags',
+            field=models.CharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_sort_key',
+            field=models.CharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_str',
+            field=models.CharField(max_length=128),
+        ),
+        migrations.AddConstraint(
+            model_name='state',
+            constraint=models.UniqueConstraint(fields=('isotopologue', 'el_state_str', 'vib_state_str'), name='unique_state'),
+        ),
+        migrations.AddConstraint(
+            model_name='transition',
+            constraint=models.UniqueConstraint(fields=('initial_state', 'final_state'), name='unique_transition'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0003_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='isotopologue',
+            name='generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
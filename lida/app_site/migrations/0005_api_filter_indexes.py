@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0004_isotopologue_generation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='state',
+            index=models.Index(fields=['isotopologue', 'energy'], name='state_energy'),
+        ),
+        migrations.AddIndex(
+            model_name='state',
+            index=models.Index(fields=['isotopologue', 'lifetime'], name='state_lifetime'),
+        ),
+        migrations.AddIndex(
+            model_name='transition',
+            index=models.Index(fields=['partial_lifetime'], name='transition_partial_lifetime'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0005_api_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='state',
+            index=models.Index(fields=['isotopologue', 'state_sort_key'], name='state_sort_key'),
+        ),
+    ]
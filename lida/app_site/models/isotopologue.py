@@ -1,6 +1,9 @@
+import hashlib
 import re
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from pyvalem.formula import Formula as PVFormula
 
 from .exceptions import MoleculeError
@@ -47,7 +50,7 @@ class Isotopologue(BaseModel):
     # One might use the fields for automatic checks for some new available data in the
     # ExoMol database, or checks if the recommended dataset_name has not changed.
     # iso_formula_str and iso_slug are compatible with PyValem package.
-    iso_formula_str = models.CharField(max_length=32)
+    iso_formula_str = models.CharField(max_length=32, unique=True)
     dataset_name = models.CharField(max_length=16)
     version = models.PositiveIntegerField()
 
@@ -77,6 +80,9 @@ class Isotopologue(BaseModel):
     # auto-increase/decrease on states creation/deletion:
     number_states = models.PositiveIntegerField()
     number_transitions = models.PositiveIntegerField()
+    # incremented whenever any of the data of this isotopologue (or of its molecule,
+    # states or transitions) change, see bump_generation:
+    generation = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return str(self.molecule)
@@ -126,27 +132,22 @@ class Isotopologue(BaseModel):
                 f"Non-canonicalised formula {iso_formula_str} passed, instead of "
                 f"{repr(pyvalem_formula)}"
             )
-        # Only a single instance per iso_formula_str should live in the database:
-        try:
-            cls.get_from_iso_formula_str(iso_formula_str)
-            raise MoleculeError(f"Isotopologue({iso_formula_str}) already exists!")
-        except cls.DoesNotExist:
-            pass
-        try:
-            cls.get_from_formula_str(molecule.formula_str)
-            raise MoleculeError(
-                f"Isotopologue(Molecule({molecule.formula_str})) already exists!"
-            )
-        except cls.DoesNotExist:
-            pass
-
         instance = cls(
             molecule=molecule,
             iso_formula_str=iso_formula_str,
             dataset_name=dataset_name,
             version=version,
         )
-        instance.sync()
+        # Only a single instance per iso_formula_str and per molecule should live in
+        # the database (guarded by the unique iso_formula_str and molecule fields):
+        try:
+            with transaction.atomic():
+                instance.sync()
+        except IntegrityError:
+            raise MoleculeError(
+                f"Isotopologue({iso_formula_str}) or "
+                f"Isotopologue(Molecule({molecule.formula_str})) already exists!"
+            )
         return instance
 
     @property
@@ -158,6 +159,128 @@ class Isotopologue(BaseModel):
 
         return Transition.objects.filter(initial_state__isotopologue=self)
 
+    @classmethod
+    def bump_generation(cls, pk, **updates):
+        """Increment the generation counter of the Isotopologue with the passed pk
+        (and refresh its time_modified) by a single atomic UPDATE query, applying
+        also any other updates passed (such as F() expressions of its counters).
+        Needs to be called whenever any of the data of the isotopologue change, as
+        the generation versions all the cached responses and export artifacts of
+        the isotopologue data.
+        The instances cached in memory need to be updated by the caller, see
+        mark_generation_bumped.
+
+        Returns
+        -------
+        datetime.datetime
+            The new time_modified of the isotopologue.
+        """
+        time_modified = timezone.now()
+        cls.objects.filter(pk=pk).update(
+            generation=F("generation") + 1, time_modified=time_modified, **updates
+        )
+        return time_modified
+
+    def mark_generation_bumped(self, time_modified, *field_names):
+        """Mirror the bump_generation update (and the updates of the passed
+        field_names done by the caller) in this instance.
+        """
+        self.generation += 1
+        self.time_modified = time_modified
+        self.mark_saved("generation", "time_modified", *field_names)
+
+    def save(self, *args, **kwargs):
+        changed = not self._state.adding and bool(self.changed_fields)
+        super().save(*args, **kwargs)
+        if changed:
+            # incremented atomically, not to lose any concurrent increments:
+            self.mark_generation_bumped(self.bump_generation(self.pk))
+
+    def get_data_last_modified(self):
+        """The last time this Isotopologue or any of its states or transitions has
+        been modified (in the database), i.e. the time of the last bump_generation.
+
+        Returns
+        -------
+        datetime.datetime
+        """
+        return self.time_modified
+
+    def get_data_fingerprint(self):
+        """Short hash identifying the current state of all the data of this
+        isotopologue (by the version and the generation counter, together with the
+        primary key and the time added, so the fingerprint of a re-created
+        isotopologue differs as well). Changes whenever any of the data change.
+
+        Returns
+        -------
+        str
+        """
+        signature = (
+            f"{self.pk}:{self.time_added.isoformat()}:{self.version}:"
+            f"{self.generation}"
+        )
+        return hashlib.sha1(signature.encode()).hexdigest()[:10]
+
+    def get_cache_version(self):
+        """Version of the cached responses representing the data of this
+        isotopologue (see app_site.views.cache), by its primary key, generation
+        counter and data fingerprint (which tells apart an isotopologue re-created
+        with a re-used primary key).
+        """
+        return f"iso{self.pk}-g{self.generation}-{self.get_data_fingerprint()}"
+
+    def get_etag(self, fingerprint=None):
+        """Weak entity tag of any response representing the data of this isotopologue
+        (weak, as the same data might be served under different encodings).
+        """
+        if fingerprint is None:
+            fingerprint = self.get_data_fingerprint()
+        return f'W/"{self.iso_slug}-{self.version}-{fingerprint}"'
+
+    def sync_counters(self, state_pks=None):
+        """Sync the number_transitions_from and number_transitions_to counters of all
+        the State instances belonging to this Isotopologue, as well as the
+        number_states and number_transitions counters of this Isotopologue itself.
+        The State counters are all re-counted by a single aggregate UPDATE query
+        (touching only the states with the counters out of sync), instead of syncing
+        the states one by one. Needs to be called after any bulk operations on the
+        states or transitions (such as State.bulk_create_from_data), which do not
+        maintain the counters, and can be used to fix any drift of the counters
+        maintained incrementally.
+
+        Parameters
+        ----------
+        state_pks : iterable[int], optional
+            Only sync the counters of the states with these primary keys (all the
+            states of this isotopologue by default).
+
+        Returns
+        -------
+        int
+            Number of the State instances which had their counters out of sync.
+        """
+        from .transition import transitions_count
+
+        states = self.state_set.all()
+        if state_pks is not None:
+            states = states.filter(pk__in=state_pks)
+        num_states_synced = states.exclude(
+            number_transitions_from=transitions_count("initial_state"),
+            number_transitions_to=transitions_count("final_state"),
+        ).update(
+            number_transitions_from=transitions_count("initial_state"),
+            number_transitions_to=transitions_count("final_state"),
+        )
+        self.sync(sync_only=["number_states", "number_transitions"], save=False)
+        if self.changed_fields:
+            self.save()
+        else:
+            # the states or transitions might have been changed by bulk operations
+            # even if the counters match:
+            self.mark_generation_bumped(self.bump_generation(self.pk))
+        return num_states_synced
+
     def set_ground_el_state_str(self, ground_el_state_str):
         """Set the electronic ground state string representation belonging to this
         molecule.
@@ -189,7 +312,7 @@ class Isotopologue(BaseModel):
         elif n == 2:
             lim = 1
         else:
-            lim = 1 # 0 ALEC
+            lim = 1  # 0 ALEC
         if vib_state_dim > lim:
             raise MoleculeError(
                 f"Vibrational state dimensionality {vib_state_dim} higher than "
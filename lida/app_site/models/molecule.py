@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from pyvalem.formula import Formula as PVFormula
 
 from .exceptions import MoleculeError
@@ -15,7 +17,7 @@ class Molecule(BaseModel):
 
     # The following fields should be compatible with ExoMol database itself (and the
     # formula_str needs to be compatible with pyvalem.formula.Formula)
-    formula_str = models.CharField(max_length=16)
+    formula_str = models.CharField(max_length=16, unique=True)
     name = models.CharField(max_length=64, default="")
 
     sync_functions = {
@@ -25,11 +27,26 @@ class Molecule(BaseModel):
         "number_atoms": lambda molecule: PVFormula(molecule.formula_str).natoms,
     }
 
-    slug = models.CharField(max_length=16)
+    slug = models.CharField(max_length=16, db_index=True)
     html = models.CharField(max_length=64)
     charge = models.SmallIntegerField()
     number_atoms = models.PositiveSmallIntegerField()
 
+    def save(self, *args, **kwargs):
+        changed = not self._state.adding and bool(self.changed_fields)
+        super().save(*args, **kwargs)
+        if changed:
+            # the molecule data are served together with the isotopologue data, so
+            # the isotopologue generation is bumped (if any isotopologue exists):
+            from .isotopologue import Isotopologue
+
+            time_modified = timezone.now()
+            Isotopologue.objects.filter(molecule=self).update(
+                generation=F("generation") + 1, time_modified=time_modified
+            )
+            if Molecule.isotopologue.is_cached(self):
+                self.isotopologue.mark_generation_bumped(time_modified)
+
     def __str__(self):
         return self.formula_str
 
@@ -62,13 +79,12 @@ class Molecule(BaseModel):
                 f"instead of {repr(pyvalem_formula)}"
             )
 
+        instance = cls(formula_str=formula_str, name=name)
+        # Only a single instance with the given formula_str should exist (guarded by
+        # the unique formula_str field):
         try:
-            cls.get_from_formula_str(formula_str)
-            # Only a single instance with the given formula_str should exist!
+            with transaction.atomic():
+                instance.sync()
+        except IntegrityError:
             raise MoleculeError(f"Molecule({formula_str}) already exists!")
-        except cls.DoesNotExist:
-            pass
-
-        instance = cls(formula_str=formula_str, name=name)
-        instance.sync()
         return instance
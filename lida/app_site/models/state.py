@@ -1,19 +1,27 @@
 from collections import OrderedDict
 
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F, Max, OuterRef, Subquery
 
 from .exceptions import StateError
 from .isotopologue import Isotopologue
 from .utils import (
     validate_and_parse_vib_state_str,
     canonicalise_and_parse_el_state_str,
+    derive_state_fields,
+    derive_state_columns,
     get_state_str,
-    leading_zeros,
-    strip_tags,
+    DerivedStateFields,
     BaseModel,
 )
 
 
+def _derived_state_field_getter(field_name):
+    return lambda state: getattr(
+        derive_state_fields(state.el_state_str, state.vib_state_str), field_name
+    )
+
+
 class State(BaseModel):
     # noinspection PyUnresolvedReferences
     """A data model representing a stateful species. The stateless species is
@@ -70,42 +78,15 @@ class State(BaseModel):
     # e.g. '(0, 1, 0, 3)', '(0, 0, 0, 0)', and '5'
     vib_state_str = models.CharField(max_length=128)
 
-    # the sync functions dict needs to be ordered, as the html attribute sync function
-    # expects el_state_html and vib_state_html already synced
+    # the sync functions dict needs to be ordered, as the el_state_str gets
+    # canonicalised first; all the state string fields get derived from the
+    # (el_state_str, vib_state_str) pair in a single (memoized) pass:
     sync_functions = OrderedDict(
         [
-            (
-                "el_state_str",
-                lambda state: canonicalise_and_parse_el_state_str(state.el_state_str)[
-                    0
-                ],
-            ),
-            (
-                "el_state_html",
-                lambda state: canonicalise_and_parse_el_state_str(state.el_state_str)[
-                    1
-                ],
-            ),
-            ("el_state_html_notags", lambda state: strip_tags(state.el_state_html)),
-            (
-                "vib_state_html",
-                lambda state: validate_and_parse_vib_state_str(state.vib_state_str)[1],
-            ),
-            ("vib_state_html_notags", lambda state: strip_tags(state.vib_state_html)),
-            ("vib_state_sort_key", lambda state: leading_zeros(state.vib_state_str)),
-            (
-                "state_html",
-                lambda state: "; ".join(
-                    s for s in [state.el_state_html, state.vib_state_html] if s
-                ),
-            ),
-            ("state_html_notags", lambda state: strip_tags(state.state_html)),
-            (
-                "state_sort_key",
-                lambda state: "; ".join(
-                    s for s in [state.el_state_str, state.vib_state_sort_key] if s
-                ),
-            ),
+            (field_name, _derived_state_field_getter(field_name))
+            for field_name in DerivedStateFields._fields
+        ]
+        + [
             (
                 "number_transitions_from",
                 lambda state: state.transition_from_set.count(),
@@ -130,6 +111,25 @@ class State(BaseModel):
     number_transitions_from = models.PositiveIntegerField()
     number_transitions_to = models.PositiveIntegerField()
 
+    class Meta:
+        constraints = [
+            # also serves as the index for the get_from_data lookups:
+            models.UniqueConstraint(
+                fields=["isotopologue", "el_state_str", "vib_state_str"],
+                name="unique_state",
+            )
+        ]
+        # for the API filters:
+        indexes = [
+            models.Index(fields=["isotopologue", "energy"], name="state_energy"),
+            models.Index(fields=["isotopologue", "lifetime"], name="state_lifetime"),
+            # the keyset pagination order of the states (also of the transitions by
+            # their initial states):
+            models.Index(
+                fields=["isotopologue", "state_sort_key"], name="state_sort_key"
+            ),
+        ]
+
     def __str__(self):
         return get_state_str(self.isotopologue, self.el_state_str, self.vib_state_str)
 
@@ -207,6 +207,167 @@ class State(BaseModel):
         (if all or none can have empty vib_state_str or all or none can have the empty
         el_state_str.)
 
+        """
+        el_state_str, lifetime = cls._validate_data(
+            isotopologue,
+            lifetime,
+            el_state_str,
+            vib_state_labels,
+            vib_state_str,
+            is_first_state=not isotopologue.state_set.exists(),
+        )
+        # state_str is only for error reporting:
+        state_str = get_state_str(isotopologue, el_state_str, vib_state_str)
+
+        instance = cls(
+            isotopologue=isotopologue,
+            lifetime=lifetime,
+            energy=energy,
+            el_state_str=el_state_str,
+            vib_state_str=vib_state_str,
+        )
+        # Only a single instance per isotopologue and both state_str should ever exist
+        # (guarded by the unique_state constraint):
+        try:
+            with transaction.atomic():
+                instance.sync()
+        except IntegrityError:
+            raise StateError(f'State "{state_str}" already exists!')
+        return instance
+
+    @classmethod
+    def bulk_create_from_data(
+        cls, isotopologue, states_data, vib_state_labels="", batch_size=1000
+    ):
+        """A bulk counterpart of the create_from_data method, intended for populating
+        whole datasets at once.
+        All the states get validated (exactly as by create_from_data) and all their
+        fields derived in memory, before being inserted into the database in batches
+        with bulk_create. The Isotopologue.number_states and the
+        number_transitions_from/to counters are NOT maintained by this method, the
+        Isotopologue.sync_counters method needs to be called once all the states and
+        transitions are populated!
+
+        Parameters
+        ----------
+        isotopologue : Isotopologue
+        states_data : iterable[tuple]
+            Iterable of (lifetime, energy, el_state_str, vib_state_str) tuples, with the
+            same meaning as the create_from_data arguments.
+        vib_state_labels : str
+            Shared by all the states, see create_from_data.
+        batch_size : int
+
+        Returns
+        -------
+        list[int]
+            Primary keys of the created State instances, in the order of states_data.
+        """
+        is_first_state = not isotopologue.state_set.exists()
+        instances, keys = [], set()
+        for lifetime, energy, el_state_str, vib_state_str in states_data:
+            el_state_str, lifetime = cls._validate_data(
+                isotopologue,
+                lifetime,
+                el_state_str,
+                vib_state_labels,
+                vib_state_str,
+                is_first_state=is_first_state,
+            )
+            is_first_state = False
+            if (el_state_str, vib_state_str) in keys:
+                state_str = get_state_str(isotopologue, el_state_str, vib_state_str)
+                raise StateError(f'State "{state_str}" passed more than once!')
+            keys.add((el_state_str, vib_state_str))
+            instances.append(
+                cls(
+                    isotopologue=isotopologue,
+                    lifetime=lifetime,
+                    energy=energy,
+                    el_state_str=el_state_str,
+                    vib_state_str=vib_state_str,
+                    number_transitions_from=0,
+                    number_transitions_to=0,
+                )
+            )
+
+        if not instances:
+            return []
+
+        # derive all the state string fields in a single batched pass:
+        derived_columns = derive_state_columns(
+            (instance.el_state_str, instance.vib_state_str) for instance in instances
+        )
+        for field_name, column in derived_columns.items():
+            for instance, value in zip(instances, column):
+                setattr(instance, field_name, value)
+
+        # not all the database backends return the primary keys from bulk inserts,
+        # the states inserted are then read back as the states following the last
+        # (auto-incremented) primary key preceding the insert:
+        last_pk = 0
+        if not connections[cls.objects.db].features.can_return_rows_from_bulk_insert:
+            last_pk = cls.objects.aggregate(last_pk=Max("pk"))["last_pk"] or 0
+
+        # Only a single instance per isotopologue and both state_str should ever exist
+        # (guarded by the unique_state constraint):
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(instances, batch_size=batch_size)
+        except IntegrityError:
+            existing = cls._find_existing(isotopologue, keys)
+            if existing is None:
+                raise StateError(f"Some of the states of {isotopologue} already exist!")
+            state_str = get_state_str(isotopologue, *existing)
+            raise StateError(f'State "{state_str}" already exists!')
+        if all(instance.pk is not None for instance in instances):
+            return [instance.pk for instance in instances]
+        pks = {
+            (el_state_str, vib_state_str): pk
+            for pk, el_state_str, vib_state_str in cls.objects.filter(
+                isotopologue=isotopologue, pk__gt=last_pk
+            ).values_list("pk", "el_state_str", "vib_state_str")
+        }
+        return [
+            pks[instance.el_state_str, instance.vib_state_str] for instance in instances
+        ]
+
+    @classmethod
+    def _find_existing(cls, isotopologue, keys, chunk_size=500):
+        """Any of the (el_state_str, vib_state_str) keys of the isotopologue states
+        already existing in the database, or None. Only the states of the keys are
+        queried, in chunks of the keys.
+        """
+        keys = sorted(keys)
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start : start + chunk_size]
+            existing = cls.objects.filter(
+                isotopologue=isotopologue,
+                el_state_str__in={el_state_str for el_state_str, _ in chunk},
+                vib_state_str__in={vib_state_str for _, vib_state_str in chunk},
+            ).values_list("el_state_str", "vib_state_str")
+            found = set(existing) & set(chunk)
+            if found:
+                return min(found)
+        return None
+
+    @classmethod
+    def _validate_data(
+        cls,
+        isotopologue,
+        lifetime,
+        el_state_str,
+        vib_state_labels,
+        vib_state_str,
+        is_first_state,
+    ):
+        """Helper method validating the data for a new State instance, shared by the
+        create_from_data and bulk_create_from_data methods. Checks everything apart
+        from duplicates.
+        If is_first_state and the vib_state_str is passed, the vibrational quantum
+        labels get saved with the isotopologue as a side effect.
+        Returns the canonicalised el_state_str and the lifetime (with None in place of
+        the infinite lifetime).
         """
         if not el_state_str and not vib_state_str:
             raise StateError(
@@ -229,17 +390,6 @@ class State(BaseModel):
         # state_str is only for error reporting:
         state_str = get_state_str(isotopologue, el_state_str, vib_state_str)
 
-        # Only a single instance per isotopologue and both state_str should ever exist:
-        try:
-            cls.objects.get(
-                isotopologue=isotopologue,
-                el_state_str=el_state_str,
-                vib_state_str=vib_state_str,
-            )
-            raise StateError(f'State "{state_str}" already exists!')
-        except cls.DoesNotExist:
-            pass
-
         # deal with the infinite lifetimes, swap for None
         if lifetime in {float("inf"), None}:
             lifetime = None
@@ -251,7 +401,7 @@ class State(BaseModel):
         # check if the vibrational state dimension matches the other states of the
         # Isotopologue, the same with the vibrational quanta labels:
         if vib_state_dim:
-            if not isotopologue.state_set.count():
+            if is_first_state:
                 # first State being saved for the given isotopologue
                 isotopologue.set_vib_quantum_labels(vib_state_labels)
                 if isotopologue.vib_state_dim != vib_state_dim:
@@ -292,15 +442,7 @@ class State(BaseModel):
                 f"vib_state_dim > 0 or non-empty ground_el_state_str."
             )
 
-        instance = cls(
-            isotopologue=isotopologue,
-            lifetime=lifetime,
-            energy=energy,
-            el_state_str=el_state_str,
-            vib_state_str=vib_state_str,
-        )
-        instance.sync()
-        return instance
+        return el_state_str, lifetime
 
     def get_html(self):
         molecule_html = self.isotopologue.molecule.html
@@ -318,16 +460,51 @@ class State(BaseModel):
         )
 
     def save(self, *args, **kwargs):
+        created = self._state.adding
+        changed_fields = self.changed_fields
         super().save(*args, **kwargs)
-        self.isotopologue.sync(sync_only=["number_states"])
-        for transition in self.transition_set.all():
-            transition.sync(sync_only=["delta_energy"], save=False)
-            # now I need to save the delta_energy without triggering Transition.save()
-            # to avoid infinite recursion:
-            transition.__class__.objects.filter(pk=transition.pk).update(
-                delta_energy=transition.delta_energy
+        if created:
+            # incremented atomically, rather than re-counting all the states:
+            time_modified = Isotopologue.bump_generation(
+                self.isotopologue_id, number_states=F("number_states") + 1
+            )
+            if State.isotopologue.is_cached(self):
+                self.isotopologue.number_states += 1
+                self.isotopologue.mark_generation_bumped(time_modified, "number_states")
+        elif changed_fields:
+            if "energy" in changed_fields:
+                self.sync_transitions_delta_energy()
+            time_modified = Isotopologue.bump_generation(self.isotopologue_id)
+            if State.isotopologue.is_cached(self):
+                self.isotopologue.mark_generation_bumped(time_modified)
+
+    def sync_transitions_delta_energy(self):
+        """Sync the delta_energy of all the transitions from and to this state with its
+        energy. Only two set-based UPDATE queries are used (with the energies of the
+        states on the other end taken from a subquery), without triggering the
+        Transition.save method (which would lead to an infinite recursion).
+        """
+        from .transition import Transition
+
+        def state_energy(state_field):
+            return Subquery(
+                State.objects.filter(pk=OuterRef(state_field)).values("energy")[:1]
             )
 
+        Transition.objects.filter(initial_state=self).update(
+            delta_energy=state_energy("final_state") - self.energy
+        )
+        Transition.objects.filter(final_state=self).update(
+            delta_energy=self.energy - state_energy("initial_state")
+        )
+
     def delete(self, *args, **kwargs):
-        super().delete(*args, **kwargs)
-        self.isotopologue.sync(sync_only=["number_states"])
+        # the transitions of this state get deleted by the database cascade without
+        # calling Transition.delete, so the transitions counters of all the states
+        # on the other end need re-counting:
+        neighbour_pks = set(
+            self.transition_from_set.values_list("final_state", flat=True)
+        ) | set(self.transition_to_set.values_list("initial_state", flat=True))
+        result = super().delete(*args, **kwargs)
+        self.isotopologue.sync_counters(state_pks=neighbour_pks)
+        return result
@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .exceptions import TransitionError
 from .utils import BaseModel
+from .isotopologue import Isotopologue
 from .state import State
 
 
@@ -29,6 +32,21 @@ class Transition(BaseModel):
 
     delta_energy = models.FloatField()
 
+    class Meta:
+        constraints = [
+            # also serves as the index for the get_from_states lookups and for the
+            # transitions from a given state:
+            models.UniqueConstraint(
+                fields=["initial_state", "final_state"], name="unique_transition"
+            )
+        ]
+        # for the API filters:
+        indexes = [
+            models.Index(
+                fields=["partial_lifetime"], name="transition_partial_lifetime"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.initial_state} → {self.final_state}"
 
@@ -51,21 +69,14 @@ class Transition(BaseModel):
             vib_state_str='1'),
         """
         if initial_state == final_state:
-            raise TransitionError(f"Initial and final states must differ!")
+            raise TransitionError(
+                f"Initial and final states must differ! Passed {initial_state} twice!"
+            )
         if initial_state.isotopologue is not final_state.isotopologue:
             raise TransitionError(
                 f"Transition creation failed! States {initial_state} and {final_state} "
                 f"do not share the same isotopologue!"
             )
-        # Only a single instance per the states pair should ever exist:
-        try:
-            cls.get_from_states(initial_state, final_state)
-            raise TransitionError(
-                f"Transition({initial_state}, {final_state}) already exists!"
-            )
-        except cls.DoesNotExist:
-            pass
-
         # values validation:
         if partial_lifetime < 0:
             raise TransitionError(
@@ -76,20 +87,196 @@ class Transition(BaseModel):
         instance = cls(
             initial_state=initial_state,
             final_state=final_state,
-            partial_lifetime=partial_lifetime
+            partial_lifetime=partial_lifetime,
         )
-        instance.sync()
+        # Only a single instance per the states pair should ever exist (guarded by the
+        # unique_transition constraint):
+        try:
+            with transaction.atomic():
+                instance.sync()
+        except IntegrityError:
+            raise TransitionError(
+                f"Transition({initial_state}, {final_state}) already exists!"
+            )
         return instance
 
-    def after_save_and_delete(self):
-        self.initial_state.sync(sync_only=["number_transitions_from"])
-        self.final_state.sync(sync_only=["number_transitions_to"])
-        self.initial_state.isotopologue.sync(sync_only=["number_transitions"])
+    @classmethod
+    def bulk_create_from_data(cls, transitions_data, state_energies, batch_size=1000):
+        """A bulk counterpart of the create_from_data method, intended for populating
+        whole datasets at once.
+        All the transitions get validated and their delta_energy calculated in memory,
+        before being inserted into the database in batches with bulk_create.
+        None of the Transition.save side effects take place, so the
+        Isotopologue.sync_counters method needs to be called once all the states and
+        transitions are populated!
+
+        Parameters
+        ----------
+        transitions_data : iterable[tuple]
+            Iterable of (initial_state_pk, final_state_pk, partial_lifetime) tuples.
+        state_energies : dict[int, float]
+            Energies of ALL the states of a single isotopologue, keyed by their primary
+            keys. Transitions between any states not present in state_energies are not
+            allowed.
+        batch_size : int
+        """
+        instances, keys = [], set()
+        for initial_state_pk, final_state_pk, partial_lifetime in transitions_data:
+            if initial_state_pk == final_state_pk:
+                raise TransitionError(
+                    f"Initial and final states must differ! Passed "
+                    f"pk={initial_state_pk} twice!"
+                )
+            if (
+                initial_state_pk not in state_energies
+                or final_state_pk not in state_energies
+            ):
+                raise TransitionError(
+                    f"Transition creation failed! States with pk={initial_state_pk} "
+                    f"and pk={final_state_pk} do not belong to the same isotopologue!"
+                )
+            if (initial_state_pk, final_state_pk) in keys:
+                raise TransitionError(
+                    f"Transition(pk={initial_state_pk}, pk={final_state_pk}) passed "
+                    f"more than once!"
+                )
+            keys.add((initial_state_pk, final_state_pk))
+            if partial_lifetime < 0:
+                raise TransitionError(
+                    f"Partial lifetime needs to be positive! Passed "
+                    f"partial_lifetime={partial_lifetime}!"
+                )
+            instances.append(
+                cls(
+                    initial_state_id=initial_state_pk,
+                    final_state_id=final_state_pk,
+                    partial_lifetime=partial_lifetime,
+                    delta_energy=state_energies[final_state_pk]
+                    - state_energies[initial_state_pk],
+                )
+            )
+
+        if not instances:
+            return
+
+        # Only a single instance per the states pair should ever exist (guarded by the
+        # unique_transition constraint):
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(instances, batch_size=batch_size)
+        except IntegrityError:
+            existing = cls._find_existing(keys)
+            if existing is None:
+                raise TransitionError("Some of the transitions already exist!")
+            raise TransitionError(
+                f"Transition(pk={existing[0]}, pk={existing[1]}) already exists!"
+            )
+
+    @classmethod
+    def _find_existing(cls, keys, chunk_size=500):
+        """Any of the (initial_state_pk, final_state_pk) keys of the transitions
+        already existing in the database, or None. Only the transitions between the
+        states of the keys are queried, in chunks of the keys.
+        """
+        keys = sorted(keys)
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start : start + chunk_size]
+            existing = cls.objects.filter(
+                initial_state_id__in={initial for initial, _ in chunk},
+                final_state_id__in={final for _, final in chunk},
+            ).values_list("initial_state_id", "final_state_id")
+            found = set(existing) & set(chunk)
+            if found:
+                return min(found)
+        return None
+
+    def _update_counters(self, initial_state_pk, final_state_pk, increment):
+        """Atomically increment (or decrement, if increment is negative) the
+        transitions counters of the passed initial and final states and of their
+        isotopologue with F() expressions, instead of re-counting all their
+        transitions, bumping the isotopologue generation at the same time.
+        The related instances cached in memory get updated as well.
+        """
+        State.objects.filter(pk=initial_state_pk).update(
+            number_transitions_from=F("number_transitions_from") + increment
+        )
+        State.objects.filter(pk=final_state_pk).update(
+            number_transitions_to=F("number_transitions_to") + increment
+        )
+        time_modified = Isotopologue.bump_generation(
+            self.initial_state.isotopologue_id,
+            number_transitions=F("number_transitions") + increment,
+        )
+
+        isotopologues = {}
+        if Transition.initial_state.is_cached(self):
+            if self.initial_state.pk == initial_state_pk:
+                self.initial_state.number_transitions_from += increment
+                self.initial_state.mark_saved("number_transitions_from")
+            if State.isotopologue.is_cached(self.initial_state):
+                isotopologues[id(self.initial_state.isotopologue)] = (
+                    self.initial_state.isotopologue
+                )
+        if Transition.final_state.is_cached(self):
+            if self.final_state.pk == final_state_pk:
+                self.final_state.number_transitions_to += increment
+                self.final_state.mark_saved("number_transitions_to")
+            if State.isotopologue.is_cached(self.final_state):
+                isotopologues[id(self.final_state.isotopologue)] = (
+                    self.final_state.isotopologue
+                )
+        for isotopologue in isotopologues.values():
+            isotopologue.number_transitions += increment
+            isotopologue.mark_generation_bumped(time_modified, "number_transitions")
+
+    @property
+    def saved_state_pks(self):
+        """The (initial, final) state pks the transition is saved with in the
+        database, or None if not saved yet.
+        """
+        if self._state.adding:
+            return None
+        return (
+            self.get_saved_value("initial_state_id", self.initial_state_id),
+            self.get_saved_value("final_state_id", self.final_state_id),
+        )
 
     def save(self, *args, **kwargs):
+        saved_state_pks = self.saved_state_pks
+        changed_fields = self.changed_fields
         super().save(*args, **kwargs)
-        self.after_save_and_delete()
+        state_pks = (self.initial_state_id, self.final_state_id)
+        if state_pks != saved_state_pks:
+            # the counters updates bump the isotopologue generation as well:
+            if saved_state_pks is not None:
+                self._update_counters(*saved_state_pks, -1)
+            self._update_counters(*state_pks, 1)
+        elif changed_fields:
+            time_modified = Isotopologue.bump_generation(
+                self.initial_state.isotopologue_id
+            )
+            if State.isotopologue.is_cached(self.initial_state):
+                self.initial_state.isotopologue.mark_generation_bumped(time_modified)
 
     def delete(self, *args, **kwargs):
-        super().delete(*args, **kwargs)
-        self.after_save_and_delete()
+        state_pks = self.saved_state_pks
+        result = super().delete(*args, **kwargs)
+        self._update_counters(*state_pks, -1)
+        return result
+
+
+def transitions_count(state_field):
+    """Expression counting the transitions from (state_field="initial_state") or to
+    (state_field="final_state") the outer State, for annotating or updating State
+    querysets with the transitions counters without any per-state queries.
+    """
+    return Coalesce(
+        Subquery(
+            Transition.objects.filter(**{state_field: OuterRef("pk")})
+            .order_by()
+            .values(state_field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
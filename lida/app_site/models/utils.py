@@ -1,5 +1,7 @@
 #from lxml import html
 import re
+from collections import namedtuple
+from functools import lru_cache
 from pyvalem.states import MolecularTermSymbol
 from pyvalem.states import AtomicTermSymbol
 from pyvalem.states import AtomicConfiguration
@@ -12,6 +14,10 @@ from django.db import models
 
 from .exceptions import StateError
 
+# maximum number of distinct state strings memoized by each of the state string
+# parsers (process-wide):
+PARSE_CACHE_SIZE = 4096
+
 
 class BaseModel(models.Model):
     """Abstract base class for all the models implemented in the models sub-package."""
@@ -37,6 +43,79 @@ class BaseModel(models.Model):
     def model_name(self):
         return self._meta.model.__name__
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.mark_saved()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.mark_saved(*(fields or []))
+
+    def mark_saved(self, *field_names):
+        """Snapshot the current values of the passed fields (all the loaded concrete
+        fields if none passed) as the values saved in the database.
+        Needs to be called whenever the database gets updated bypassing the save
+        method (e.g. by an F() expression UPDATE) and the change is mirrored manually
+        in the instance, so the field does not get marked as changed.
+        """
+        if not hasattr(self, "_saved_values"):
+            self._saved_values = {}
+        for field in self._meta.concrete_fields:
+            if field_names and not {field.name, field.attname} & set(field_names):
+                continue
+            # deferred fields are not tracked:
+            if field.attname in self.__dict__:
+                self._saved_values[field.attname] = getattr(self, field.attname)
+
+    def get_saved_value(self, field_name, default=None):
+        """The value of the passed field (attname for the foreign keys) as last
+        loaded from or saved into the database, or the default, if not known.
+        """
+        return getattr(self, "_saved_values", {}).get(field_name, default)
+
+    @property
+    def changed_fields(self):
+        """List of the attnames of all the concrete fields changed since the instance
+        has been loaded from or saved into the database. All the fields are considered
+        changed for the instances not yet saved.
+        """
+        saved_values = getattr(self, "_saved_values", {})
+        return [
+            field.attname
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (
+                field.attname not in saved_values
+                or saved_values[field.attname] != getattr(self, field.attname)
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        """Only the changed fields are written for the instances already saved, and
+        the write is skipped entirely if no fields have changed (unless update_fields
+        are passed explicitly, in which case only those are marked as saved).
+        """
+        if (
+            not self._state.adding
+            and hasattr(self, "_saved_values")
+            and not args
+            and "update_fields" not in kwargs
+            and not kwargs.get("force_insert")
+        ):
+            changed_fields = self.changed_fields
+            if not changed_fields:
+                return
+            kwargs["update_fields"] = changed_fields + ["time_modified"]
+        super().save(*args, **kwargs)
+        # only the fields written are saved (none if update_fields is empty):
+        update_fields = args[3] if len(args) > 3 else kwargs.get("update_fields")
+        if update_fields is None:
+            self.mark_saved()
+        elif update_fields:
+            self.mark_saved(*update_fields)
+
     def sync(self, verbose=False, sync_only=None, skip=None, save=True):
         """Method to sync the instance with all the other related database models.
         All the fields which are not explicit inputs to the create_from_data method
@@ -44,8 +123,10 @@ class BaseModel(models.Model):
         whenever the related models get changed.
         This is a way around this database model being very poorly normalized
         (in favor of performance).
-        WARNING: must call .save on the child class instance to commit the changes into
-        database!
+        Only the fields actually updated get written by the .save call, which is
+        skipped altogether if the instance is already in sync.
+        WARNING: if save=False, must call .save on the child class instance to commit
+        the changes into database!
         """
         if sync_only is None and skip is None:
             attributes_to_sync = list(self.sync_functions)
@@ -83,9 +164,19 @@ def validate_and_parse_vib_state_str(vib_state_str):
     Returns list of quanta of the vibrational excitation, and the html representation.
     Raises StateError whenever the passed vib_state_str is not in exactly the correct
     format.
+    The parsing is memoized, see get_parse_cache_info.
+    """
+    quanta_int, vib_state_html = _parse_vib_state_str(vib_state_str)
+    return list(quanta_int), vib_state_html
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_vib_state_str(vib_state_str):
+    """Memoized implementation of validate_and_parse_vib_state_str, returning the
+    quanta as an (immutable) tuple.
     """
     if vib_state_str == "":
-        return [], ""
+        return (), ""
     #ALEC
     # Check if vib_state_str contains s,p,d,f,g,h, then use pyvalem atomic configuration format
     valid_shells = ["s", "p", "d", "f", "g", "h"]
@@ -95,12 +186,12 @@ def validate_and_parse_vib_state_str(vib_state_str):
     # Check if the vib_state_str has the form e.g."1s2.2s2(3P).3s"
     if len(vib_state_str) >= 2 and vib_state_str[1] in valid_shells and "(" in vib_state_str and ")" in vib_state_str:
         vib_state_html = CompoundLSCoupling(vib_state_str).html
-        quanta_int = [1]
+        quanta_int = (1,)
         return quanta_int, vib_state_html
     # If not check is atomic configuration format e.g. "1s2.2s2.2p6"
     if len(vib_state_str) >= 2 and vib_state_str[1] in valid_shells:
         vib_state_html = AtomicConfiguration(vib_state_str).html
-        quanta_int = [1]
+        quanta_int = (1,)
         return quanta_int, vib_state_html
     #ALEC
 
@@ -121,7 +212,7 @@ def validate_and_parse_vib_state_str(vib_state_str):
         raise StateError(invalid_state_str_msg)
 
     try:
-        quanta_int = [int(q) for q in quanta_str]
+        quanta_int = tuple(int(q) for q in quanta_str)
         vib_state_dim = len(quanta_int)
     except ValueError:
         raise StateError(invalid_state_str_msg)
@@ -141,10 +232,12 @@ def validate_and_parse_vib_state_str(vib_state_str):
     return quanta_int, vib_state_html
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def canonicalise_and_parse_el_state_str(el_state_str):
     """Helper function canonicalizing the el_state_str using the pyvalem package.
     Example:
         canonicalise_el_state_str('1SIGMA-')  = '1Σ-',
+    The parsing is memoized, see get_parse_cache_info.
     """
     el_state_str = el_state_str.strip()
     if el_state_str == "":
@@ -173,6 +266,7 @@ def canonicalise_and_parse_el_state_str(el_state_str):
     return canonicalised_el_state_str, el_state_html    
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def get_el_state_html(el_state_str):
     el_state_str = el_state_str.strip()
     if el_state_str == "":
@@ -193,7 +287,13 @@ def get_el_state_html(el_state_str):
     return MolecularTermSymbol(el_state_str).html
 
 def get_state_str(isotopologue, el_state_str, vib_state_str):
-    molecule_str = str(isotopologue.molecule)
+    return format_state_str(str(isotopologue.molecule), el_state_str, vib_state_str)
+
+
+def format_state_str(molecule_str, el_state_str, vib_state_str):
+    """The string representation of a State (see State.__str__), formatted from the
+    raw (e.g. projected by values_list) fields, without touching any related models.
+    """
     state_str = ";".join(
         s for s in [el_state_str, f'v={vib_state_str.replace(" ", "")}'] if s
     )
@@ -201,13 +301,111 @@ def get_state_str(isotopologue, el_state_str, vib_state_str):
 
 
 def leading_zeros(vib_state_str):
-    quanta_int, _ = validate_and_parse_vib_state_str(vib_state_str)
+    quanta_int, _ = _parse_vib_state_str(vib_state_str)
     return "(" + ", ".join(f"{q:02d}" for q in quanta_int) + ")"
 
 
+_tags_pattern = re.compile("<.*?>")
+
+
 def strip_tags(html_str):
     if html_str == "":
         return ""
-    clean = re.compile('<.*?>')
-    return re.sub(clean, '', html_str)
+    return _tags_pattern.sub("", html_str)
     #return html.fromstring(html_str).text_content()
+
+
+# All the State fields derived from the el_state_str and vib_state_str pair:
+DerivedStateFields = namedtuple(
+    "DerivedStateFields",
+    [
+        "el_state_str",
+        "el_state_html",
+        "el_state_html_notags",
+        "vib_state_html",
+        "vib_state_html_notags",
+        "vib_state_sort_key",
+        "state_html",
+        "state_html_notags",
+        "state_sort_key",
+    ],
+)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def derive_state_fields(el_state_str, vib_state_str):
+    """Derive all the State fields dependent on the el_state_str and vib_state_str
+    in a single pass, with each of the two strings parsed only once.
+    Returns DerivedStateFields named tuple (with the el_state_str canonicalised).
+    """
+    el_state_str, el_state_html = canonicalise_and_parse_el_state_str(el_state_str)
+    _, vib_state_html = _parse_vib_state_str(vib_state_str)
+    vib_state_sort_key = leading_zeros(vib_state_str)
+    state_html = "; ".join(s for s in [el_state_html, vib_state_html] if s)
+    return DerivedStateFields(
+        el_state_str=el_state_str,
+        el_state_html=el_state_html,
+        el_state_html_notags=strip_tags(el_state_html),
+        vib_state_html=vib_state_html,
+        vib_state_html_notags=strip_tags(vib_state_html),
+        vib_state_sort_key=vib_state_sort_key,
+        state_html=state_html,
+        state_html_notags=strip_tags(state_html),
+        state_sort_key="; ".join(s for s in [el_state_str, vib_state_sort_key] if s),
+    )
+
+
+def derive_state_columns(state_strs):
+    """Batched version of derive_state_fields.
+
+    Parameters
+    ----------
+    state_strs : iterable[tuple[str, str]]
+        The (el_state_str, vib_state_str) pairs of many states.
+
+    Returns
+    -------
+    dict[str, list]
+        All the derived State fields (see DerivedStateFields) as columns, keyed by the
+        field names, each holding a value for each of the passed pairs. Each distinct
+        pair is only ever derived once.
+    """
+    memo = {}
+    rows = []
+    for state_str_pair in state_strs:
+        if state_str_pair not in memo:
+            memo[state_str_pair] = derive_state_fields(*state_str_pair)
+        rows.append(memo[state_str_pair])
+    columns = zip(*rows) if rows else [[] for _ in DerivedStateFields._fields]
+    return {
+        field: list(column)
+        for field, column in zip(DerivedStateFields._fields, columns)
+    }
+
+
+_cached_parsers = [
+    canonicalise_and_parse_el_state_str,
+    get_el_state_html,
+    _parse_vib_state_str,
+    derive_state_fields,
+]
+
+
+def get_parse_cache_info():
+    """Returns the hits/misses statistics of the memoized state string parsers.
+    The parsers are shared by the whole process, so each distinct state string only
+    ever gets parsed by pyvalem once (as long as it does not get evicted).
+
+    Returns
+    -------
+    dict[str, functools._CacheInfo]
+        The cache_info named tuples (hits, misses, maxsize, currsize), keyed by the
+        parser names.
+    """
+    return {parser.__name__: parser.cache_info() for parser in _cached_parsers}
+
+
+def clear_parse_cache():
+    """Clears the memoized results and statistics of all the state string parsers."""
+    for parser in _cached_parsers:
+        parser.cache_clear()
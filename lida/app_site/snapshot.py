@@ -0,0 +1,503 @@
+"""In-memory columnar snapshots of the states and transitions of the isotopologues,
+serving the read-only queries (the filters, orderings and projections of the API
+exports) without querying the database.
+
+The dataset only changes by the (rare) ingestions, so, if enabled by
+settings.SNAPSHOTS_ENABLED, the data of each isotopologue get loaded (by two
+queries) into compact numpy structured arrays, opened by each process on the first
+access, or at the worker start if settings.SNAPSHOTS_PRELOAD:
+
+* the states, sorted by their ids, with the string columns interned into the label
+  tables (so stored as integer codes), and the state_sort_key interned in the
+  database ordering, so the codes order the states as the database would;
+* the transitions, sorted by their ids, with their initial and final states
+  referenced by the indices of the states arrays.
+
+The snapshots are versioned by Isotopologue.get_cache_version (bumped by any change
+of the isotopologue data), so get_snapshot opens the snapshot again once the
+isotopologue data have changed, and a stale snapshot is never served.
+
+The snapshots are stored in the settings.SNAPSHOTS_ROOT directory, under
+{iso_slug}/{dataset_name}/{version}/snapshot-{fingerprint}/ (see
+Isotopologue.get_data_fingerprint), as the .npy files of the fixed-width arrays: the
+states and transitions records, and the label tables (of the fixed-width strings,
+with the permutations sorting them, so the labels are looked up by the binary
+search). The snapshot files are written by populate_molecule (or lazily, by the
+first process to access a missing or stale snapshot), and opened memory-mapped
+(read-only) by all the serving processes, so all the workers share the same pages
+of the OS page cache, the opening costs the same for any size of the data, and the
+memory used does not grow with the number of the workers.
+
+The queries are expressed by the same Q filters and order_by fields as the database
+querysets (see Snapshot.select), so the callers only translate their queries once.
+Any filter the snapshots do not support raises the SnapshotError, for the query to
+be served from the database instead.
+"""
+import operator
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .models.isotopologue import Isotopologue
+from .models.transition import Transition
+
+STATES_DTYPE = np.dtype(
+    [
+        ("id", np.int64),
+        ("energy", np.float64),
+        # (nan for the stable states, with the null lifetimes)
+        ("lifetime", np.float64),
+        ("el_state_str", np.int32),
+        ("vib_state_str", np.int32),
+        ("state_sort_key", np.int32),
+    ]
+)
+TRANSITIONS_DTYPE = np.dtype(
+    [
+        ("id", np.int64),
+        # the indices (not the ids) of the states:
+        ("initial_state", np.int32),
+        ("final_state", np.int32),
+        ("partial_lifetime", np.float64),
+        ("delta_energy", np.float64),
+    ]
+)
+# the state columns stored as the codes of the label tables (of the same names):
+LABEL_COLUMNS = ("el_state_str", "vib_state_str", "state_sort_key")
+# the state columns nullable in the database:
+NULLABLE_COLUMNS = ("lifetime",)
+
+COMPARISONS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+LOOKUPS = ("exact", "isnull", "in", *COMPARISONS)
+
+# isotopologue pk: Snapshot, of this process:
+_snapshots = {}
+# isotopologue pk: the lock held while opening its snapshot, so the snapshots of the
+# other isotopologues are not blocked meanwhile:
+_locks = {}
+_lock = threading.Lock()
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Snapshot:
+    """The snapshot of the states and transitions of a single isotopologue.
+
+    Parameters
+    ----------
+    version : str
+        The Isotopologue.get_cache_version of the data.
+    molecule_str : str
+    states : np.ndarray
+        Of the STATES_DTYPE, sorted by the ids.
+    transitions : np.ndarray
+        Of the TRANSITIONS_DTYPE, sorted by the ids.
+    labels : dict[str, np.ndarray]
+        The arrays of the (fixed-width) strings of each of the LABEL_COLUMNS, indexed
+        by their codes.
+    sorters : dict[str, np.ndarray], optional
+        The permutations sorting each of the labels arrays (computed by default).
+    """
+
+    def __init__(
+        self, version, molecule_str, states, transitions, labels, sorters=None
+    ):
+        self.version = version
+        self.molecule_str = molecule_str
+        self.states = states
+        self.transitions = transitions
+        self.labels = labels
+        if sorters is None:
+            sorters = {column: np.argsort(table) for column, table in labels.items()}
+        self.sorters = sorters
+
+    @classmethod
+    def load(cls, isotopologue):
+        """Load the snapshot of the isotopologue data from the database."""
+        version = isotopologue.get_cache_version()
+        # (in the database ordering of the state_sort_key, see the module docstring)
+        rows = list(
+            isotopologue.state_set.order_by("state_sort_key", "pk").values_list(
+                "pk",
+                "energy",
+                "lifetime",
+                "el_state_str",
+                "vib_state_str",
+                "state_sort_key",
+            )
+        )
+        pks, energies, lifetimes, *label_values = list(zip(*rows)) or [()] * 6
+        states = np.empty(len(rows), dtype=STATES_DTYPE)
+        states["id"] = pks
+        states["energy"] = energies
+        # (None gets converted to nan by numpy)
+        states["lifetime"] = np.array(lifetimes, dtype=np.float64)
+        labels = {}
+        for column, values in zip(LABEL_COLUMNS[:2], label_values):
+            labels[column], states[column] = np.unique(
+                np.array(values, dtype=np.str_), return_inverse=True
+            )
+        sort_keys = np.array(label_values[2], dtype=np.str_)
+        first = np.ones(len(sort_keys), dtype=bool)
+        first[1:] = sort_keys[1:] != sort_keys[:-1]
+        labels["state_sort_key"] = sort_keys[first]
+        states["state_sort_key"] = np.cumsum(first) - 1
+        states.sort(order="id")
+
+        # (with the ids of the states fetched, to be replaced by their indices)
+        rows = np.fromiter(
+            Transition.objects.filter(initial_state__isotopologue=isotopologue)
+            .order_by("pk")
+            .values_list(
+                "pk",
+                "initial_state_id",
+                "final_state_id",
+                "partial_lifetime",
+                "delta_energy",
+            )
+            .iterator(),
+            dtype=[
+                (name, np.int64 if name.endswith("state") else dtype)
+                for name, (dtype, _) in TRANSITIONS_DTYPE.fields.items()
+            ],
+        )
+        transitions = np.empty(len(rows), dtype=TRANSITIONS_DTYPE)
+        for column in TRANSITIONS_DTYPE.names:
+            if column in ("initial_state", "final_state"):
+                transitions[column] = np.searchsorted(states["id"], rows[column])
+            else:
+                transitions[column] = rows[column]
+
+        return cls(version, str(isotopologue.molecule), states, transitions, labels)
+
+    def _get_arrays(self):
+        """The arrays of the snapshot, by the names of their files."""
+        return {
+            "states": self.states,
+            "transitions": self.transitions,
+            **self.labels,
+            **{f"{column}-sorter": sorter for column, sorter in self.sorters.items()},
+        }
+
+    def save(self, path):
+        """Write the snapshot files into the (new) path directory, atomically (the
+        files are written into a temporary directory first, moved in place).
+        A snapshot already written into the path (e.g. by another process) is kept.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=path.parent, suffix=".tmp")
+        try:
+            for name, array in self._get_arrays().items():
+                np.save(Path(tmp_path) / f"{name}.npy", array)
+            os.replace(tmp_path, path)
+        except OSError:
+            if not path.is_dir():
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @classmethod
+    def open(cls, path, version, molecule_str):
+        """Open the snapshot files written by save, memory-mapped (read-only)."""
+
+        def load(name):
+            return np.load(Path(path) / f"{name}.npy", mmap_mode="r")
+
+        return cls(
+            version,
+            molecule_str,
+            load("states"),
+            load("transitions"),
+            {column: load(column) for column in LABEL_COLUMNS},
+            {column: load(f"{column}-sorter") for column in LABEL_COLUMNS},
+        )
+
+    @property
+    def nbytes(self):
+        """The size of the snapshot arrays, in bytes (of the shared pages, if opened
+        memory-mapped).
+        """
+        return sum(array.nbytes for array in self._get_arrays().values())
+
+    def get_column(self, category, field):
+        """The column of all the states or transitions (category), by its queryset
+        field (e.g. "pk", "energy" or "initial_state__state_sort_key"), with the
+        LABEL_COLUMNS as their codes.
+
+        Returns
+        -------
+        np.ndarray
+        """
+        if field in ("pk", "id"):
+            return self.states["id"] if category == "states" else self.transitions["id"]
+        if category == "states":
+            if field not in STATES_DTYPE.names:
+                raise SnapshotError(f"Not a field of the states snapshot: {field}")
+            return self.states[field]
+        if field in ("initial_state_id", "final_state_id"):
+            field = field.replace("_id", "__pk")
+        relation, _, state_field = field.partition("__")
+        if relation in ("initial_state", "final_state"):
+            indices = self.transitions[relation]
+            return self.get_column("states", state_field or "pk")[indices]
+        if field not in TRANSITIONS_DTYPE.names:
+            raise SnapshotError(f"Not a field of the transitions snapshot: {field}")
+        return self.transitions[field]
+
+    def _get_code(self, field, label):
+        """The code of the label of the field, -1 if not in the label table."""
+        if not isinstance(label, str):
+            raise SnapshotError(f"Invalid label of the {field}: {label!r}")
+        column = field.rpartition("__")[2]
+        table, sorter = self.labels[column], self.sorters[column]
+        i = np.searchsorted(table, label, sorter=sorter)
+        if i < len(table) and table[sorter[i]] == label:
+            return sorter[i]
+        return -1
+
+    def _lookup_mask(self, category, lookup, value):
+        *path, name = lookup.split("__")
+        if name not in LOOKUPS:
+            path, name = [*path, name], "exact"
+        field = "__".join(path)
+        column = self.get_column(category, field)
+        label_column = field.rpartition("__")[2] in LABEL_COLUMNS
+        if name == "isnull" or (name == "exact" and value is None):
+            if column.dtype.kind == "f":
+                is_null = np.isnan(column)
+            else:
+                is_null = np.zeros(len(column), dtype=bool)
+            return is_null if name == "exact" or value else ~is_null
+        if name == "in":
+            if label_column:
+                return np.isin(column, [self._get_code(field, v) for v in value])
+            return np.isin(column, [self._get_number(column, v) for v in value])
+        if label_column:
+            code = self._get_code(field, value)
+            if name == "exact":
+                return column == code
+            # the ordering of the labels is only known for the labels of the table:
+            if field.rpartition("__")[2] != "state_sort_key" or code < 0:
+                raise SnapshotError(f"Unsupported lookup of the snapshot: {lookup}")
+            value = code
+        else:
+            value = self._get_number(column, value)
+        if name == "exact":
+            return column == value
+        return COMPARISONS[name](column, value)
+
+    @staticmethod
+    def _get_number(column, value):
+        try:
+            return column.dtype.type(value)
+        except (TypeError, ValueError):
+            raise SnapshotError(f"Invalid value of the snapshot lookup: {value!r}")
+
+    def filter_mask(self, category, filters):
+        """The boolean mask of the states or transitions (category) matching the Q
+        filters (of the fields resolved by get_column, and of the LOOKUPS only).
+
+        Raises
+        ------
+        SnapshotError
+            If the filters are not supported by the snapshots.
+        """
+        size = len(self.states if category == "states" else self.transitions)
+        masks = []
+        for child in filters.children:
+            if isinstance(child, Q):
+                masks.append(self.filter_mask(category, child))
+            else:
+                masks.append(self._lookup_mask(category, *child))
+        if not masks:
+            mask = np.ones(size, dtype=bool)
+        elif filters.connector == Q.OR:
+            mask = np.logical_or.reduce(masks)
+        else:
+            mask = np.logical_and.reduce(masks)
+        return ~mask if filters.negated else mask
+
+    def select(self, category, filters=None, order_by=("pk",)):
+        """The states or transitions (category) matching the filters, ordered by
+        the order_by fields (all ascending), as a queryset would.
+
+        Returns
+        -------
+        SnapshotRows
+
+        Raises
+        ------
+        SnapshotError
+            If the filters or the ordering are not supported by the snapshots.
+        """
+        for field in order_by:
+            # (the codes of the other label columns do not follow their ordering)
+            name = field.rpartition("__")[2]
+            if field.startswith("-") or name in ("el_state_str", "vib_state_str"):
+                raise SnapshotError(f"Unsupported ordering of the snapshot: {field}")
+        if filters is None:
+            indices = np.arange(
+                len(self.states if category == "states" else self.transitions)
+            )
+        else:
+            indices = np.flatnonzero(self.filter_mask(category, filters))
+        if list(order_by) != ["pk"]:
+            # (the rows are sorted by the ids, so the ordering is stable by the ids)
+            keys = [self.get_column(category, field)[indices] for field in order_by]
+            indices = indices[np.lexsort(keys[::-1])]
+        return SnapshotRows(self, category, indices)
+
+
+class SnapshotRows:
+    """The rows of a Snapshot selected by Snapshot.select, sliced as a queryset."""
+
+    def __init__(self, snapshot, category, indices):
+        self.snapshot = snapshot
+        self.category = category
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        return SnapshotRows(self.snapshot, self.category, self.indices[item])
+
+    def values(self, field):
+        """The column of the queryset field of the rows, with the LABEL_COLUMNS as
+        their labels and the nulls as nan.
+
+        Returns
+        -------
+        np.ndarray
+        """
+        column = self.snapshot.get_column(self.category, field)[self.indices]
+        name = field.rpartition("__")[2]
+        if name in LABEL_COLUMNS:
+            return self.snapshot.labels[name][column]
+        return column
+
+    def iter_values(self, *fields, chunk_size=2000):
+        """Yield the tuples of the values of the queryset fields of each row, as
+        QuerySet.values_list would (with the nulls as None).
+        """
+        nullable = [field.rpartition("__")[2] in NULLABLE_COLUMNS for field in fields]
+        for start in range(0, len(self.indices), chunk_size):
+            rows = self[start : start + chunk_size]
+            columns = []
+            for field, is_nullable in zip(fields, nullable):
+                values = rows.values(field)
+                if is_nullable:
+                    values = np.where(np.isnan(values), None, values)
+                columns.append(values.tolist())
+            yield from zip(*columns)
+
+
+def get_snapshot_dir(isotopologue, fingerprint=None):
+    if fingerprint is None:
+        fingerprint = isotopologue.get_data_fingerprint()
+    return (
+        Path(settings.SNAPSHOTS_ROOT)
+        / isotopologue.iso_slug
+        / isotopologue.dataset_name
+        / str(isotopologue.version)
+        / f"snapshot-{fingerprint}"
+    )
+
+
+def write_snapshot(isotopologue):
+    """Write the snapshot files of the isotopologue data, loaded from the database,
+    removing any stale snapshot files of the isotopologue.
+
+    Returns
+    -------
+    Path
+        The directory of the snapshot files.
+    """
+    path = get_snapshot_dir(isotopologue)
+    Snapshot.load(isotopologue).save(path)
+    for stale_path in path.parent.glob("snapshot-*"):
+        if stale_path != path:
+            # (any processes still having the stale files open keep them mapped)
+            shutil.rmtree(stale_path, ignore_errors=True)
+    return path
+
+
+def open_snapshot(isotopologue):
+    """Open the up-to-date snapshot files of the isotopologue, written if missing or
+    stale.
+
+    Returns
+    -------
+    Snapshot
+    """
+    path = get_snapshot_dir(isotopologue)
+    if not path.is_dir():
+        write_snapshot(isotopologue)
+    return Snapshot.open(
+        path, isotopologue.get_cache_version(), str(isotopologue.molecule)
+    )
+
+
+def _get_lock(isotopologue_pk):
+    with _lock:
+        return _locks.setdefault(isotopologue_pk, threading.Lock())
+
+
+def get_snapshot(isotopologue):
+    """The up-to-date Snapshot of the isotopologue data (opened if not opened by this
+    process yet, or stale), or None if the snapshots are not enabled.
+    """
+    if not settings.SNAPSHOTS_ENABLED:
+        return None
+    version = isotopologue.get_cache_version()
+    snapshot = _snapshots.get(isotopologue.pk)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _get_lock(isotopologue.pk):
+        # (might have been loaded by another thread meanwhile)
+        snapshot = _snapshots.get(isotopologue.pk)
+        if snapshot is None or snapshot.version != version:
+            snapshot = open_snapshot(isotopologue)
+            _snapshots[isotopologue.pk] = snapshot
+    return snapshot
+
+
+def preload_snapshots():
+    """Load the snapshots of all the isotopologues, if enabled and
+    settings.SNAPSHOTS_PRELOAD (e.g. at the worker start).
+    """
+    if not (settings.SNAPSHOTS_ENABLED and settings.SNAPSHOTS_PRELOAD):
+        return
+    for isotopologue in Isotopologue.objects.select_related("molecule"):
+        get_snapshot(isotopologue)
+
+
+def clear_snapshots():
+    with _lock:
+        _snapshots.clear()
+
+
+def get_memory_usage():
+    """The memory used by the snapshots opened by this process (shared with all the
+    other processes, see the module docstring).
+
+    Returns
+    -------
+    dict[str, int]
+        The bytes used by the snapshot of each molecule.
+    """
+    return {snapshot.molecule_str: snapshot.nbytes for snapshot in _snapshots.values()}
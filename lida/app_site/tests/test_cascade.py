@@ -0,0 +1,182 @@
+import numpy as np
+from django.test import TestCase
+
+from ..cache import get_cache
+from ..cascade import (
+    CascadeError,
+    build_decay_graph,
+    build_rate_matrix,
+    compute_decay_columns,
+    find_decay_paths,
+    get_decay_columns,
+    get_decay_graph,
+    get_rate_matrix,
+    solve_cascade,
+)
+from ..models import Molecule, Isotopologue, State, Transition
+
+
+class TestCascade(TestCase):
+    def setUp(self):
+        # 3 -> 2 -> 1 and 3 -> 1, with the state 1 stable:
+        self.rate_matrix = build_rate_matrix(
+            state_ids=[1, 2, 3],
+            lifetimes=[np.nan, 1.0, 0.1],
+            energies=[0.0, 0.1, 0.2],
+            initial_ids=[3, 3, 2],
+            final_ids=[2, 1, 1],
+            partial_lifetimes=[0.2, 0.2, 1.0],
+        )
+
+    def test_rate_matrix(self):
+        self.assertEqual(
+            [[0, 1, 5], [0, -1, 5], [0, 0, -10]],
+            self.rate_matrix.matrix.toarray().tolist(),
+        )
+        self.assertEqual([0, 1, 10], self.rate_matrix.decay_rates.tolist())
+
+    def test_solve_cascade(self):
+        times = [0.0, 1.0, 0.1]
+        cascade = solve_cascade(self.rate_matrix, [3], times)
+        self.assertEqual([1, 2, 3], cascade.state_ids.tolist())
+        # the mean times spent in the unstable states:
+        np.testing.assert_allclose([0.5, 0.1], cascade.integrated[1:])
+        self.assertTrue(np.isnan(cascade.integrated[0]))
+        np.testing.assert_allclose([1, 0, 0], cascade.final)
+
+        # the analytic solution, with n3 = exp(-10 t) and
+        # n2 = 5 / 9 (exp(-t) - exp(-10 t)):
+        n3 = np.exp(-10 * np.array(times))
+        n2 = 5 / 9 * (np.exp(-np.array(times)) - n3)
+        np.testing.assert_allclose(n3, cascade.populations[:, 2], rtol=1e-5)
+        np.testing.assert_allclose(n2, cascade.populations[:, 1], rtol=1e-5)
+        np.testing.assert_allclose(1, cascade.populations.sum(axis=1))
+
+        # only the states reachable from the initial states are solved:
+        cascade = solve_cascade(self.rate_matrix, [2])
+        self.assertEqual([1, 2], cascade.state_ids.tolist())
+        self.assertIsNone(cascade.populations)
+
+    def test_invalid_initial_states(self):
+        with self.assertRaises(CascadeError):
+            solve_cascade(self.rate_matrix, [3, 4])
+
+    def test_unordered_energies(self):
+        # 3 -> 2 -> 1, with the transition 3 -> 2 leading up in energy:
+        rate_matrix = build_rate_matrix(
+            state_ids=[1, 2, 3],
+            lifetimes=[np.nan, 0.5, 1.0],
+            energies=[0.0, 0.2, 0.1],
+            initial_ids=[3, 2],
+            final_ids=[2, 1],
+            partial_lifetimes=[1.0, 0.5],
+        )
+        cascade = solve_cascade(rate_matrix, [3], [1.0])
+        np.testing.assert_allclose([0.5, 1], cascade.integrated[1:])
+        np.testing.assert_allclose([1, 0, 0], cascade.final)
+        # n3 = exp(-t) and n2 = exp(-t) - exp(-2 t):
+        np.testing.assert_allclose(
+            [np.exp(-1) - np.exp(-2), np.exp(-1)],
+            cascade.populations[0, 1:],
+            rtol=1e-5,
+        )
+
+        # 3 <-> 2, never decaying into the stable state:
+        rate_matrix = build_rate_matrix(
+            state_ids=[1, 2, 3],
+            lifetimes=[np.nan, 0.5, 1.0],
+            energies=[0.0, 0.2, 0.1],
+            initial_ids=[3, 2],
+            final_ids=[2, 3],
+            partial_lifetimes=[1.0, 0.5],
+        )
+        with self.assertRaises(CascadeError):
+            solve_cascade(rate_matrix, [3])
+
+    def test_decay_paths(self):
+        decay_graph = build_decay_graph(self.rate_matrix)
+        self.assertEqual([0, 0, 1, 3], decay_graph.indptr.tolist())
+        # (the transitions of the state 3 are equally probable)
+        np.testing.assert_allclose([1, 0.5, 0.5], decay_graph.probabilities)
+        paths = list(find_decay_paths(decay_graph, 3, 0.01))
+        self.assertEqual([[3, 1], [3, 2, 1]], sorted(path.state_ids for path in paths))
+        np.testing.assert_allclose([0.5, 0.5], [path.probability for path in paths])
+        self.assertEqual(
+            [[1]], [path.state_ids for path in find_decay_paths(decay_graph, 1, 0.01)]
+        )
+        self.assertEqual(1, len(list(find_decay_paths(decay_graph, 3, 0.01, 1))))
+
+        # 4 -> 3 (0.9), 4 -> 1 (0.1), 3 -> 2 (0.8) and 3 -> 1 (0.2), with the path
+        # 4 -> 1 pruned:
+        rate_matrix = build_rate_matrix(
+            state_ids=[1, 2, 3, 4],
+            lifetimes=[np.nan, 1.0, 0.1, 1.0],
+            energies=[0.0, 0.1, 0.2, 0.3],
+            initial_ids=[3, 3, 2, 4, 4],
+            final_ids=[2, 1, 1, 3, 1],
+            partial_lifetimes=[0.125, 0.5, 1.0, 1 / 0.9, 10.0],
+        )
+        paths = list(find_decay_paths(build_decay_graph(rate_matrix), 4, 0.15))
+        # (from the most probable one)
+        self.assertEqual([[4, 3, 2, 1], [4, 3, 1]], [path.state_ids for path in paths])
+        np.testing.assert_allclose([0.72, 0.18], [path.probability for path in paths])
+
+        with self.assertRaises(CascadeError):
+            find_decay_paths(decay_graph, 4, 0.01)
+
+    def test_decay_columns(self):
+        # 3 -> 2 -> 1 and 3 -> 1 (dominant), 5 <-> 4 (cyclic), state 6 not decaying:
+        decay_columns = compute_decay_columns(
+            state_ids=[6, 5, 4, 3, 2, 1],
+            lifetimes=[1.0, 1.0, 1.0, 0.1, 1.0, np.inf],
+            transition_ids=[10, 11, 12, 13, 14],
+            initial_ids=[3, 3, 2, 4, 5],
+            final_ids=[2, 1, 1, 5, 4],
+            partial_lifetimes=[0.4, 0.2, 1.0, 1.0, 1.0],
+        )
+        self.assertEqual([1, 2, 3, 4, 5, 6], decay_columns.state_ids.tolist())
+        np.testing.assert_allclose(
+            [0, 1, 0.1, np.nan, np.nan, 1], decay_columns.cascade_lifetime
+        )
+        np.testing.assert_allclose([0.25, 0.5, 1, 1, 1], decay_columns.branching_ratio)
+
+    def test_get_rate_matrix(self):
+        molecule = Molecule.create_from_data(formula_str="CO2", name="carbon dioxide")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)2", dataset_name="name", version=1
+        )
+        states = [
+            State.create_from_data(
+                isotopologue,
+                lifetime=lifetime,
+                energy=energy,
+                vib_state_str=vib_state_str,
+                vib_state_labels="(v1, v2, v3)",
+            )
+            for lifetime, energy, vib_state_str in [
+                (float("inf"), 0.0, "(0, 0, 0)"),
+                (1.0, 0.1, "(0, 0, 1)"),
+            ]
+        ]
+        Transition.create_from_data(states[1], states[0], 1.0)
+        # the states and the transitions:
+        with self.assertNumQueries(2):
+            rate_matrix = get_rate_matrix(isotopologue)
+        self.assertEqual([0, 1], rate_matrix.decay_rates.tolist())
+        cascade = solve_cascade(rate_matrix, [states[1].pk])
+        np.testing.assert_allclose([1, 0], cascade.final)
+
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        with self.assertNumQueries(2):
+            decay_columns = get_decay_columns(isotopologue)
+        np.testing.assert_allclose([0, 1], decay_columns.cascade_lifetime)
+        # (cached in the version of the isotopologue data)
+        with self.assertNumQueries(0):
+            get_decay_columns(isotopologue)
+        with self.assertNumQueries(2):
+            decay_graph = get_decay_graph(isotopologue)
+        # (the state indices)
+        self.assertEqual([0], decay_graph.targets.tolist())
+        with self.assertNumQueries(0):
+            get_decay_graph(isotopologue)
@@ -75,3 +75,44 @@ class TestMolecule(TestCase):
         self.assertEqual(m.charge, 0)
         self.assertEqual(m.slug, "H2O_m")
         self.assertEqual(m.number_atoms, 2)
+
+    def test_changed_fields(self):
+        Molecule.create_from_data("CO", name="carbon monoxide")
+        m = Molecule.get_from_formula_str("CO")
+        self.assertEqual([], m.changed_fields)
+        # nothing changed, nothing written:
+        with self.assertNumQueries(0):
+            m.save()
+        # sync of an instance already in sync does not write anything either:
+        with self.assertNumQueries(0):
+            m.sync()
+        m.name = "CO"
+        self.assertEqual(["name"], m.changed_fields)
+        self.assertEqual("carbon monoxide", m.get_saved_value("name"))
+        # the molecule update and the isotopologue generation bump:
+        with self.assertNumQueries(2):
+            m.save()
+        self.assertEqual([], m.changed_fields)
+        self.assertEqual("CO", Molecule.get_from_formula_str("CO").name)
+
+        # only the changed columns are written:
+        m_other = Molecule.get_from_formula_str("CO")
+        m.name = "foo"
+        m.save()
+        m_other.html = "bar"
+        m_other.save()
+        m = Molecule.get_from_formula_str("CO")
+        self.assertEqual(("foo", "bar"), (m.name, m.html))
+
+    def test_changed_fields_update_fields(self):
+        Molecule.create_from_data("CO", name="carbon monoxide")
+        m = Molecule.get_from_formula_str("CO")
+        m.name = "X"
+        # only the update_fields get written, so only these are marked as saved:
+        m.save(update_fields=["time_modified"])
+        self.assertEqual(["name"], m.changed_fields)
+        m.save(update_fields=[])
+        self.assertEqual(["name"], m.changed_fields)
+        m.save()
+        self.assertEqual([], m.changed_fields)
+        self.assertEqual("X", Molecule.get_from_formula_str("CO").name)
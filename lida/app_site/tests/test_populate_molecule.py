@@ -0,0 +1,183 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase
+
+from res.populate_molecule import (
+    iter_states_data,
+    iter_transitions_data,
+    populate_molecule,
+)
+from ..models import Molecule, Isotopologue, State, Transition
+from ..models.exceptions import StateError, TransitionError
+
+STATES_DATA = """i,E,tau
+0,0.0,inf
+1,0.1,0.5
+2,0.2,0.1
+3,1.0,0.01
+4,1.1,0.02
+"""
+STATES_ELECTRONIC = """i,State
+0,X(1SIGMA+)
+1,X(1SIGMA+)
+2,X(1SIGMA+)
+3,A(1PI)
+4,A(1PI)
+"""
+STATES_VIBRATIONAL = """i,v1,v2
+0,0,0
+1,1,0
+2,0,1
+3,0,0
+4,1,0
+"""
+TRANSITIONS_DATA = """i,f,tau_if
+1,0,0.5
+2,0,0.2
+2,1,0.2
+3,0,0.01
+4,3,0.04
+4,1,0.04
+"""
+META_DATA = {
+    "iso_formula": "(12C)(16O)2",
+    "input": {"dataset_name": "name"},
+    "version": 1,
+}
+
+
+class TestPopulateMolecule(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.data_dir = Path(tmp_dir.name) / "CO2"
+        self.data_dir.mkdir()
+        self.write_files(
+            states_data=STATES_DATA,
+            states_electronic=STATES_ELECTRONIC,
+            states_vibrational=STATES_VIBRATIONAL,
+            transitions_data=TRANSITIONS_DATA,
+        )
+        with open(self.data_dir / "meta_data.json", "w") as fp:
+            json.dump(META_DATA, fp)
+
+    def write_files(self, **contents):
+        for name, content in contents.items():
+            self.data_dir.joinpath(f"{name}.csv").write_text(content)
+
+    def populate(self, bulk, batch_size=2):
+        populate_molecule(
+            self.data_dir, bulk=bulk, batch_size=batch_size, build_exports=False
+        )
+
+    @staticmethod
+    def get_populated():
+        isotopologue = Isotopologue.objects.get()
+        states = State.objects.order_by("state_sort_key").values_list(
+            "el_state_str",
+            "vib_state_str",
+            "state_html",
+            "state_sort_key",
+            "lifetime",
+            "energy",
+            "number_transitions_from",
+            "number_transitions_to",
+        )
+        transitions = Transition.objects.order_by(
+            "initial_state__state_sort_key", "final_state__state_sort_key"
+        ).values_list(
+            "initial_state__state_sort_key",
+            "final_state__state_sort_key",
+            "partial_lifetime",
+            "delta_energy",
+        )
+        return (
+            (
+                isotopologue.ground_el_state_str,
+                isotopologue.vib_quantum_labels,
+                isotopologue.number_states,
+                isotopologue.number_transitions,
+            ),
+            list(states),
+            list(transitions),
+        )
+
+    def test_iter_states_data(self):
+        batches = list(iter_states_data(self.data_dir, 2))
+        self.assertEqual([2, 2, 1], [len(batch) for batch in batches])
+        self.assertEqual(
+            [
+                (0, float("inf"), 0.0, "X(1SIGMA+)", "(0, 0)"),
+                (1, 0.5, 0.1, "X(1SIGMA+)", "(1, 0)"),
+            ],
+            batches[0],
+        )
+        self.assertEqual([(4, 0.02, 1.1, "A(1PI)", "(1, 0)")], batches[-1])
+        # (the chunks spanning all the states)
+        self.assertEqual(
+            list(iter_states_data(self.data_dir, 10))[0],
+            [state_data for batch in batches for state_data in batch],
+        )
+
+        # the vibrational states only, by a single quantum:
+        self.data_dir.joinpath("states_electronic.csv").unlink()
+        self.write_files(states_vibrational="i,v\n0,0\n1,1\n2,2\n3,3\n4,4\n")
+        batches = list(iter_states_data(self.data_dir, 3))
+        self.assertEqual(
+            [(3, 0.01, 1.0, "", "3"), (4, 0.02, 1.1, "", "4")], batches[-1]
+        )
+
+    def test_iter_states_data_mismatch(self):
+        # the states files of different lengths (also only differing in the last
+        # chunk):
+        for states_electronic in [
+            STATES_ELECTRONIC[: STATES_ELECTRONIC.rindex("3,")],
+            STATES_ELECTRONIC + "5,A(1PI)\n",
+            STATES_ELECTRONIC.replace("4,A(1PI)", "5,A(1PI)"),
+        ]:
+            with self.subTest(states_electronic=states_electronic):
+                self.write_files(states_electronic=states_electronic)
+                with self.assertRaises(ValueError):
+                    list(iter_states_data(self.data_dir, 2))
+
+    def test_iter_transitions_data(self):
+        batches = list(iter_transitions_data(self.data_dir, 4))
+        self.assertEqual([4, 2], [len(i) for i, _, _ in batches])
+        i, f, tau_if = batches[1]
+        self.assertEqual([4, 4], i.tolist())
+        self.assertEqual([3, 1], f.tolist())
+        self.assertEqual([0.04, 0.04], tau_if.tolist())
+
+    def test_bulk_as_per_row(self):
+        self.populate(bulk=False)
+        populated = self.get_populated()
+        self.assertEqual((5, 6), populated[0][2:])
+        self.assertEqual(6, len(populated[2]))
+
+        for batch_size in 1, 2, 100:
+            with self.subTest(batch_size=batch_size):
+                Molecule.objects.all().delete()
+                self.populate(bulk=True, batch_size=batch_size)
+                self.assertEqual(populated, self.get_populated())
+
+    def test_bulk_rollback(self):
+        # the duplicate state in the second batch of the states:
+        self.write_files(
+            states_vibrational=STATES_VIBRATIONAL.replace("2,0,1", "2,0,0"),
+        )
+        with self.assertRaises(StateError):
+            self.populate(bulk=True)
+        self.assertFalse(State.objects.exists())
+
+        # the duplicate transition in the second batch of the transitions:
+        self.write_files(
+            states_vibrational=STATES_VIBRATIONAL,
+            transitions_data=TRANSITIONS_DATA + "2,0,0.3\n",
+        )
+        Molecule.objects.all().delete()
+        with self.assertRaises(TransitionError):
+            self.populate(bulk=True)
+        self.assertFalse(State.objects.exists())
+        self.assertFalse(Transition.objects.exists())
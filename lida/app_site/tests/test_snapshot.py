@@ -0,0 +1,229 @@
+import io
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from ..keyset import keyset_filter
+from ..models import Molecule, Isotopologue, State, Transition
+from ..snapshot import (
+    Snapshot,
+    SnapshotError,
+    clear_snapshots,
+    get_memory_usage,
+    get_snapshot,
+    get_snapshot_dir,
+    open_snapshot,
+    write_snapshot,
+)
+
+
+# noinspection PyTypeChecker
+@override_settings(SNAPSHOTS_ENABLED=True)
+class TestSnapshot(TestCase):
+    def setUp(self):
+        snapshots_root = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshots_root.cleanup)
+        settings_override = self.settings(SNAPSHOTS_ROOT=snapshots_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        clear_snapshots()
+        self.addCleanup(clear_snapshots)
+        molecule = Molecule.create_from_data(formula_str="CO2", name="carbon dioxide")
+        self.isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)2", dataset_name="name", version=1
+        )
+        self.states = [
+            State.create_from_data(
+                self.isotopologue,
+                lifetime=lifetime,
+                energy=energy,
+                vib_state_str=vib_state_str,
+                vib_state_labels="(v1, v2, v3)",
+            )
+            for lifetime, energy, vib_state_str in [
+                (0.01, 0.2, "(0, 0, 2)"),
+                (float("inf"), 0.0, "(0, 0, 0)"),
+                (0.1, 0.1, "(0, 0, 1)"),
+            ]
+        ]
+        Transition.create_from_data(self.states[0], self.states[2], 0.02)
+        Transition.create_from_data(self.states[2], self.states[1], 0.1)
+
+    def assertSelected(self, category, filters, order_by, expected_pks):
+        rows = get_snapshot(self.isotopologue).select(category, filters, order_by)
+        self.assertEqual(expected_pks, rows.values("pk").tolist())
+
+    def test_select(self):
+        pks = [state.pk for state in self.states]
+        self.assertSelected("states", None, ("pk",), pks)
+        # (ordered as by the database)
+        ordered_pks = State.objects.order_by("state_sort_key", "pk").values_list(
+            "pk", flat=True
+        )
+        self.assertEqual([pks[1], pks[2], pks[0]], list(ordered_pks))
+        self.assertSelected("states", None, ("state_sort_key", "pk"), list(ordered_pks))
+        self.assertSelected("states", Q(energy__gte=0.1), ("pk",), [pks[0], pks[2]])
+        # (the null lifetimes compare as in SQL)
+        self.assertSelected("states", Q(lifetime__gte=0.05), ("pk",), [pks[2]])
+        self.assertSelected(
+            "states",
+            Q(lifetime__gte=0.05) | Q(lifetime__isnull=True),
+            ("pk",),
+            pks[1:],
+        )
+        self.assertSelected("states", Q(vib_state_str="(0, 0, 1)"), ("pk",), [pks[2]])
+        self.assertSelected("states", Q(vib_state_str="foo"), ("pk",), [])
+        self.assertSelected("states", ~Q(energy=0.0), ("pk",), [pks[0], pks[2]])
+
+        transitions = list(Transition.objects.order_by("pk"))
+        self.assertSelected(
+            "transitions",
+            Q(initial_state__energy__lte=0.1) & Q(final_state_id=pks[1]),
+            ("pk",),
+            [transitions[1].pk],
+        )
+        # the rows following a key of the keyset pagination:
+        ordering = (
+            "initial_state__state_sort_key",
+            "final_state__state_sort_key",
+            "pk",
+        )
+        key = Transition.objects.filter(pk=transitions[1].pk).values_list(*ordering)[0]
+        self.assertSelected(
+            "transitions", keyset_filter(ordering, key), ordering, [transitions[0].pk]
+        )
+
+    def test_unsupported(self):
+        snapshot = get_snapshot(self.isotopologue)
+        for filters, order_by in [
+            (Q(energy__range=(0, 1)), ("pk",)),
+            (Q(foo=1), ("pk",)),
+            (Q(vib_state_str__gt="(0, 0, 1)"), ("pk",)),
+            (Q(state_sort_key__gt="foo"), ("pk",)),
+            (None, ("-energy",)),
+            (None, ("el_state_str",)),
+        ]:
+            with self.subTest(filters=filters, order_by=order_by):
+                with self.assertRaises(SnapshotError):
+                    snapshot.select("states", filters, order_by)
+
+    def test_iter_values(self):
+        rows = get_snapshot(self.isotopologue).select("transitions")
+        self.assertEqual(
+            [
+                ("(0, 0, 2)", 0.01, self.states[2].pk),
+                ("(0, 0, 1)", 0.1, self.states[1].pk),
+            ],
+            list(
+                rows.iter_values(
+                    "initial_state__vib_state_str",
+                    "initial_state__lifetime",
+                    "final_state_id",
+                    chunk_size=1,
+                )
+            ),
+        )
+        rows = get_snapshot(self.isotopologue).select("states")
+        self.assertEqual([0.01, None, 0.1], [v for v, in rows.iter_values("lifetime")])
+
+    def test_versioning(self):
+        with self.assertNumQueries(2):
+            snapshot = get_snapshot(self.isotopologue)
+        with self.assertNumQueries(0):
+            self.assertIs(snapshot, get_snapshot(self.isotopologue))
+
+        # reloaded once the data have changed:
+        state = State.objects.get(pk=self.states[2].pk)
+        state.energy = 0.15
+        state.save()
+        isotopologue = Isotopologue.objects.get(pk=self.isotopologue.pk)
+        snapshot = get_snapshot(isotopologue)
+        self.assertEqual(
+            0.15, snapshot.states["energy"][snapshot.states["id"] == state.pk][0]
+        )
+
+        with self.settings(SNAPSHOTS_ENABLED=False):
+            self.assertIsNone(get_snapshot(isotopologue))
+
+    def test_locking(self):
+        molecule = Molecule.create_from_data(formula_str="CO", name="carbon monoxide")
+        other = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        loaded = Snapshot.load(self.isotopologue)
+        started, release = threading.Event(), threading.Event()
+
+        def open_snapshot_blocking(isotopologue):
+            if isotopologue.pk != self.isotopologue.pk:
+                return open_snapshot(isotopologue)
+            started.set()
+            release.wait(5)
+            return loaded
+
+        with mock.patch("app_site.snapshot.open_snapshot", open_snapshot_blocking):
+            thread = threading.Thread(target=get_snapshot, args=(self.isotopologue,))
+            thread.start()
+            try:
+                started.wait(5)
+                # (not blocked by the snapshot opened by the other thread)
+                self.assertEqual(0, len(get_snapshot(other).states))
+                self.assertTrue(thread.is_alive())
+            finally:
+                release.set()
+                thread.join()
+        self.assertIs(loaded, get_snapshot(self.isotopologue))
+
+    def test_files(self):
+        # written once, by the first access:
+        snapshot = get_snapshot(self.isotopologue)
+        path = get_snapshot_dir(self.isotopologue)
+        self.assertTrue((path / "states.npy").is_file())
+        self.assertIsInstance(snapshot.states, np.memmap)
+        self.assertFalse(snapshot.states.flags.writeable)
+        # opened by the other processes without any queries:
+        with self.assertNumQueries(0):
+            opened = open_snapshot(self.isotopologue)
+        loaded = Snapshot.load(self.isotopologue)
+        # (the nan lifetimes compared as well)
+        self.assertEqual(loaded.states.tobytes(), opened.states.tobytes())
+        self.assertEqual(loaded.transitions.tobytes(), opened.transitions.tobytes())
+        for column in loaded.labels:
+            np.testing.assert_array_equal(loaded.labels[column], opened.labels[column])
+
+        # the stale files get removed once the data have changed:
+        state = State.objects.get(pk=self.states[0].pk)
+        state.lifetime = 0.02
+        state.save()
+        isotopologue = Isotopologue.objects.get(pk=self.isotopologue.pk)
+        new_path = write_snapshot(isotopologue)
+        self.assertNotEqual(path, new_path)
+        self.assertEqual([new_path], list(path.parent.glob("snapshot-*")))
+        # (already written)
+        write_snapshot(isotopologue)
+        self.assertEqual([new_path], list(path.parent.glob("*")))
+
+    def test_memory_usage(self):
+        snapshot = get_snapshot(self.isotopologue)
+        self.assertEqual({"CO2": snapshot.nbytes}, get_memory_usage())
+        self.assertGreater(
+            snapshot.nbytes, snapshot.states.nbytes + snapshot.transitions.nbytes
+        )
+        out = io.StringIO()
+        call_command("snapshot_memory", stdout=out)
+        self.assertIn("CO2: 0.0 MB (3 states, 2 transitions)", out.getvalue())
+
+    def test_empty(self):
+        molecule = Molecule.create_from_data(formula_str="CO", name="carbon monoxide")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        snapshot = Snapshot.load(isotopologue)
+        self.assertEqual(0, len(snapshot.select("states", Q(energy__gte=0))))
+        self.assertEqual(
+            np.int64, snapshot.select("transitions").values("pk").dtype.type
+        )
@@ -1,3 +1,6 @@
+from unittest import mock
+
+from django.db import IntegrityError
 from django.test import TestCase
 
 # noinspection PyProtectedMember
@@ -8,6 +11,9 @@ from ..models.exceptions import StateError
 from ..models.utils import (
     validate_and_parse_vib_state_str,
     canonicalise_and_parse_el_state_str,
+    get_parse_cache_info,
+    clear_parse_cache,
+    derive_state_columns,
 )
 
 
@@ -69,6 +75,37 @@ class TestUtils(TestCase):
     def test_el_state_canonicalisation(self):
         self.assertEqual("1Σ-", canonicalise_and_parse_el_state_str(" 1SIGMA- ")[0])
 
+    def test_parse_cache(self):
+        clear_parse_cache()
+        for _ in range(3):
+            canonicalise_and_parse_el_state_str("X(2PI)")
+            quanta, _ = validate_and_parse_vib_state_str("(1, 2, 3)")
+            # the memoized results must not be mutable by the callers:
+            quanta.append(4)
+        self.assertEqual([1, 2, 3], validate_and_parse_vib_state_str("(1, 2, 3)")[0])
+        cache_info = get_parse_cache_info()
+        el_info = cache_info["canonicalise_and_parse_el_state_str"]
+        vib_info = cache_info["_parse_vib_state_str"]
+        self.assertEqual((2, 1, 1), (el_info.hits, el_info.misses, el_info.currsize))
+        self.assertEqual((3, 1, 1), (vib_info.hits, vib_info.misses, vib_info.currsize))
+        clear_parse_cache()
+        for info in get_parse_cache_info().values():
+            self.assertEqual((0, 0, 0), (info.hits, info.misses, info.currsize))
+
+    def test_derive_state_columns(self):
+        columns = derive_state_columns(
+            [("a(3PI)", "1"), ("", "(0, 3, 0)"), ("a(3PI)", "1")]
+        )
+        self.assertEqual(["a(3Π)", "", "a(3Π)"], columns["el_state_str"])
+        self.assertEqual(["a3Π", "", "a3Π"], columns["el_state_html_notags"])
+        self.assertEqual(
+            ["a<sup>3</sup>Π; <i>v</i>=1", "<b><i>v</i></b>=(0, 3, 0)"],
+            columns["state_html"][:2],
+        )
+        self.assertEqual(["a3Π; v=1", "v=(0, 3, 0)"], columns["state_html_notags"][:2])
+        self.assertEqual(["a(3Π); (01)", "(00, 03, 00)"], columns["state_sort_key"][:2])
+        self.assertEqual([], derive_state_columns([])["state_html"])
+
 
 # noinspection PyTypeChecker
 class TestState(TestCase):
@@ -586,3 +623,83 @@ class TestState(TestCase):
 
         # any indirect or batch saving/deleting methods will not trigger the sync, but
         # tough luck!
+
+    def test_bulk_create_from_data(self):
+        self.diff_isotopologue.set_ground_el_state_str("")
+        molecule = Molecule.create_from_data(formula_str="CO2", name="carbon dioxide")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)2", dataset_name="name", version=1
+        )
+        pks = State.bulk_create_from_data(
+            isotopologue,
+            [
+                (float("inf"), 0, "", "(0, 0, 0)"),
+                (0.1, 0.2, "", "(0, 1, 0)"),
+                (0.01, 0.4, "", "(0, 2, 0)"),
+            ],
+            vib_state_labels="(v1, v2, v3)",
+        )
+        self.assertEqual(3, isotopologue.state_set.count())
+        self.assertEqual(3, isotopologue.vib_state_dim)
+        s = State.objects.get(pk=pks[1])
+        self.assertEqual("(0, 1, 0)", s.vib_state_str)
+        self.assertEqual("<b><i>v</i></b>=(0, 1, 0)", s.vib_state_html)
+        self.assertEqual("(00, 01, 00)", s.state_sort_key)
+        self.assertEqual((0.1, 0.2), (s.lifetime, s.energy))
+        self.assertIsNone(State.objects.get(pk=pks[0]).lifetime)
+        # (only the states of the batch read back, if the pks are not returned)
+        pks = State.bulk_create_from_data(
+            isotopologue,
+            [(0.01, 0.6, "", "(0, 3, 0)"), (0.01, 0.5, "", "(1, 0, 0)")],
+            vib_state_labels="(v1, v2, v3)",
+        )
+        self.assertEqual(
+            ["(0, 3, 0)", "(1, 0, 0)"],
+            [State.objects.get(pk=pk).vib_state_str for pk in pks],
+        )
+
+        # counters are only synced on demand:
+        self.assertEqual(0, Isotopologue.objects.get(pk=isotopologue.pk).number_states)
+        isotopologue.sync_counters()
+        self.assertEqual(5, Isotopologue.objects.get(pk=isotopologue.pk).number_states)
+
+    def test_bulk_create_from_data_invalid(self):
+        self.isotopologue.set_ground_el_state_str("")
+        State.create_from_data(
+            self.isotopologue,
+            0,
+            0,
+            vib_state_str="(0, 0, 0)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        for states_data in [
+            [(0, 0, "", "(1, 0, 0)"), (0, 0, "", "(1, 0, 0)")],
+            [(0, 0, "", "(1, 0, 0)"), (0, 0, "", "(0, 0, 0)")],
+            [(0, 0, "", "(1, 0, 0)"), (0, 0, "", "1")],
+            [(0, 0, "", "(1, 0, 0)"), (-1, 0, "", "(2, 0, 0)")],
+        ]:
+            with self.subTest(states_data=states_data):
+                with self.assertRaises(StateError):
+                    State.bulk_create_from_data(
+                        self.isotopologue,
+                        states_data,
+                        vib_state_labels="(v1, v2, v3)",
+                    )
+        self.assertEqual(1, self.isotopologue.state_set.count())
+        # the state already existing is reported:
+        with self.assertRaisesRegex(StateError, r"v=\(0,0,0\)\" already exists"):
+            State.bulk_create_from_data(
+                self.isotopologue,
+                [(0, 0, "", "(1, 0, 0)"), (0, 0, "", "(0, 0, 0)")],
+                vib_state_labels="(v1, v2, v3)",
+            )
+        # (e.g. deleted concurrently, before the conflict is looked up)
+        with mock.patch.object(
+            State.objects, "bulk_create", side_effect=IntegrityError
+        ):
+            with self.assertRaisesRegex(StateError, "Some of the states"):
+                State.bulk_create_from_data(
+                    self.isotopologue,
+                    [(0, 0, "", "(1, 0, 0)")],
+                    vib_state_labels="(v1, v2, v3)",
+                )
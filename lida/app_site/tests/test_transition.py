@@ -1,3 +1,8 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
 
 from ..models import Molecule, Isotopologue, State, Transition
@@ -257,3 +262,196 @@ class TestTransition(TestCase):
         s2.save()
         self.assertEqual(Transition.objects.get(pk=tr1_pk).delta_energy, 41)
         self.assertEqual(Transition.objects.get(pk=tr2_pk).delta_energy, 39)
+
+    def test_bulk_create_from_data(self):
+        s1, s2 = self.state_high, self.state_low
+        s3 = State.create_from_data(
+            self.isotopologue,
+            lifetime=0.1,
+            energy=42,
+            vib_state_str="(9, 9, 9)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        state_energies = {s.pk: s.energy for s in [s1, s2, s3]}
+        Transition.bulk_create_from_data(
+            [(s1.pk, s2.pk, 0.1), (s3.pk, s2.pk, 0.2), (s3.pk, s1.pk, 0.3)],
+            state_energies=state_energies,
+        )
+        self.assertEqual(3, Transition.objects.count())
+        self.assertEqual(
+            Transition.get_from_states(s3, s1).delta_energy, s1.energy - s3.energy
+        )
+
+        # the counters are only synced on demand:
+        self.assertEqual(0, Isotopologue.get_from_formula_str("CO2").number_transitions)
+        self.isotopologue.sync_counters()
+        self.assertEqual(3, Isotopologue.get_from_formula_str("CO2").number_transitions)
+        for s, n_from, n_to in [(s1, 1, 1), (s2, 0, 2), (s3, 2, 0)]:
+            s = State.objects.get(pk=s.pk)
+            self.assertEqual(
+                (n_from, n_to), (s.number_transitions_from, s.number_transitions_to)
+            )
+
+    def test_bulk_create_from_data_invalid(self):
+        s1, s2 = self.state_high, self.state_low
+        Transition.create_from_data(s1, s2, 0.1)
+        state_energies = {s.pk: s.energy for s in [s1, s2]}
+        for transitions_data in [
+            [(s1.pk, s1.pk, 0.1)],
+            [(s2.pk, s1.pk, 0.1), (s2.pk, s1.pk, 0.1)],
+            [(s1.pk, s2.pk, 0.1)],
+            [(s2.pk, s1.pk, -0.1)],
+            [(s2.pk, self.diff_state_low.pk, 0.1)],
+        ]:
+            with self.subTest(transitions_data=transitions_data):
+                with self.assertRaises(TransitionError):
+                    Transition.bulk_create_from_data(
+                        transitions_data, state_energies=state_energies
+                    )
+        self.assertEqual(1, Transition.objects.count())
+        # the transition already existing is reported:
+        with self.assertRaisesRegex(
+            TransitionError, rf"Transition\(pk={s1.pk}, pk={s2.pk}\) already exists"
+        ):
+            Transition.bulk_create_from_data(
+                [(s2.pk, s1.pk, 0.1), (s1.pk, s2.pk, 0.1)],
+                state_energies=state_energies,
+            )
+        # (e.g. deleted concurrently, before the conflict is looked up)
+        with mock.patch.object(
+            Transition.objects, "bulk_create", side_effect=IntegrityError
+        ):
+            with self.assertRaisesRegex(TransitionError, "Some of the transitions"):
+                Transition.bulk_create_from_data(
+                    [(s2.pk, s1.pk, 0.1)], state_energies=state_energies
+                )
+
+    def test_counters(self):
+        s1, s2 = self.state_high, self.state_low
+        s3 = State.create_from_data(
+            self.isotopologue,
+            lifetime=0.1,
+            energy=42,
+            vib_state_str="(9, 9, 9)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        tr1 = Transition.create_from_data(s3, s1, 0.1)
+        Transition.create_from_data(s3, s2, 0.1)
+
+        # re-assigning the states of a saved transition:
+        tr1 = Transition.objects.get(pk=tr1.pk)
+        tr1.initial_state = s1
+        tr1.final_state = s2
+        tr1.save()
+        for s, n_from, n_to in [(s1, 1, 0), (s2, 0, 2), (s3, 1, 0)]:
+            s = State.objects.get(pk=s.pk)
+            self.assertEqual(
+                (n_from, n_to), (s.number_transitions_from, s.number_transitions_to)
+            )
+
+        # deleting a state cascades to its transitions:
+        s3.delete()
+        iso = Isotopologue.get_from_formula_str("CO2")
+        self.assertEqual((2, 1), (iso.number_states, iso.number_transitions))
+        s2 = State.objects.get(pk=s2.pk)
+        self.assertEqual((0, 1), (s2.number_transitions_from, s2.number_transitions_to))
+
+    def test_sync_counters_command(self):
+        Transition.create_from_data(self.state_high, self.state_low, 0.1)
+        State.objects.filter(pk=self.state_low.pk).update(number_transitions_to=42)
+        Isotopologue.objects.filter(pk=self.isotopologue.pk).update(
+            number_transitions=42
+        )
+        out = io.StringIO()
+        call_command("sync_counters", "CO2", stdout=out)
+        self.assertIn("CO2: synced counters of 1 states", out.getvalue())
+        self.assertEqual(
+            1, State.objects.get(pk=self.state_low.pk).number_transitions_to
+        )
+        self.assertEqual(1, Isotopologue.get_from_formula_str("CO2").number_transitions)
+
+    def test_update_state_energy(self):
+        tr = Transition.create_from_data(self.state_high, self.state_low, 0.1)
+        s = State.objects.get(pk=self.state_low.pk)
+        # nothing to propagate (or even save) unless the energy changes:
+        with self.assertNumQueries(0):
+            s.save()
+        s.energy = -0.3
+        s.save()
+        self.assertAlmostEqual(-0.4, Transition.objects.get(pk=tr.pk).delta_energy)
+        self.state_high.energy = 0.2
+        self.state_high.save()
+        self.assertAlmostEqual(-0.5, Transition.objects.get(pk=tr.pk).delta_energy)
+
+    def test_sync_inconsistent_db_command(self):
+        tr = Transition.create_from_data(self.state_high, self.state_low, 0.1)
+        Transition.create_from_data(self.diff_state_high, self.diff_state_low, 0.1)
+        Transition.objects.filter(pk=tr.pk).update(delta_energy=42)
+        State.objects.filter(pk=self.state_low.pk).update(
+            number_transitions_to=42, state_html="foo"
+        )
+        State.objects.filter(pk=self.diff_state_low.pk).update(state_html="foo")
+
+        out = io.StringIO()
+        call_command("sync_inconsistent_db", "CO2", chunk_size=1, stdout=out)
+        self.assertIn("Molecule: synced 0 of 1 instances", out.getvalue())
+        self.assertIn("State: synced 1 of 2 instances", out.getvalue())
+        self.assertIn("Transition: synced 1 of 1 instances", out.getvalue())
+        self.assertAlmostEqual(-0.2, Transition.objects.get(pk=tr.pk).delta_energy)
+        state_low = State.objects.get(pk=self.state_low.pk)
+        self.assertEqual(1, state_low.number_transitions_to)
+        self.assertEqual(self.state_low.state_html, state_low.state_html)
+        # other molecules left untouched:
+        self.assertEqual("foo", State.objects.get(pk=self.diff_state_low.pk).state_html)
+
+        out = io.StringIO()
+        call_command("sync_inconsistent_db", stdout=out)
+        self.assertIn("State: synced 1 of 4 instances", out.getvalue())
+        self.assertIn("Transition: synced 0 of 2 instances", out.getvalue())
+
+    def test_generation(self):
+        def generation(isotopologue):
+            return Isotopologue.objects.get(pk=isotopologue.pk).generation
+
+        gen = generation(self.isotopologue)
+        tr = Transition.create_from_data(self.state_high, self.state_low, 0.1)
+        self.assertEqual(gen + 1, generation(self.isotopologue))
+        tr = Transition.objects.get(pk=tr.pk)
+        tr.save()
+        self.assertEqual(gen + 1, generation(self.isotopologue))
+        tr.partial_lifetime = 0.2
+        tr.save()
+        self.assertEqual(gen + 2, generation(self.isotopologue))
+        tr.delete()
+        self.assertEqual(gen + 3, generation(self.isotopologue))
+        self.state_low.energy = -0.2
+        self.state_low.save()
+        self.assertEqual(gen + 4, generation(self.isotopologue))
+
+        diff_gen = generation(self.diff_isotopologue)
+        State.objects.filter(pk=self.diff_state_low.pk).update(state_html="foo")
+        call_command("sync_inconsistent_db", stdout=io.StringIO())
+        self.assertEqual(gen + 4, generation(self.isotopologue))
+        self.assertEqual(diff_gen + 1, generation(self.diff_isotopologue))
+
+    def test_create_duplicate_constraint(self):
+        Transition.create_from_data(self.state_high, self.state_low, 0.1)
+        with self.assertRaises(TransitionError):
+            Transition.create_from_data(self.state_high, self.state_low, 0.2)
+        # the failed insert is rolled back without breaking the outer transaction:
+        self.assertEqual(1, Transition.objects.count())
+        self.assertEqual(
+            1, State.objects.get(pk=self.state_high.pk).number_transitions_from
+        )
+        self.assertEqual(
+            1, Isotopologue.objects.get(pk=self.isotopologue.pk).number_transitions
+        )
+        with self.assertRaises(TransitionError):
+            Transition.bulk_create_from_data(
+                [
+                    (self.state_low.pk, self.state_high.pk, 0.1),
+                    (self.state_high.pk, self.state_low.pk, 0.1),
+                ],
+                {self.state_high.pk: 0.1, self.state_low.pk: -0.1},
+            )
+        self.assertEqual(1, Transition.objects.count())
@@ -0,0 +1,289 @@
+from unittest import mock
+
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..cache import get_cache as get_data_cache
+from ..models import Molecule, Isotopologue, State, Transition
+from ..views import keyset
+from ..views.cache import get_cache, get_stats
+
+
+# noinspection PyTypeChecker
+class TestAjaxViews(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        get_data_cache().clear()
+        self.addCleanup(get_data_cache().clear)
+        self.molecule = Molecule.create_from_data(
+            formula_str="CO2", name="carbon dioxide"
+        )
+        self.isotopologue = Isotopologue.create_from_data(
+            self.molecule, iso_formula_str="(12C)(16O)2", dataset_name="name", version=1
+        )
+        self.state_high = State.create_from_data(
+            self.isotopologue,
+            lifetime=0.1,
+            energy=0.1,
+            vib_state_str="(0, 0, 1)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        self.state_low = State.create_from_data(
+            self.isotopologue,
+            lifetime=float("inf"),
+            energy=-0.1,
+            vib_state_str="(0, 0, 0)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        self.transition = Transition.create_from_data(
+            self.state_high, self.state_low, 0.1
+        )
+
+    def get(self, url, columns, headers=None, **params):
+        """Request the url as the DataTable would, with the passed column names."""
+        params = {"draw": 1, "start": 0, "length": 10, **params}
+        for i, name in enumerate(columns):
+            params.update(
+                {
+                    f"columns[{i}][data]": i,
+                    f"columns[{i}][name]": name,
+                    f"columns[{i}][searchable]": "true",
+                    f"columns[{i}][orderable]": "true",
+                    f"columns[{i}][search][value]": "",
+                    f"columns[{i}][search][regex]": "false",
+                }
+            )
+        return self.client.get(
+            url, params, HTTP_X_REQUESTED_WITH="XMLHttpRequest", **(headers or {})
+        )
+
+    def test_state_list_conditional_get(self):
+        url = reverse("state-list-ajax", args=["CO2"])
+        response = self.get(url, ["vib_state_str", "energy"])
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()["data"]))
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        # the isotopologue only, no data queried:
+        with self.assertNumQueries(1):
+            response = self.get(
+                url, ["vib_state_str", "energy"], {"HTTP_IF_NONE_MATCH": etag}
+            )
+        self.assertEqual(304, response.status_code)
+
+        state = State.objects.get(pk=self.state_low.pk)
+        state.energy = -0.2
+        state.save()
+        response = self.get(
+            url, ["vib_state_str", "energy"], {"HTTP_IF_NONE_MATCH": etag}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_transition_list_conditional_get(self):
+        columns = ["initial_state__state_html", "partial_lifetime"]
+        for url in [
+            reverse("transition-list-ajax", args=["CO2"]),
+            reverse("transition-from-state-list-ajax", args=[self.state_high.pk]),
+            reverse("transition-to-state-list-ajax", args=[self.state_low.pk]),
+        ]:
+            response = self.get(url, columns)
+            self.assertEqual(1, len(response.json()["data"]))
+            etag = response["ETag"]
+            response = self.get(url, columns, {"HTTP_IF_NONE_MATCH": etag})
+            self.assertEqual(304, response.status_code)
+
+        # deleting is reflected as well:
+        Transition.objects.get(pk=self.transition.pk).delete()
+        response = self.get(url, columns, {"HTTP_IF_NONE_MATCH": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, len(response.json()["data"]))
+
+    def test_molecule_list_conditional_get(self):
+        url = reverse("molecule-list-ajax")
+        response = self.get(url, ["html", "isotopologue__number_states"])
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.get(
+                url,
+                ["html", "isotopologue__number_states"],
+                {"HTTP_IF_NONE_MATCH": etag},
+            )
+        self.assertEqual(304, response.status_code)
+
+        State.objects.get(pk=self.state_high.pk).delete()
+        response = self.get(
+            url, ["html", "isotopologue__number_states"], {"HTTP_IF_NONE_MATCH": etag}
+        )
+        self.assertEqual(200, response.status_code)
+
+    def test_response_cache(self):
+        url = reverse("state-list-ajax", args=["CO2"])
+        data = self.get(url, ["vib_state_str", "energy"]).json()
+        # the isotopologue only, the response served from the cache:
+        with self.assertNumQueries(1):
+            response = self.get(url, ["vib_state_str", "energy"])
+        self.assertEqual(data, response.json())
+        self.assertEqual(1, get_stats()["hits"])
+
+        # renaming the molecule invalidates the cached molecules list:
+        url = reverse("molecule-list-ajax")
+        self.get(url, ["html", "name"])
+        molecule = Molecule.objects.get(pk=self.molecule.pk)
+        molecule.name = "foo"
+        molecule.save()
+        response = self.get(url, ["html", "name"])
+        self.assertEqual("foo", response.json()["data"][0][1])
+        self.assertEqual(1, get_stats()["hits"])
+
+    @mock.patch.object(keyset, "ANCHOR_STRIDE", 1)
+    def test_keyset_pagination(self):
+        state = State.create_from_data(
+            self.isotopologue,
+            lifetime=0.01,
+            energy=0.2,
+            vib_state_str="(0, 0, 2)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        url = reverse("state-list-ajax", args=["CO2"])
+        columns = ["vib_state_str", "energy"]
+        rows = self.get(url, columns).json()["data"]
+        self.assertEqual(3, len(rows))
+
+        for start in range(3):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.get(url, columns, start=start, length=1)
+            self.assertEqual(rows[start : start + 1], response.json()["data"])
+            # seeking from the anchor remembered with the previous page:
+            self.assertFalse(
+                any("OFFSET" in query["sql"] for query in queries.captured_queries)
+            )
+
+        # the transitions are ordered by the sort keys of their states:
+        url = reverse("transition-list-ajax", args=["CO2"])
+        Transition.create_from_data(state, self.state_low, 0.1)
+        columns = ["initial_state__state_html", "final_state__state_html"]
+        rows = self.get(url, columns).json()["data"]
+        pages = [
+            self.get(url, columns, start=i, length=1).json()["data"] for i in (0, 1)
+        ]
+        self.assertEqual(rows, pages[0] + pages[1])
+
+    def test_records_counts(self):
+        url = reverse("state-list-ajax", args=["CO2"])
+        columns = ["vib_state_str", "energy"]
+        # the isotopologue and the data only, the totals taken from its counters:
+        with self.assertNumQueries(2):
+            data = self.get(url, columns).json()
+        self.assertEqual((2, 2), (data["recordsTotal"], data["recordsFiltered"]))
+
+        url = reverse("transition-from-state-list-ajax", args=[self.state_high.pk])
+        columns = ["initial_state__state_html", "partial_lifetime"]
+        with self.assertNumQueries(3):
+            data = self.get(url, columns).json()
+        self.assertEqual((1, 1), (data["recordsTotal"], data["recordsFiltered"]))
+
+        # the searched rows are counted, up to the cap:
+        url = reverse("state-list-ajax", args=["CO2"])
+        columns = ["vib_state_str", "energy"]
+        data = self.get(url, columns, **{"search[value]": "0, 0"}).json()
+        self.assertEqual((2, 2), (data["recordsTotal"], data["recordsFiltered"]))
+        with mock.patch.object(keyset, "FILTERED_COUNT_CAP", 1):
+            data = self.get(url, columns, length=1, **{"search[value]": "(0,"}).json()
+        self.assertEqual((2, 1), (data["recordsTotal"], data["recordsFiltered"]))
+
+    def test_queries_per_draw(self):
+        molecule = Molecule.create_from_data(formula_str="CO", name="carbon monoxide")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        states = [
+            State.create_from_data(
+                isotopologue,
+                lifetime=0.1,
+                energy=float(v),
+                vib_state_str=str(v),
+                vib_state_labels="v",
+            )
+            for v in range(4)
+        ]
+        for initial_state, final_state in zip(states[1:], states):
+            Transition.create_from_data(initial_state, final_state, 0.1)
+
+        # the columns as rendered by the html views, the number of the queries does
+        # not depend on the number of the rows served:
+        url = reverse("molecule-list-ajax")
+        columns = [
+            "html",
+            "number_atoms",
+            "isotopologue__mass",
+            "isotopologue__number_states",
+            "isotopologue__number_transitions",
+        ]
+        # the validators, the count, and the data:
+        with self.assertNumQueries(3):
+            self.assertEqual(2, len(self.get(url, columns).json()["data"]))
+
+        url = reverse("state-list-ajax", args=["CO"])
+        columns = [
+            "el_state_html",
+            "vib_state_html",
+            "energy",
+            "lifetime",
+            "number_transitions_from",
+            "number_transitions_to",
+        ]
+        with self.assertNumQueries(2):
+            self.assertEqual(4, len(self.get(url, columns).json()["data"]))
+
+        url = reverse("transition-list-ajax", args=["CO"])
+        columns = [
+            "initial_state__state_html",
+            "final_state__state_html",
+            "delta_energy",
+            "partial_lifetime",
+            "branching_ratio",
+        ]
+        with self.assertNumQueries(2):
+            self.assertEqual(3, len(self.get(url, columns).json()["data"]))
+
+    def test_derived_columns(self):
+        url = reverse("transition-list-ajax", args=["CO2"])
+        columns = ["initial_state__state_html", "branching_ratio"]
+        self.assertEqual("1", self.get(url, columns).json()["data"][0][1])
+
+        url = reverse("state-list-ajax", args=["CO2"])
+        columns = ["vib_state_str", "cascade_lifetime"]
+        # the validators, the data, and the states and transitions of the cascade:
+        with self.assertNumQueries(4):
+            data = self.get(url, columns).json()["data"]
+        self.assertEqual([["(0, 0, 0)", "0.00e+00"], ["(0, 0, 1)", "1.00e-01"]], data)
+        # (the decay columns are cached, the draw counter misses the response cache)
+        with self.assertNumQueries(2):
+            self.assertEqual(data, self.get(url, columns, draw=2).json()["data"])
+
+    def test_molecule_details_fragments(self):
+        url = reverse("molecule-list-ajax")
+        columns = ["html", "number_atoms"]
+        with mock.patch(
+            "app_site.views.views_ajax.molecule.render_to_string",
+            wraps=render_to_string,
+        ) as render:
+            html = self.get(url, columns).json()["data"][0][0]
+            self.assertEqual(1, render.call_count)
+            # not rendered again (the draw counter misses the response cache):
+            self.assertEqual(html, self.get(url, columns, draw=2).json()["data"][0][0])
+            self.assertEqual(1, render.call_count)
+
+            # re-rendered once the isotopologue has changed:
+            isotopologue = Isotopologue.objects.get(pk=self.isotopologue.pk)
+            isotopologue.mass = 45.5
+            isotopologue.save()
+            html = self.get(url, columns, draw=3).json()["data"][0][0]
+            self.assertEqual(2, render.call_count)
+            self.assertIn("45.5", html)
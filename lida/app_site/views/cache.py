@@ -0,0 +1,141 @@
+"""Cache of the full responses of the data views (the API endpoint and the data table
+ajax views), stored in the settings.CACHES[CACHE_ALIAS] cache backend.
+
+The cache keys are versioned by the data they represent (see
+Isotopologue.get_cache_version, with the isotopologue generation counter bumped
+whenever any of its data change), so the stale responses are never served and
+never need invalidating explicitly: they simply stop being requested and get evicted
+by the (size-bounded) cache backend eventually.
+Any Django cache backend might be configured: the local-memory (the default, one
+cache per process), file-based, or a shared Redis or Memcached cache.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+CACHE_ALIAS = "responses"
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def get_cache_key(request, version):
+    """The key of the response to the request, in the version of the data served.
+    The responses differ by the full path (incl. the query string) and by whether
+    the client accepts the gzip encoding.
+    """
+    accepts_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    request_hash = hashlib.sha1(
+        f"{request.get_full_path()}:{accepts_gzip}".encode()
+    ).hexdigest()
+    return f"response:{version}:{request_hash}"
+
+
+def _increment_stat(stat):
+    cache = get_cache()
+    key = f"stats:{stat}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter is missing (or has been evicted):
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats():
+    """The numbers of the cache hits and misses recorded by the cache backend (per
+    process, for the local-memory backend).
+
+    Returns
+    -------
+    dict
+        With the "hits", "misses" and "hit_ratio" keys.
+    """
+    counts = get_cache().get_many(["stats:hits", "stats:misses"])
+    hits, misses = counts.get("stats:hits", 0), counts.get("stats:misses", 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else None,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many(["stats:hits", "stats:misses"])
+
+
+def _build_response(entry):
+    status, headers, content = entry
+    response = HttpResponse(content, status=status)
+    for header, value in headers:
+        response[header] = value
+    return response
+
+
+def _tee(chunks, store, max_size):
+    """Pass the streamed chunks through, storing the whole content once streamed,
+    unless bigger than max_size (or not streamed completely).
+    """
+    buffer, size = [], 0
+    for chunk in chunks:
+        if buffer is not None:
+            size += len(chunk)
+            if size > max_size:
+                buffer = None
+            else:
+                buffer.append(chunk)
+        yield chunk
+    if buffer is not None:
+        store(b"".join(buffer))
+
+
+def cached_response(request, version, get_response):
+    """Serve the response to the request from the cache, if cached in the version
+    passed, otherwise call get_response and cache its response (if successful and
+    not too big, see settings.RESPONSE_CACHE_MAX_SIZE).
+    The streaming responses get cached once streamed to the client.
+
+    Parameters
+    ----------
+    request : HttpRequest
+    version : str
+        Identifies the version of all the data the response depends on, such as
+        returned by Isotopologue.get_cache_version.
+    get_response : callable
+        Returning the full response, called only on a cache miss.
+
+    Returns
+    -------
+    HttpResponse
+    """
+    if request.method not in ("GET", "HEAD"):
+        return get_response()
+    cache = get_cache()
+    key = get_cache_key(request, version)
+    entry = cache.get(key)
+    if entry is not None:
+        _increment_stat("hits")
+        return _build_response(entry)
+    _increment_stat("misses")
+
+    response = get_response()
+    if response.status_code != 200:
+        return response
+    max_size = settings.RESPONSE_CACHE_MAX_SIZE
+    headers = list(response.items())
+
+    def store(content):
+        cache.set(key, (response.status_code, headers, content))
+
+    if not response.streaming:
+        if len(response.content) <= max_size:
+            store(response.content)
+    elif int(response.get("Content-Length", 0)) <= max_size:
+        # (the big files are streamed untouched, e.g. by the server sendfile)
+        response.streaming_content = _tee(response.streaming_content, store, max_size)
+    return response
@@ -0,0 +1,92 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import cached_response
+
+
+def conditional_get(request, get_response, etag=None, last_modified=None):
+    """Conditional GET handling (as by the django.views.decorators.http.condition
+    decorator), for the views which need to resolve the validators themselves.
+    If the resource has not been modified according to the request If-None-Match or
+    If-Modified-Since headers, the 304 Not Modified response is returned without
+    calling get_response at all. Otherwise, the response returned by get_response
+    gets the ETag and Last-Modified headers.
+
+    Parameters
+    ----------
+    request : HttpRequest
+    get_response : callable
+        Returning the full response, called only if needed.
+    etag : str, optional
+    last_modified : datetime.datetime, optional
+
+    Returns
+    -------
+    HttpResponse
+    """
+    last_modified_timestamp = (
+        int(last_modified.timestamp()) if last_modified is not None else None
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified_timestamp
+    )
+    if response is None:
+        response = get_response()
+    if request.method in ("GET", "HEAD"):
+        if last_modified_timestamp and not response.has_header("Last-Modified"):
+            response["Last-Modified"] = http_date(last_modified_timestamp)
+        if etag:
+            response.setdefault("ETag", etag)
+    return response
+
+
+class ConditionalGetMixin:
+    """Mixin for the data table ajax views, serving 304 Not Modified responses
+    (without running any queries on the data) if the data of the isotopologue
+    returned by get_isotopologue have not changed since requested last time, and
+    serving the full responses from the versioned response cache, if cached.
+    """
+
+    # the Isotopologue fetched by get_validators (if any), for reusing its counters:
+    isotopologue = None
+
+    def get_isotopologue(self):
+        """The Isotopologue all the data served by this view belong to, or None."""
+        return None
+
+    def get_validators(self):
+        """Returns the (etag, last_modified, cache_version) triple of the data
+        served (see app_site.views.cache.cached_response for the cache_version).
+        """
+        try:
+            isotopologue = self.get_isotopologue()
+        except ObjectDoesNotExist:
+            isotopologue = None
+        if isotopologue is None:
+            return None, None, None
+        self.isotopologue = isotopologue
+        return (
+            isotopologue.get_etag(),
+            isotopologue.get_data_last_modified(),
+            isotopologue.get_cache_version(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified, cache_version = self.get_validators()
+        # also versions the keyset pagination anchors, see KeysetDataTableView:
+        self.data_version = cache_version
+
+        def get_response():
+            return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        if cache_version is not None:
+            return conditional_get(
+                request,
+                lambda: cached_response(request, cache_version, get_response),
+                etag=etag,
+                last_modified=last_modified,
+            )
+        return conditional_get(
+            request, get_response, etag=etag, last_modified=last_modified
+        )
@@ -0,0 +1,244 @@
+"""Keyset (cursor) pagination: the rows following a page are selected by the values
+of the ordering fields (the key) of the last row of the page, rather than by the
+OFFSET, which makes the database read (and discard) all the preceding rows, so
+the deeper pages get slower and slower.
+
+The DataTables (incl. the scroller) only request the rows by their offsets, so the
+keys of the rows at every ANCHOR_STRIDE-th position served are remembered (in the
+response cache, versioned by the data served), and the following requests seek from
+the nearest anchor at or before the offset requested, only skipping the rows after
+the anchor. The requests with no anchor available (e.g. jumps deep into the table)
+fall back to the plain OFFSET.
+
+The COUNT(*) queries of the data tables are avoided as well: the total number of the
+rows is passed by the views from the denormalised counters (e.g.
+Isotopologue.number_states), and the filtered (searched) rows are only counted up to
+FILTERED_COUNT_CAP.
+The rows served are fetched by a single query, joining the related rows rendered
+(select_related) and only selecting the columns rendered (only).
+"""
+import hashlib
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+from django_datatables_serverside._data_server import DataTablesServer
+from django_datatables_serverside.views import ServerSideDataTableView
+
+from ..keyset import keyset_filter
+from .cache import get_cache
+
+ANCHOR_STRIDE = 100
+# the searched rows are only counted up to (and reported as at most) this number:
+FILTERED_COUNT_CAP = 10000
+
+
+def is_nullable(model, field_path):
+    """If any of the fields on the model field_path (e.g. "initial_state__energy")
+    is nullable.
+    """
+    for name in field_path.split("__"):
+        field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        if field.null:
+            return True
+        model = field.related_model or model
+    return False
+
+
+def is_field(model, field_path):
+    """If the field_path is a path of the model fields (rather than e.g. a name of a
+    column only rendered by a custom value getter).
+    """
+    try:
+        for name in field_path.split("__"):
+            field = model._meta.get_field(name)
+            model = field.related_model or model
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class KeysetDataTablesServer(DataTablesServer):
+    """The DataTablesServer slicing the sorted queryset by the keyset pagination
+    whenever an anchor of the requested offset is known (see the module docstring).
+    The rows are always totally ordered (by the requested ordering, or the
+    default_order_by, and the primary key).
+    The total number of the rows is only counted if the records_total is not known.
+    The rows are fetched with the select_related relations joined, and, unless the
+    only_fields is None, with only the only_fields and the fields of the columns
+    requested (if model fields) selected.
+    """
+
+    def __init__(
+        self,
+        *args,
+        default_order_by=("pk",),
+        anchors_version=None,
+        records_total=None,
+        select_related=(),
+        only_fields=None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.default_order_by = default_order_by
+        self.records_total = records_total
+        self.select_related = select_related
+        self.only_fields = only_fields
+        # the anchors are only remembered if the version of the data is known:
+        self.anchors_version = anchors_version
+        self.order_by = None
+        self.keyset_enabled = False
+
+    def _sort_queryset(self, queryset):
+        queryset = super()._sort_queryset(queryset)
+        order_by = list(queryset.query.order_by) or list(self.default_order_by)
+        if "pk" not in (field.lstrip("-") for field in order_by):
+            order_by.append("pk")
+        self.order_by = order_by
+        self.keyset_enabled = self.anchors_version is not None and not any(
+            is_nullable(queryset.model, field.lstrip("-")) for field in order_by
+        )
+        return queryset.order_by(*order_by)
+
+    def _get_anchor_key(self, position):
+        columns_search = [
+            column["search"]["value"] for column in self.parameters_received["columns"]
+        ]
+        query_hash = hashlib.sha1(
+            repr(
+                (
+                    self.request.path,
+                    self.parameters_received["search"].get("value"),
+                    columns_search,
+                    self.order_by,
+                )
+            ).encode()
+        ).hexdigest()
+        return f"anchor:{self.anchors_version}:{query_hash}:{position}"
+
+    def _slice_queryset(self, queryset):
+        start = self.parameters_received["start"]
+        length = self.parameters_received["length"]
+        if not self.keyset_enabled:
+            return queryset[start : start + length]
+        # the values of the ordering fields of each row fetched:
+        queryset = queryset.annotate(
+            **{
+                f"keyset_{i}": F(field.lstrip("-"))
+                for i, field in enumerate(self.order_by)
+            }
+        )
+        anchor_position = start // ANCHOR_STRIDE * ANCHOR_STRIDE
+        if anchor_position:
+            key = get_cache().get(self._get_anchor_key(anchor_position))
+            if key is not None:
+                queryset = queryset.filter(keyset_filter(self.order_by, key))
+                start -= anchor_position
+        return queryset[start : start + length]
+
+    def _remember_anchors(self, instances):
+        start = self.parameters_received["start"]
+        anchors = {}
+        for i, instance in enumerate(instances):
+            position = start + i + 1
+            if position % ANCHOR_STRIDE == 0:
+                anchors[self._get_anchor_key(position)] = [
+                    getattr(instance, f"keyset_{j}") for j in range(len(self.order_by))
+                ]
+        if anchors:
+            get_cache().set_many(anchors)
+
+    def _count_filtered(self, queryset_filtered, records_total):
+        if queryset_filtered is self.queryset:
+            # no search requested:
+            return records_total
+        end = self.parameters_received["start"] + self.parameters_received["length"]
+        cap = max(FILTERED_COUNT_CAP, end)
+        # (counts the rows of the "SELECT ... LIMIT cap" subquery only)
+        return queryset_filtered[:cap].count()
+
+    def _project_queryset(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.only_fields is not None:
+            columns = [
+                column["name"]
+                for column in self.parameters_received["columns"]
+                if is_field(queryset.model, column["name"])
+            ]
+            queryset = queryset.only(*self.only_fields, *columns)
+        return queryset
+
+    def _build_data_to_return(self):
+        # as DataTablesServer._build_data_to_return, but with the counts avoided
+        # and the rows served kept for remembering the anchors:
+        records_total = self.records_total
+        if records_total is None:
+            records_total = self.queryset.count()
+        data_to_return = {
+            "draw": str(self.parameters_received["draw"]),
+            "recordsTotal": records_total,
+        }
+        queryset_filtered = self._filter_queryset(self.queryset)
+        data_to_return["recordsFiltered"] = self._count_filtered(
+            queryset_filtered, records_total
+        )
+        queryset_sorted = self._sort_queryset(queryset_filtered)
+        queryset_projected = self._project_queryset(queryset_sorted)
+        instances = list(self._slice_queryset(queryset_projected))
+        if self.keyset_enabled:
+            self._remember_anchors(instances)
+
+        fields = [
+            column_parameters["name"]
+            for column_parameters in self.parameters_received["columns"]
+        ]
+        data_to_return["data"] = []
+        for instance in instances:
+            row = []
+            for field in fields:
+                if field in self.custom_value_getters:
+                    row.append(self.custom_value_getters[field](instance))
+                else:
+                    row.append(reduce(getattr, field.split("__"), instance))
+            data_to_return["data"].append(row)
+        return data_to_return
+
+
+class KeysetDataTableView(ServerSideDataTableView):
+    """The ServerSideDataTableView served by the KeysetDataTablesServer.
+    The anchors are only remembered for the views with the data version known,
+    see get_anchors_version.
+    """
+
+    default_order_by = ("pk",)
+    # the relations joined to the rows served, and the fields selected (besides the
+    # fields of the columns requested, None for all the fields), i.e. all the fields
+    # accessed by the custom_value_getters need to be listed:
+    select_related = ()
+    only_fields = None
+
+    def get_anchors_version(self):
+        """The version of the data served (see the ConditionalGetMixin), or None."""
+        return getattr(self, "data_version", None)
+
+    def get_records_total(self):
+        """The total number of the rows of the queryset, if known without counting
+        them (e.g. from the denormalised counters), or None.
+        """
+        return None
+
+    def get(self, request, *_, **__):
+        dt_server = KeysetDataTablesServer(
+            request=request,
+            queryset=self.queryset,
+            custom_value_getters=self.custom_value_getters,
+            surrogate_columns_search=self.surrogate_columns_search,
+            surrogate_columns_sort=self.surrogate_columns_sort,
+            default_order_by=self.default_order_by,
+            anchors_version=self.get_anchors_version(),
+            records_total=self.get_records_total(),
+            select_related=self.select_related,
+            only_fields=self.only_fields,
+        )
+        return dt_server.serve_data()
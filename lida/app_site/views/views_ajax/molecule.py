@@ -1,14 +1,29 @@
+import hashlib
+
 from django.template.loader import render_to_string
 from django.urls import reverse
-from django_datatables_serverside.views import ServerSideDataTableView
 
-from app_site.models import Molecule
+from app_site.models import Molecule, Isotopologue
+from ..cache import get_cache
+from ..conditional import ConditionalGetMixin
+from ..keyset import KeysetDataTableView
 
 
 def molecule_details_html(molecule):
-    return render_to_string(
-        "site/molecule_details.html", context={"molecule": molecule}
-    )
+    """The molecule details (modal) fragment, only rendered once per version of the
+    molecule and isotopologue data (see Isotopologue.generation), stored in the
+    response cache.
+    """
+    isotopologue = molecule.isotopologue
+    key = f"molecule-details:{molecule.pk}:{isotopologue.pk}-g{isotopologue.generation}"
+    cache = get_cache()
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(
+            "site/molecule_details.html", context={"molecule": molecule}
+        )
+        cache.set(key, html)
+    return html
 
 
 def number_states_value(molecule):
@@ -25,7 +40,7 @@ def number_transitions_value(molecule):
     return f'<a href="{href}" class="{cls}">{val}</a>'
 
 
-class MoleculeListAjaxView(ServerSideDataTableView):
+class MoleculeListAjaxView(ConditionalGetMixin, KeysetDataTableView):
     custom_value_getters = {
         "html": molecule_details_html,
         "isotopologue__mass": lambda mol: f"{mol.isotopologue.mass:.2f}",
@@ -34,3 +49,36 @@ class MoleculeListAjaxView(ServerSideDataTableView):
     }
     surrogate_columns_search = {"html": "formula_str"}
     queryset = Molecule.objects.all()
+    select_related = ("isotopologue",)
+    # all the fields rendered by the site/molecule_details.html template (and the
+    # generation versioning the rendered fragments):
+    only_fields = (
+        "slug",
+        "html",
+        "number_atoms",
+        "isotopologue__html",
+        "isotopologue__iso_slug",
+        "isotopologue__dataset_name",
+        "isotopologue__mass",
+        "isotopologue__ground_el_state_str",
+        "isotopologue__vib_state_dim",
+        "isotopologue__vib_quantum_labels_html",
+        "isotopologue__number_states",
+        "isotopologue__number_transitions",
+        "isotopologue__generation",
+    )
+
+    def get_validators(self):
+        """The molecules list only depends on the molecules and isotopologues data,
+        validated by a single small query of the isotopologue generations.
+        """
+        rows = list(
+            Isotopologue.objects.order_by("pk").values_list(
+                "pk", "generation", "time_modified"
+            )
+        )
+        if not rows:
+            return None, None, None
+        last_modified = max(row[-1] for row in rows)
+        fingerprint = hashlib.sha1(repr(rows).encode()).hexdigest()[:10]
+        return f'W/"molecules-{fingerprint}"', last_modified, f"molecules-{fingerprint}"
@@ -1,7 +1,12 @@
+import math
+
 from django.urls import reverse
-from django_datatables_serverside.views import ServerSideDataTableView
+from django.utils.functional import cached_property
 
-from app_site.models import State
+from app_site.cascade import get_decay_columns
+from app_site.models import Isotopologue, State
+from ..conditional import ConditionalGetMixin
+from ..keyset import KeysetDataTableView
 
 
 def number_transitions_from_value(instance):
@@ -22,12 +27,15 @@ def number_transitions_to_value(instance):
     return f'<a href="{href}" class="{cls}">{val}</a>'
 
 
-class StateListAjaxView(ServerSideDataTableView):
+class StateListAjaxView(ConditionalGetMixin, KeysetDataTableView):
     surrogate_columns_search = {
         "el_state_html": "el_state_html_notags",
     }
     surrogate_columns_sort = {"vib_state_str": "vib_state_sort_key"}
-    custom_value_getters = {
+    default_order_by = ("state_sort_key", "pk")
+    # (the custom_value_getters only access the fields of their columns and the pk)
+    only_fields = ()
+    _custom_value_getters = {
         "energy": lambda instance: f"{instance.energy:.3f}",
         "lifetime": lambda instance: f"{instance.lifetime:.2e}"
         if instance.lifetime is not None
@@ -36,8 +44,38 @@ class StateListAjaxView(ServerSideDataTableView):
         "number_transitions_to": number_transitions_to_value,
     }
 
+    @property
+    def custom_value_getters(self):
+        return {
+            **self._custom_value_getters,
+            "cascade_lifetime": self.cascade_lifetime_value,
+        }
+
+    @cached_property
+    def decay_columns(self):
+        # (only computed, or fetched from the cache, if the column is requested)
+        return get_decay_columns(self.isotopologue)
+
+    def cascade_lifetime_value(self, instance):
+        if self.isotopologue is None:
+            return ""
+        state_ids, cascade_lifetimes = self.decay_columns[:2]
+        i = state_ids.searchsorted(instance.pk)
+        if i == len(state_ids) or state_ids[i] != instance.pk:
+            return ""
+        cascade_lifetime = cascade_lifetimes[i]
+        return f"{cascade_lifetime:.2e}" if math.isfinite(cascade_lifetime) else ""
+
     @property
     def queryset(self):
         return State.objects.filter(
             isotopologue__molecule__slug=self.kwargs["mol_slug"]
         ).all()
+
+    def get_isotopologue(self):
+        return Isotopologue.objects.get(molecule__slug=self.kwargs["mol_slug"])
+
+    def get_records_total(self):
+        if self.isotopologue is None:
+            return None
+        return self.isotopologue.number_states
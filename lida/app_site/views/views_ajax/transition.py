@@ -1,9 +1,19 @@
-from django_datatables_serverside.views import ServerSideDataTableView
+from django.utils.functional import cached_property
 
-from app_site.models import Molecule, State
+from app_site.models import Isotopologue, State, Transition
+from ..conditional import ConditionalGetMixin
+from ..keyset import KeysetDataTableView
 
 
-class _Base(ServerSideDataTableView):
+def branching_ratio_value(tr):
+    lifetime = tr.initial_state.lifetime
+    # (the stable initial states have no meaningful branching ratios)
+    if lifetime is None or not tr.partial_lifetime:
+        return ""
+    return f"{lifetime / tr.partial_lifetime:.3g}"
+
+
+class _Base(ConditionalGetMixin, KeysetDataTableView):
     surrogate_columns_search = {
         "initial_state__state_html": "initial_state__state_html_notags",
         "final_state__state_html": "final_state__state_html_notags",
@@ -17,25 +27,58 @@ class _Base(ServerSideDataTableView):
         "partial_lifetime": lambda tr: f"{tr.partial_lifetime:.2e}"
         if tr.partial_lifetime is not None
         else "∞",
+        "branching_ratio": branching_ratio_value,
     }
+    default_order_by = (
+        "initial_state__state_sort_key",
+        "final_state__state_sort_key",
+        "pk",
+    )
+    select_related = ("initial_state", "final_state")
+    # (the related states need to be selected as well, to be joined, and the initial
+    # state lifetime is accessed by the branching_ratio_value)
+    only_fields = ("initial_state", "final_state", "initial_state__lifetime")
     queryset = None
 
 
-class TransitionToStateListAjaxView(_Base):
+class _StateBase(_Base):
+    def get_isotopologue(self):
+        return Isotopologue.objects.get(state__pk=self.kwargs["state_pk"])
+
+    @cached_property
+    def state(self):
+        return State.objects.get(pk=self.kwargs["state_pk"])
+
+
+class TransitionToStateListAjaxView(_StateBase):
+    def get_records_total(self):
+        return self.state.number_transitions_to
+
     @property
     def queryset(self):
-        return State.objects.get(pk=self.kwargs["state_pk"]).transition_to_set.all()
+        return self.state.transition_to_set.all()
+
 
+class TransitionFromStateListAjaxView(_StateBase):
+    def get_records_total(self):
+        return self.state.number_transitions_from
 
-class TransitionFromStateListAjaxView(_Base):
     @property
     def queryset(self):
-        return State.objects.get(pk=self.kwargs["state_pk"]).transition_from_set.all()
+        return self.state.transition_from_set.all()
 
 
 class TransitionListAjaxView(_Base):
+    def get_isotopologue(self):
+        return Isotopologue.objects.get(molecule__slug=self.kwargs["mol_slug"])
+
+    def get_records_total(self):
+        if self.isotopologue is None:
+            return None
+        return self.isotopologue.number_transitions
+
     @property
     def queryset(self):
-        return Molecule.objects.get(
-            slug=self.kwargs["mol_slug"]
-        ).isotopologue.transition_set.all()
+        return Transition.objects.filter(
+            initial_state__isotopologue__molecule__slug=self.kwargs["mol_slug"]
+        )
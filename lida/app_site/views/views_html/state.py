@@ -51,6 +51,7 @@ class StateListView(TemplateView):
             Column("Lifetime (s)", "lifetime", 3),
             Column("Transitions from", "number_transitions_from", 4),
             Column("Transitions to", "number_transitions_to", 5),
+            Column("Cascade lifetime (s)", "cascade_lifetime", 6, orderable=False),
         ]
 
         return context
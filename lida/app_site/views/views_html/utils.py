@@ -8,6 +8,7 @@ class Column:
         searchable=False,
         individual_search=False,
         placeholder=None,
+        orderable=True,
     ):
         self.heading = heading
         self.model_field = model_field
@@ -16,6 +17,7 @@ class Column:
         self.searchable = searchable
         self.individual_search = individual_search
         self.placeholder = placeholder if placeholder is not None else heading
+        self.orderable = orderable
 
 
 class Order:
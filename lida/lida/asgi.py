@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lida.settings")
 
 application = get_asgi_application()
+
+# (only once the apps are loaded)
+from app_site.snapshot import preload_snapshots  # noqa: E402
+
+preload_snapshots()
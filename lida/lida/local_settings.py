@@ -0,0 +1,6 @@
+SECRET_KEY = "test"
+DEBUG = True
+DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+STATIC_URL = "/static/"
+STATIC_ROOT = None
+ALLOWED_HOSTS = ["*"]
@@ -103,3 +103,59 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Root directory of the precomputed API export artifacts (see app_api.artifacts),
+# might be overridden in the local settings
+try:
+    from .local_settings import EXPORTS_ROOT
+except ImportError:
+    EXPORTS_ROOT = BASE_DIR / "exports"
+
+# Cache of the full responses of the data views (see app_site.views.cache), and of
+# the data derived from the whole datasets (see app_site.cache), the entries are
+# versioned by the data, so never invalidated explicitly, but evicted by the backend
+# once MAX_ENTRIES is reached. Any (e.g. file-based or shared Redis) cache backends
+# might be configured in the local settings instead.
+try:
+    from .local_settings import CACHES
+except ImportError:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "responses": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "lida-responses",
+            "TIMEOUT": 24 * 3600,
+            "OPTIONS": {"MAX_ENTRIES": 256},
+        },
+        "data": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "lida-data",
+            "TIMEOUT": None,
+            "OPTIONS": {"MAX_ENTRIES": 64},
+        },
+    }
+# the responses bigger than that (in bytes) are not cached
+try:
+    from .local_settings import RESPONSE_CACHE_MAX_SIZE
+except ImportError:
+    RESPONSE_CACHE_MAX_SIZE = 1024 * 1024
+
+# In-memory snapshots of the isotopologues data, serving the API queries without
+# querying the database (see app_site.snapshot), loaded by each process on the first
+# access, or at the worker start if SNAPSHOTS_PRELOAD
+try:
+    from .local_settings import SNAPSHOTS_ENABLED
+except ImportError:
+    SNAPSHOTS_ENABLED = False
+try:
+    from .local_settings import SNAPSHOTS_PRELOAD
+except ImportError:
+    SNAPSHOTS_PRELOAD = False
+# Root directory of the memory-mapped snapshot files (see app_site.snapshot), might be
+# overridden in the local settings
+try:
+    from .local_settings import SNAPSHOTS_ROOT
+except ImportError:
+    SNAPSHOTS_ROOT = BASE_DIR / "snapshots"
@@ -1,16 +1,23 @@
 """
 Needs to be imported from the Django shell...
 """
+import itertools
 import json
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from django.db import transaction
 from tqdm import tqdm
 
+from app_api.artifacts import build_artifacts
 from app_site.models import Molecule, Isotopologue, State, Transition
+from app_site.snapshot import write_snapshot
 
 
-def populate_molecule(processed_data_dir):
+def populate_molecule(
+    processed_data_dir, bulk=True, batch_size=5000, build_exports=True
+):
     """
     This is a high-level function to populate a single molecule data to the database.
 
@@ -27,6 +34,20 @@ def populate_molecule(processed_data_dir):
         the code to generate inputs for the LIDA database.
         The directory NEEDS to be named with the molecular formula, exactly as
         logged by the `exomol2lida.process_dataset.DatasetProcessor`.
+    bulk : bool
+        If True, all the states and transitions are validated in memory and inserted
+        in batches inside a single transaction (see State.bulk_create_from_data and
+        Transition.bulk_create_from_data), with all the counters synced by a single
+        aggregate pass at the end. If False, the states and transitions are created
+        one by one with the create_from_data methods, which is much slower.
+    batch_size : int
+        Number of rows of the input files read (and states or transitions inserted in
+        the bulk mode) at once.
+    build_exports : bool
+        If True, all the API export artifacts and the snapshot files of the populated
+        isotopologue get built at the end (see app_api.artifacts and
+        app_site.snapshot), otherwise they are only built lazily, on the first API
+        request.
     """
 
     processed_data_dir = Path(processed_data_dir)
@@ -64,63 +85,227 @@ def populate_molecule(processed_data_dir):
                 f"not translated to states_electronic.csv)!"
             )
 
-    # load in all the states and transitions data as dataframes:
-    states_el, states_vib, vib_state_labels = None, None, None
-    el_state_str, vib_state_str, vib_state_labels = "", "", ""
+    vib_state_labels = ""
+    if processed_data_dir.joinpath("states_vibrational.csv").is_file():
+        vib_state_labels = f"({', '.join(read_vib_quantum_labels(processed_data_dir))})"
+
     if processed_data_dir.joinpath("states_electronic.csv").is_file():
-        states_el = pd.read_csv(
-            processed_data_dir / "states_electronic.csv", header=0, index_col=0
+        # electronic states are resolved, need to set the state_string for the
+        # ground state - just take the state with the lowest energy.
+        ground_energy, ground_el_state_str = float("inf"), None
+        for states_batch in iter_states_data(processed_data_dir, batch_size):
+            for _, _, energy, el_state_str, _ in states_batch:
+                if energy < ground_energy:
+                    ground_energy, ground_el_state_str = energy, el_state_str
+        isotopologue.set_ground_el_state_str(ground_el_state_str)
+
+    print(f"Adding: States and transitions for {molecule_formula}.")
+    states_batches = iter_states_data(processed_data_dir, batch_size)
+    transitions_batches = iter_transitions_data(processed_data_dir, batch_size)
+    if bulk:
+        with transaction.atomic():
+            num_states, num_transitions = _populate_bulk(
+                isotopologue, states_batches, transitions_batches, vib_state_labels
+            )
+    else:
+        num_states, num_transitions = _populate(
+            isotopologue, states_batches, transitions_batches, vib_state_labels
         )
-    if processed_data_dir.joinpath("states_vibrational.csv").is_file():
-        states_vib = pd.read_csv(
-            processed_data_dir / "states_vibrational.csv", header=0, index_col=0
+    assert State.objects.filter(isotopologue=isotopologue).count() == num_states
+    assert Transition.objects.filter(
+        initial_state__isotopologue=isotopologue
+    ).count() == num_transitions
+
+    if build_exports:
+        isotopologue.refresh_from_db()
+        print(f"Building: API export artifacts for {molecule_formula}.")
+        build_artifacts(isotopologue)
+        print(f"Writing: Snapshot files for {molecule_formula}.")
+        write_snapshot(isotopologue)
+
+
+def read_vib_quantum_labels(processed_data_dir):
+    """Read only the header of the states_vibrational.csv file.
+
+    Returns
+    -------
+    list[str]
+        Labels of the vibrational quanta, e.g. ["v1", "v2", "v3"]
+    """
+    path = Path(processed_data_dir) / "states_vibrational.csv"
+    return list(pd.read_csv(path, header=0, index_col=0, nrows=0).columns)
+
+
+def iter_states_data(processed_data_dir, chunksize):
+    """Stream the states data in chunks of rows.
+
+    The states_data.csv file is read in chunks, together with the matching chunks of
+    the states_electronic.csv and states_vibrational.csv files (if present), which
+    are joined to it by the states index. The files are expected to list the states
+    in the same order. Only a single chunk of each of the files is held in memory at
+    any given time.
+
+    Parameters
+    ----------
+    processed_data_dir : str or Path
+    chunksize : int
+
+    Yields
+    ------
+    list[tuple]
+        Batches of (i, lifetime, energy, el_state_str, vib_state_str) tuples, where
+        i is the state index used in the transitions_data.csv file.
+    """
+    processed_data_dir = Path(processed_data_dir)
+    readers = [
+        pd.read_csv(
+            processed_data_dir / "states_data.csv",
+            header=0,
+            index_col=0,
+            dtype={"E": float, "tau": float},
+            chunksize=chunksize,
+        )
+    ]
+    resolves_el = processed_data_dir.joinpath("states_electronic.csv").is_file()
+    if resolves_el:
+        readers.append(
+            pd.read_csv(
+                processed_data_dir / "states_electronic.csv",
+                header=0,
+                index_col=0,
+                dtype={"State": str},
+                keep_default_na=False,
+                chunksize=chunksize,
+            )
+        )
+    resolves_vib = processed_data_dir.joinpath("states_vibrational.csv").is_file()
+    if resolves_vib:
+        readers.append(
+            pd.read_csv(
+                processed_data_dir / "states_vibrational.csv",
+                header=0,
+                index_col=0,
+                dtype=int,
+                chunksize=chunksize,
+            )
         )
-    if states_vib is not None:
-        vib_state_labels = f"({', '.join(states_vib.columns)})"
 
-    states_data = pd.read_csv(
-        processed_data_dir / "states_data.csv", header=0, index_col=0
-    )
-    transitions_data = pd.read_csv(
-        processed_data_dir / "transitions_data.csv", header=0
+    for chunks in itertools.zip_longest(*readers):
+        if any(chunk is None for chunk in chunks) or not all(
+            chunk.index.equals(chunks[0].index) for chunk in chunks[1:]
+        ):
+            raise ValueError(
+                f"The states files in {processed_data_dir} do not list the same "
+                f"states in the same order!"
+            )
+        data_chunk = chunks[0]
+        num_rows = len(data_chunk)
+        el_state_strs, vib_state_strs = [""] * num_rows, [""] * num_rows
+        if resolves_el:
+            el_state_strs = chunks[1]["State"].tolist()
+        if resolves_vib:
+            vib_state_strs = [
+                str(quanta[0]) if len(quanta) == 1 else str(quanta)
+                for quanta in chunks[-1].itertuples(index=False, name=None)
+            ]
+        yield list(
+            zip(
+                data_chunk.index.tolist(),
+                data_chunk["tau"].tolist(),
+                data_chunk["E"].tolist(),
+                el_state_strs,
+                vib_state_strs,
+            )
+        )
+
+
+def iter_transitions_data(processed_data_dir, chunksize):
+    """Stream the transitions data in chunks of rows.
+
+    Parameters
+    ----------
+    processed_data_dir : str or Path
+    chunksize : int
+
+    Yields
+    ------
+    tuple[np.ndarray]
+        Batches of (i, f, tau_if) arrays of initial state indices, final state indices
+        and partial lifetimes.
+    """
+    reader = pd.read_csv(
+        Path(processed_data_dir) / "transitions_data.csv",
+        header=0,
+        usecols=["i", "f", "tau_if"],
+        dtype={"i": np.int64, "f": np.int64, "tau_if": np.float64},
+        chunksize=chunksize,
     )
+    for chunk in reader:
+        yield chunk["i"].to_numpy(), chunk["f"].to_numpy(), chunk["tau_if"].to_numpy()
 
-    if states_el is not None:
-        # electronic states are resolved, need to set the state_string for the
-        # ground state - just take the state with the lowest energy.
-        i = states_data.sort_values(by="E").index[0]
-        ground_el_state_str = states_el.loc[i, "State"]
-        isotopologue.set_ground_el_state_str(ground_el_state_str)
 
+def _populate(isotopologue, states_batches, transitions_batches, vib_state_labels):
+    """Populate all the states and transitions of the isotopologue one by one.
+    Returns the numbers of states and transitions populated.
+    """
     state_instances = {}  # django model instances
-    print(f"Adding: States and transitions for {molecule_formula}.")
-    for i in tqdm(states_data.index):
-        lifetime, energy = states_data.loc[i, ["tau", "E"]]
-        if states_el is not None:
-            el_state_str = states_el.loc[i, "State"]
-        if states_vib is not None:
-            vib_state = tuple(states_vib.loc[i])
-            if len(vib_state) == 1:
-                vib_state = vib_state[0]
-            vib_state_str = str(vib_state)
-        state = State.create_from_data(
-            isotopologue=isotopologue,
-            lifetime=float(lifetime),
-            energy=float(energy),
-            el_state_str=el_state_str,
+    for states_batch in tqdm(states_batches):
+        for i, lifetime, energy, el_state_str, vib_state_str in states_batch:
+            state_instances[i] = State.create_from_data(
+                isotopologue=isotopologue,
+                lifetime=lifetime,
+                energy=energy,
+                el_state_str=el_state_str,
+                vib_state_labels=vib_state_labels,
+                vib_state_str=vib_state_str,
+            )
+
+    num_transitions = 0
+    for i_batch, f_batch, tau_if_batch in tqdm(transitions_batches):
+        for i, f, tau_if in zip(
+            i_batch.tolist(), f_batch.tolist(), tau_if_batch.tolist()
+        ):
+            Transition.create_from_data(
+                initial_state=state_instances[i],
+                final_state=state_instances[f],
+                partial_lifetime=tau_if,
+            )
+        num_transitions += len(i_batch)
+    return len(state_instances), num_transitions
+
+
+def _populate_bulk(
+    isotopologue, states_batches, transitions_batches, vib_state_labels
+):
+    """Populate all the states and transitions of the isotopologue in bulk.
+    Returns the numbers of states and transitions populated.
+    """
+    # only the states are kept in memory (as their pks and energies), the transitions
+    # are streamed straight into the database:
+    state_pks, state_energies = {}, {}
+    for states_batch in tqdm(states_batches):
+        pks = State.bulk_create_from_data(
+            isotopologue,
+            [state_data[1:] for state_data in states_batch],
             vib_state_labels=vib_state_labels,
-            vib_state_str=vib_state_str,
+            batch_size=len(states_batch),
         )
-        state_instances[i] = state
-
-    for j in tqdm(transitions_data.index):
-        i, f, tau_if = transitions_data.loc[j, ["i", "f", "tau_if"]]
-        Transition.create_from_data(
-            initial_state=state_instances[i],
-            final_state=state_instances[f],
-            partial_lifetime=float(tau_if)
+        for (i, _, energy, _, _), pk in zip(states_batch, pks):
+            state_pks[i] = pk
+            state_energies[pk] = energy
+
+    num_transitions = 0
+    for i_batch, f_batch, tau_if_batch in tqdm(transitions_batches):
+        Transition.bulk_create_from_data(
+            zip(
+                [state_pks[i] for i in i_batch.tolist()],
+                [state_pks[f] for f in f_batch.tolist()],
+                tau_if_batch.tolist(),
+            ),
+            state_energies=state_energies,
+            batch_size=len(i_batch),
         )
-    assert State.objects.filter(isotopologue=isotopologue).count() == len(states_data)
-    assert Transition.objects.filter(
-        initial_state__isotopologue=isotopologue
-    ).count() == len(transitions_data)
+        num_transitions += len(i_batch)
+
+    isotopologue.sync_counters()
+    return len(state_pks), num_transitions
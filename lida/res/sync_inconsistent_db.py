@@ -1,9 +1,5 @@
-"""This needs to be run from the Django shell"""
-from tqdm import tqdm
+"""This needs to be run from the Django shell, or simply use the management command
+``python manage.py sync_inconsistent_db [formula_str ...]`` directly."""
+from django.core.management import call_command
 
-from app_site.models import Molecule, Isotopologue, State, Transition
-
-for model in [Molecule, Isotopologue, State, Transition]:
-    for instance in tqdm(model.objects.all()):
-        instance.sync(verbose=True)
-        instance.save()
+call_command("sync_inconsistent_db", verbosity=2)